@@ -39,36 +39,156 @@ __url__ = "https://github.com/DutchSailor/GIS2BIM"
 
 import urllib
 import urllib.request
+import urllib.parse
+import urllib.response
 from urllib.request import urlopen
 import xml.etree.ElementTree as ET
 import json
 import math
 import re
+import io
+import fnmatch
+import hashlib
+import os
+import time
+import random
+import sqlite3
+from collections import namedtuple
+import itertools
+import threading
+import email.message
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from zipfile import ZipFile
 from PIL import Image
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+#pyproj is optional, without it coordinates can only be transformed by the epsg.io server
+try:
+	import pyproj
+except ImportError:
+	pyproj = None
 	
+#Server catalogue
+ServerCatalogueURL = "https://raw.githubusercontent.com/DutchSailor/GIS2BIM/master/GIS2BIM_Data.json"
+#Snapshot of the catalogue shipped with the package, used when there is no local copy and no network
+ServerCatalogueSnapshot = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GIS2BIM_Data.json")
+
+def ServerCatalogueFolder():
+	#Folder for the local copy of the catalogue, the FreeCAD user data folder if available
+	try:
+		import FreeCAD
+		return os.path.join(FreeCAD.ConfigGet("UserAppData"), "GIS2BIM")
+	except ImportError:
+		return os.path.join(os.path.expanduser("~"), ".GIS2BIM")
+
+class ServerCatalogue:
+	#List of GIS-servers & requests from the github repository of GIS2BIM, indexed by (category, title).
+	#The catalogue is read from a local copy, which is refreshed in the background when it is older than ttl seconds.
+	#Without a local copy it is downloaded once, when that fails (offline) the bundled snapshot is used.
+
+	def __init__(self,cacheFile=None,ttl=7*24*3600,url=ServerCatalogueURL,snapshot=ServerCatalogueSnapshot,timeout=10):
+		if cacheFile is None:
+			cacheFile = os.path.join(ServerCatalogueFolder(), "GIS2BIM_Data.json")
+		self.cacheFile = cacheFile
+		self.ttl = ttl
+		self.url = url
+		self.snapshot = snapshot
+		self.timeout = timeout
+		self.refreshing = None
+		self.categories = {}
+		self.items = {}
+
+		if self.load(cacheFile):
+			if time.time() - os.path.getmtime(cacheFile) > ttl:
+				self.refreshInBackground()
+		else:
+			try:
+				self.refresh()
+			except (OSError,ValueError,KeyError):
+				#no network or no valid answer, OSError includes urllib.error.URLError
+				if not self.items and not self.load(snapshot):
+					raise
+
+	def load(self,path):
+		#Use the catalogue in path, False if there is no readable catalogue
+		if not path or not os.path.exists(path):
+			return False
+		try:
+			self.index(self.read(path))
+		except (OSError,ValueError,KeyError,AttributeError):
+			return False
+		return True
+
+	def read(self,path):
+		with open(path,"rb") as f:
+			return json.loads(f.read())
+
+	def index(self,data):
+		categories = data['GIS2BIMserversRequests']
+		items = {}
+		for category,entries in categories.items():
+			for i in entries:
+				items.setdefault((category,i.get("title")),i)
+		self.categories = categories
+		self.items = items
+
+	def refresh(self):
+		#Download the catalogue, store the local copy and use it
+		raw = urllib.request.urlopen(self.url,timeout=self.timeout).read()
+		data = json.loads(raw)
+		self.index(data)
+		folder = os.path.dirname(self.cacheFile)
+		if folder and not os.path.exists(folder):
+			os.makedirs(folder)
+		temp = self.cacheFile + ".part"
+		with open(temp,"wb") as f:
+			f.write(raw)
+		os.replace(temp,self.cacheFile)
+
+	def refreshInBackground(self):
+		#Refresh the catalogue in a daemon thread, lookups keep using the current data meanwhile
+		def run():
+			try:
+				self.refresh()
+			except Exception:
+				pass
+		if self.refreshing is None or not self.refreshing.is_alive():
+			self.refreshing = threading.Thread(target=run,daemon=True)
+			self.refreshing.start()
+
+	def get(self,servertitle,category,parameter):
+		try:
+			return self.items[(category,servertitle)][parameter]
+		except KeyError:
+			raise ValueError("no " + parameter + " for " + servertitle + " in " + category)
+
+	def service(self,category,service):
+		return [i for i in self.categories[category] if i["service"] == service]
+
+#The catalogue is kept when the module is reloaded
+try:
+	Catalogue
+except NameError:
+	Catalogue = None
+
+def GetServerCatalogue():
+	#Catalogue of this session, loaded on first use
+	global Catalogue
+	if Catalogue is None:
+		Catalogue = ServerCatalogue()
+	return Catalogue
+
 #Common functions
 def GetWebServerData(servertitle, category, parameter):
 	#Get webserverdata from github repository of GIS2BIM(up to date list of GIS-servers & requests)
-	Serverlocation = "https://raw.githubusercontent.com/DutchSailor/GIS2BIM/master/GIS2BIM_Data.json"
-	url = urllib.request.urlopen(Serverlocation)
-	data = json.loads(url.read())['GIS2BIMserversRequests'][category]
-	test = []
-	for i in data:
-		test.append(i["title"])
-	result = data[test.index(servertitle)][parameter]
-	return result
+	return GetServerCatalogue().get(servertitle,category,parameter)
 
 def GetWebServerDataService(category,service):
 	#Get a list with webserverdata from github repository of GIS2BIM(up to date list of GIS-servers & requests)
-	Serverlocation = "https://raw.githubusercontent.com/DutchSailor/GIS2BIM/master/GIS2BIM_Data.json"
-	url = urllib.request.urlopen(Serverlocation)
-	data = json.loads(url.read())['GIS2BIMserversRequests'][category]
-	listOfData = []
-	for i in data:
-		if i["service"] == service:
-			listOfData.append(i)
-	return listOfData
+	return GetServerCatalogue().service(category,service)
 	
 def DownloadURL(folder,url,filename):
 	#Download a file to a folder from a given url
@@ -86,14 +206,186 @@ def GetDataFiles(folder):
 	result = data[test.index(servertitle)][parameter]
 	return result
 
-def downloadUnzip(downloadURL,filepathZIP,folderUNZIP):
-	zipresp = urlopen(downloadURL)
-	tempzip = open(filepathZIP, "wb")
-	tempzip.write(zipresp.read())
-	tempzip.close()
-	zf = ZipFile(filepathZIP)
-	zf.extractall(path = folderUNZIP)
-	zf.close()
+def HTTPSession(poolSize=8,userAgent=None):
+	#requests session which keeps up to poolSize connections per host alive
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=poolSize,pool_maxsize=poolSize)
+	session.mount("http://",adapter)
+	session.mount("https://",adapter)
+	if userAgent is not None:
+		session.headers["User-Agent"] = userAgent
+	return session
+
+def BackoffDelay(attempt,base=0.5,cap=10):
+	#Seconds to wait before retry number attempt, exponential backoff with full jitter
+	return random.uniform(0,min(cap,base*2**attempt))
+
+def downloadFile(downloadURL,filePath,session=None,chunkSize=1024*1024,retries=3,timeout=60,resume=False):
+	#Stream a download to disk in chunks. The data goes to filePath.part, after a broken connection the download
+	#continues at the last written byte if the server supports range requests. The part file is renamed when complete.
+	#With resume the part file of an earlier call is continued too. Its ETag or Last-Modified date is kept in
+	#filePath.part.json and sent as If-Range, so a file which changed on the server is downloaded from the start.
+	#Returns the ETag, Last-Modified and size of the file.
+	if session is None:
+		session = HTTPSession(1)
+	temp = filePath + ".part"
+	tempInfo = temp + ".json"
+	validator = None
+	if resume and os.path.exists(temp) and os.path.exists(tempInfo):
+		with open(tempInfo) as f:
+			info = json.load(f)
+		if info.get("url") == downloadURL:
+			validator = info.get("validator")
+	if validator is None and os.path.exists(temp):
+		os.remove(temp)
+	attempt = 0
+	while True:
+		offset = os.path.getsize(temp) if os.path.exists(temp) else 0
+		headers = {}
+		if offset:
+			headers["Range"] = "bytes=" + str(offset) + "-"
+			if validator is not None:
+				headers["If-Range"] = validator
+		try:
+			with session.get(downloadURL,headers=headers,stream=True,timeout=timeout) as resp:
+				if resp.status_code == 416:
+					#the part file does not fit the file on the server anymore, start again
+					os.remove(temp)
+					raise requests.HTTPError("range not satisfiable",response=resp)
+				resp.raise_for_status()
+				if resp.status_code == 206:
+					size = resp.headers.get("Content-Range","").rpartition("/")[2]
+					mode = "ab"
+				else:
+					#the length of compressed responses is not the length of the file
+					size = "" if "Content-Encoding" in resp.headers else resp.headers.get("Content-Length","")
+					mode = "wb"
+				etag = resp.headers.get("ETag")
+				#If-Range only works with strong ETags
+				validator = etag if etag and not etag.startswith("W/") else resp.headers.get("Last-Modified")
+				if resume and validator is not None:
+					with open(tempInfo,"w") as f:
+						json.dump({"url": downloadURL, "validator": validator},f)
+				with open(temp,mode) as f:
+					for chunk in resp.iter_content(chunkSize):
+						f.write(chunk)
+			if size.isdigit() and os.path.getsize(temp) != int(size):
+				raise IOError("incomplete download of " + downloadURL)
+			os.replace(temp,filePath)
+			if os.path.exists(tempInfo):
+				os.remove(tempInfo)
+			return {"ETag": etag, "Last-Modified": resp.headers.get("Last-Modified"), "size": os.path.getsize(filePath)}
+		except (requests.RequestException,OSError):
+			if attempt >= retries:
+				raise
+			time.sleep(BackoffDelay(attempt))
+			attempt = attempt + 1
+
+class DownloadCache:
+	#Folder of its own with downloaded files which is shared by all projects, e.g. the 3D BAG tiles. Next to every file
+	#a .json file keeps the url, size and sha256 checksum. A file is reused while it matches them, interrupted downloads are resumed.
+	#When its files grow over maxBytes the least recently used ones are removed, other files in the folder are kept.
+
+	def __init__(self,folder,workers=4,maxBytes=2048*1024*1024,session=None):
+		self.folder = folder
+		self.workers = workers
+		self.maxBytes = maxBytes
+		self.session = session if session is not None else HTTPSession(workers)
+		self.lock = threading.Lock()
+		self.busy = {}
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+
+	def path(self,url,fileName=None):
+		if fileName is None:
+			fileName = os.path.basename(urllib.parse.urlsplit(url).path) or hashlib.sha1(url.encode()).hexdigest()
+		return os.path.join(self.folder,fileName)
+
+	def checksum(self,path):
+		sha = hashlib.sha256()
+		with open(path,"rb") as f:
+			for chunk in iter(lambda: f.read(1024*1024),b""):
+				sha.update(chunk)
+		return sha.hexdigest()
+
+	def valid(self,url,path):
+		#True if path is a complete download of url, the checksum is only computed again when size or date changed
+		try:
+			with open(path + ".json") as f:
+				info = json.load(f)
+			stat = os.stat(path)
+		except (OSError,ValueError):
+			return False
+		if info.get("url") != url or info.get("size") != stat.st_size:
+			return False
+		return info.get("mtime") == stat.st_mtime or self.checksum(path) == info.get("sha256")
+
+	def fetch(self,url,fileName=None):
+		#Path of the downloaded file, it is downloaded only if there is no valid copy
+		path = self.path(url,fileName)
+		with self.lock:
+			pathLock = self.busy.setdefault(path,threading.Lock())
+		with pathLock:
+			if self.valid(url,path):
+				os.utime(path + ".json")
+				return path
+			downloadFile(url,path,self.session,resume=True)
+			stat = os.stat(path)
+			info = {"url": url, "size": stat.st_size, "mtime": stat.st_mtime, "sha256": self.checksum(path)}
+			with open(path + ".json.part","w") as f:
+				json.dump(info,f)
+			os.replace(path + ".json.part",path + ".json")
+		return path
+
+	def fetchAll(self,urls,fileNames=None):
+		#Download several files at once, returns the paths in the order of urls
+		if fileNames is None:
+			fileNames = [None] * len(urls)
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			paths = list(executor.map(self.fetch,urls,fileNames))
+		self.evict(keep=paths)
+		return paths
+
+	def entries(self):
+		#(last use, size, path) of the files written by the cache, other files in the folder and
+		#unfinished downloads are left alone
+		entries = []
+		for i in os.listdir(self.folder):
+			path = os.path.join(self.folder,i[:-5])
+			if not i.endswith(".json") or path.endswith(".part") or not os.path.isfile(path):
+				continue
+			try:
+				with open(path + ".json") as f:
+					info = json.load(f)
+				size = os.path.getsize(path)
+			except (OSError,ValueError):
+				continue
+			if isinstance(info,dict) and "url" in info and "sha256" in info:
+				entries.append((os.path.getmtime(path + ".json"),size + os.path.getsize(path + ".json"),path))
+		return entries
+
+	def evict(self,keep=()):
+		#Remove the least recently used files until the files of the cache are smaller than maxBytes
+		entries = self.entries()
+		total = sum(size for accessed,size,path in entries)
+		for accessed,size,path in sorted(entries):
+			if total <= self.maxBytes:
+				break
+			if path in keep:
+				continue
+			os.remove(path + ".json")
+			os.remove(path)
+			total = total - size
+
+def downloadUnzip(downloadURL,filepathZIP,folderUNZIP,members=None,session=None):
+	#Download a zip file and extract it. With members, a list of file names or patterns like "bgt_*.gml",
+	#only the matching files are extracted.
+	downloadFile(downloadURL,filepathZIP,session)
+	with ZipFile(filepathZIP) as zf:
+		names = zf.namelist()
+		if members is not None:
+			names = [i for i in names if any(fnmatch.fnmatch(os.path.basename(i),j) for j in members)]
+		zf.extractall(path = folderUNZIP,members = names)
 	return folderUNZIP
 	
 #GIS2BIM functions
@@ -110,8 +402,51 @@ def checkIfCoordIsInsideBoundingBox(coord, bounding_box):
     else:
         return False
 
-def TransformCRS_epsg(SourceCRS, TargetCRS, X, Y):
-    # transform coordinates between different Coordinate Reference Systems using EPSG-server
+def CRSCode(crs):
+	#EPSG number of "28992", "EPSG:28992", "urn:ogc:def:crs:EPSG::28992" or "http://www.opengis.net/def/crs/EPSG/0/28992"
+	match = re.search(r"(\d+)\D*$", str(crs))
+	return match.group(1) if match else None
+
+def CRSName(crs):
+	#"EPSG:xxxx" for EPSG numbers and names, other definitions like proj strings are passed on
+	code = CRSCode(crs)
+	if code is not None and ("EPSG" in str(crs).upper() or str(crs).strip().isdigit()):
+		return "EPSG:" + code
+	return str(crs)
+
+#pyproj transformers are not thread safe, every thread keeps its own per (source, target) pair
+try:
+	Transformers
+except NameError:
+	Transformers = threading.local()
+
+def GetTransformer(SourceCRS,TargetCRS):
+	#pyproj Transformer from SourceCRS to TargetCRS in x/y (lon/lat) axis order, created once per pair and thread
+	if pyproj is None:
+		raise ImportError("pyproj is needed to transform coordinates locally, use remote=True for the epsg.io server")
+	cache = Transformers.__dict__.setdefault("cache", {})
+	key = (CRSName(SourceCRS),CRSName(TargetCRS))
+	if key not in cache:
+		cache[key] = pyproj.Transformer.from_crs(key[0],key[1],always_xy=True)
+	return cache[key]
+
+def TransformCRS(SourceCRS,TargetCRS,X,Y,remote=False):
+	#Transform coordinates between Coordinate Reference Systems, X and Y are numbers or arrays.
+	#The transformation is local, with remote or without pyproj every point is sent to the epsg.io server.
+	if not remote and pyproj is not None:
+		return GetTransformer(SourceCRS,TargetCRS).transform(X,Y)
+	if np.ndim(X) == 0:
+		x, y = TransformCRS_epsg(CRSCode(SourceCRS),CRSCode(TargetCRS),X,Y,True)
+		return float(x), float(y)
+	points = [TransformCRS_epsg(CRSCode(SourceCRS),CRSCode(TargetCRS),i,j,True) for i,j in zip(np.ravel(X),np.ravel(Y))]
+	points = np.array(points,dtype=float).reshape(-1,2)
+	return points[:,0].reshape(np.shape(X)), points[:,1].reshape(np.shape(Y))
+
+def TransformCRS_epsg(SourceCRS, TargetCRS, X, Y, remote=False):
+    # transform coordinates between different Coordinate Reference Systems, locally
+    # or with the EPSG-server if remote is True
+    if not remote:
+        return TransformCRS(SourceCRS,TargetCRS,float(X),float(Y))
     X = str(X)
     Y = str(Y)
     requestURL = "https://epsg.io/trans?" + "&s_srs=" + SourceCRS + "&t_srs=" + TargetCRS + "&x=" + X + "&y=" + Y + "&format=json"
@@ -122,27 +457,102 @@ def TransformCRS_epsg(SourceCRS, TargetCRS, X, Y):
     Y = data["y"]
     return X,Y
 
-def GML_poslistData(tree,xPathString,dx,dy,scale,DecimalNumbers):
-#group X and Y Coordinates of polylines
-    posLists = tree.findall(xPathString)
-    xyPosList = []
+def GMLSourceCRS(tree):
+	#srsName of the first element in a gml tree which has one, None if there is none
+	for elem in tree.iter():
+		srsName = elem.get("srsName")
+		if srsName:
+			return srsName
+	return None
+
+#lat/lon CRS (WGS 84, ETRS89) with the north axis first, for gml without pyproj
+GeographicCRSCodes = ("4326","4258","4937","4979")
+
+def GMLTransform(tree,TargetCRS):
+	#Function which transforms x,y arrays from the CRS of a gml tree to TargetCRS, None if no transformation is needed.
+	#Coordinates of urn and url CRS names are in the axis order of the CRS, e.g. lat/lon for EPSG:4326.
+	srsName = GMLSourceCRS(tree) if TargetCRS else None
+	if srsName is None or CRSCode(srsName) == CRSCode(TargetCRS):
+		return None
+	urn = srsName.startswith(("urn:","http://www.opengis.net/def/"))
+	if pyproj is None:
+		#the epsg.io server, the axis order is only known for the common geographic CRS
+		swap = urn and CRSCode(srsName) in GeographicCRSCodes
+		transformer = None
+	else:
+		transformer = GetTransformer(srsName,TargetCRS)
+		swap = urn and pyproj.CRS(CRSName(srsName)).axis_info[0].direction in ("north","south")
+	def transform(x,y):
+		if swap:
+			x, y = y, x
+		if transformer is None:
+			return TransformCRS(srsName,TargetCRS,x,y,True)
+		return transformer.transform(x,y)
+	return transform
+
+def GML_poslistBuffers(posLists,dx,dy,scale,DecimalNumbers=None,dimension=None,transform=None):
+#Decode gml posList elements or texts into one flat array of X and Y coordinates and an offset array,
+#polyline i is coords[offsets[i]:offsets[i+1]]. Coordinates are moved by dx,dy, scaled and rounded to DecimalNumbers.
+#Without dimension a posList is read as 3D if its third value is 0, else as 2D.
+#transform(x,y) is applied to the coordinate arrays first, see GMLTransform.
+#A posList which can not be read is an empty polyline, like "_none_" before.
+    tokens = []
+    counts = []
     for posList in posLists:
-        dataPosList = posList.text
-        coordSplit = dataPosList.split()
-        try:
-            if float(coordSplit[2]) == 0:
-                XYZCountDimensions = 3
-            else:XYZCountDimensions = 2
-        except:
-            XYZCountDimensions = 2
-        x = 0
-        coordSplitXY = []
-        for j in range(0, int(len(coordSplit) / XYZCountDimensions)):
-            xy_coord = (round((float(coordSplit[x])+dx)*scale,DecimalNumbers), round((float(coordSplit[x+1])+dy)*scale,DecimalNumbers))
-            coordSplitXY.append(xy_coord)
-            x +=XYZCountDimensions
-        xyPosList.append(coordSplitXY)
-    return xyPosList
+        text = posList if isinstance(posList, str) else posList.text
+        values = text.split() if text else []
+        tokens.extend(values)
+        counts.append(len(values))
+    try:
+        values = np.array(tokens, dtype=float)
+    except ValueError:
+        # read the posLists one by one, only the bad ones are lost
+        parts = []
+        start = 0
+        for i, count in enumerate(counts):
+            try:
+                parts.append(np.array(tokens[start:start + count], dtype=float))
+            except ValueError:
+                parts.append(np.empty(0))
+                counts[i] = 0
+            start = start + count
+        values = np.concatenate(parts) if parts else np.empty(0)
+    counts = np.array(counts, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+
+    if dimension is None:
+        dims = np.full(len(counts), 2, dtype=np.int64)
+        has3 = counts >= 3
+        dims[has3] = np.where(values[starts[has3] + 2] == 0, 3, 2)
+    else:
+        dims = np.full(len(counts), dimension, dtype=np.int64)
+
+    # index of the X value of every point
+    npoints = counts // dims
+    offsets = np.concatenate([[0], np.cumsum(npoints)]).astype(np.int64)
+    local = np.arange(offsets[-1]) - np.repeat(offsets[:-1], npoints)
+    ix = np.repeat(starts, npoints) + local * np.repeat(dims, npoints)
+
+    x = values[ix]
+    y = values[ix + 1]
+    if transform is not None:
+        x, y = transform(x, y)
+    coords = np.empty((len(ix), 2))
+    coords[:, 0] = (x + dx) * scale
+    coords[:, 1] = (y + dy) * scale
+    if DecimalNumbers is not None:
+        coords = np.round(coords, DecimalNumbers)
+    return coords, offsets
+
+def BuffersToPolygons(coords,offsets):
+#Nested list of coordinate tuples from coordinate and offset arrays
+    coords = coords.tolist()
+    return [[tuple(xy) for xy in coords[offsets[i]:offsets[i+1]]] for i in range(len(offsets)-1)]
+
+def GML_poslistData(tree,xPathString,dx,dy,scale,DecimalNumbers,TargetCRS=None):
+#group X and Y Coordinates of polylines, with TargetCRS they are transformed from the CRS of the gml first
+    coords, offsets = GML_poslistBuffers(tree.findall(xPathString),dx,dy,scale,DecimalNumbers,None,GMLTransform(tree,TargetCRS))
+    return BuffersToPolygons(coords,offsets)
 
 def CreateBoundingBox(CoordinateX,CoordinateY,BoxWidth,BoxHeight,DecimalNumbers):
 #Create Boundingboxstring for use in webrequests.
@@ -162,26 +572,26 @@ def CreateBoundingBoxPolygon(CoordinateX,CoordinateY,BoxWidth,BoxHeight,DecimalN
     boundingBoxStringPolygon = "(" + str(XLeft) + ' ' + str(YTop) + ',' + str(XRight) + ' ' + str(YTop) + ',' + str(XRight) + ' ' + str(YBottom) + ',' + str(XLeft) + ' ' + str(YBottom) + ',' + str(XLeft) + ' ' + str(YTop) + ')'
     return boundingBoxStringPolygon
 		
-def PointsFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNumbers):
+def PointsFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNumbers,TargetCRS=None):
 # group X and Y Coordinates
     myrequesturl = serverName + boundingBoxString
     urlFile = urllib.request.urlopen(myrequesturl)
     tree = ET.parse(urlFile)
-    xyPosList = GML_poslistData(tree,xPathString,dx,dy,scale,DecimalNumbers)
+    xyPosList = GML_poslistData(tree,xPathString,dx,dy,scale,DecimalNumbers,TargetCRS)
     return xyPosList
 	
-def PointsFromGML(filePath,xPathString,dx,dy,scale,DecimalNumbers):
+def PointsFromGML(filePath,xPathString,dx,dy,scale,DecimalNumbers,TargetCRS=None):
 	# group X and Y Coordinates
 	tree = ET.parse(filePath)
-	xyPosList = GML_poslistData(tree,xPathString,dx,dy,scale,DecimalNumbers)
+	xyPosList = GML_poslistData(tree,xPathString,dx,dy,scale,DecimalNumbers,TargetCRS)
 	return xyPosList
 
-def DataFromWFS(serverName,boundingBoxString,xPathStringCoord,xPathStrings,dx,dy,scale,DecimalNumbers):
+def DataFromWFS(serverName,boundingBoxString,xPathStringCoord,xPathStrings,dx,dy,scale,DecimalNumbers,TargetCRS=None):
 # group textdata from WFS
     myrequesturl = serverName + boundingBoxString
     urlFile = urllib.request.urlopen(myrequesturl)
     tree = ET.parse(urlFile)
-    xyPosList = GML_poslistData(tree,xPathStringCoord,dx,dy,scale,DecimalNumbers)
+    xyPosList = GML_poslistData(tree,xPathStringCoord,dx,dy,scale,DecimalNumbers,TargetCRS)
     xPathResults = []
     for xPathString in xPathStrings:
         a = tree.findall(xPathString)
@@ -201,64 +611,228 @@ def checkIfCoordIsInsideBoundingBox(coord, min_x, min_y, max_x, max_y):
 		else:
 		    return False
 	
-def filterGMLbbox(tree,xPathString,bbx,bby,BoxWidth,BoxHeight,scale):
+def filterGMLbboxBuffers(tree,xPathString,bbx,bby,BoxWidth,BoxHeight,scale,TargetCRS=None):
+#Polylines of 2D posLists with at least one point inside the bounding box, relative to bbx,bby, scaled and rounded.
+#With TargetCRS the coordinates are transformed from the CRS of the gml first.
+#Returns the flat coordinate array and the offsets, see GML_poslistBuffers
+    min_x = bbx - (BoxWidth/2)
+    min_y = bby - (BoxHeight/2)
+    max_x = bbx + (BoxWidth/2)
+    max_y = bby + (BoxHeight/2)
+
+    coords, offsets = GML_poslistBuffers(tree.getroot().findall(xPathString),0,0,1,None,2,GMLTransform(tree,TargetCRS))
+    x = coords[:, 0]
+    y = coords[:, 1]
+    inside = (min_x <= x) & (x <= max_x) & (min_y <= y) & (y <= max_y)
+
+    # number of points inside the box per polyline
+    insideCount = np.concatenate([[0], np.cumsum(inside)])
+    keep = insideCount[offsets[1:]] > insideCount[offsets[:-1]]
+    npoints = np.diff(offsets)
+    coords = coords[np.repeat(keep, npoints)]
+    offsets = np.concatenate([[0], np.cumsum(npoints[keep])]).astype(np.int64)
+    coords = np.round((coords - (bbx, bby)) * scale)
+    return coords, offsets
+
+def filterGMLbbox(tree,xPathString,bbx,bby,BoxWidth,BoxHeight,scale,TargetCRS=None):
+#Polylines of posLists with at least one point inside the bounding box as nested lists
+    coords, offsets = filterGMLbboxBuffers(tree,xPathString,bbx,bby,BoxWidth,BoxHeight,scale,TargetCRS)
+    coords = coords.astype(np.int64).tolist()
+    return [coords[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)]
 	
-    # Bounding box definition
-    bounding_box = [bbx, bby, BoxWidth,BoxHeight]
-    min_x = bounding_box[0] - (bounding_box[2]/2)
-    min_y = bounding_box[1] - (bounding_box[3]/2)
-    max_x = bounding_box[0] + (bounding_box[2]/2)
-    max_y = bounding_box[1] + (bounding_box[3]/2)
-
-    # get data from xml
-    root = tree.getroot()
-
-    # for loop to get each element in an array
-    XMLelements = []
-    for elem in root.iter():
-        XMLelements.append(elem)
-
-    xpathfound = root.findall(xPathString)
-
-    # for loop to get all polygons in an array
-    polygons = []
-    for x in xpathfound:
-        if x.text:
-            try:
-                polygons.append(x.text.split(" "))
-            except:
-                polygons.append("_none_")
-        else:
-            polygons.append("_none_")
-
-    # for loop to get x,y coords and filter polygons inside Bounding Box
-    xyPolygons = []
-    for newPolygon in polygons:
-        polygon_is_inside_bounding_box = False
-        x = 0
-        xyPolygon = []
-        for i in range(0, int(len(newPolygon) / 2)):
-            xy_coord = [newPolygon[x], newPolygon[x + 1]]
-            xy_coord_trans = [round((float(newPolygon[x])-bbx)*scale), round((float(newPolygon[x + 1])-bby)*scale)]
-            xyPolygon.append(xy_coord_trans)
-            x += 2
-            if checkIfCoordIsInsideBoundingBox(xy_coord, min_x, min_y, max_x, max_y):
-                polygon_is_inside_bounding_box = True
-        if polygon_is_inside_bounding_box:
-            xyPolygons.append(xyPolygon)
-    return xyPolygons
-	
-def WMSRequest(serverName,boundingBoxString,fileLocation,pixWidth,pixHeight):
+GMLFeature = namedtuple("GMLFeature", ["tag", "id", "attributes", "coords", "offsets"])
+
+def iterGMLFeatures(source,posListTag="{http://www.opengis.net/gml}posList",bbox=None,dimension=2):
+#Stream the features of a gml file (filename or binary file object) one at a time.
+#Features are the children of the members of the root element, every feature is released after it is yielded.
+#attributes holds the text of the simple child elements, coords and offsets the posLists as in GML_poslistBuffers.
+#With bbox (min_x,min_y,max_x,max_y) only features with at least one point inside are yielded.
+    stack = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        depth = len(stack)
+        if depth == 2:
+            coords, offsets = GML_poslistBuffers(elem.iter(posListTag),0,0,1,None,dimension)
+            inside = True
+            if bbox is not None:
+                x = coords[:, 0]
+                y = coords[:, 1]
+                inside = bool(np.any((bbox[0] <= x) & (x <= bbox[2]) & (bbox[1] <= y) & (y <= bbox[3])))
+            if inside:
+                attributes = {}
+                for child in elem:
+                    if len(child) == 0 and child.text and child.text.strip():
+                        attributes[child.tag.split("}")[-1]] = child.text.strip()
+                featureId = None
+                for key, value in elem.attrib.items():
+                    if key.split("}")[-1] == "id":
+                        featureId = value
+                yield GMLFeature(elem.tag.split("}")[-1], featureId, attributes, coords, offsets)
+        if depth in (1, 2):
+            # the member or feature is done, release it
+            stack[-1].remove(elem)
+
+def GMLFilePolylines(filePath,posListTag,bbx,bby,BoxWidth,BoxHeight,scale):
+#Polylines of the features of a gml file with at least one point inside the bounding box,
+#relative to bbx,bby, scaled and rounded, as nested lists
+    bbox = (bbx-BoxWidth/2, bby-BoxHeight/2, bbx+BoxWidth/2, bby+BoxHeight/2)
+    polylines = []
+    for feature in iterGMLFeatures(filePath,posListTag,bbox):
+        coords = np.round((feature.coords - (bbx, bby)) * scale).tolist()
+        offsets = feature.offsets
+        for i in range(len(offsets)-1):
+            polylines.append(coords[offsets[i]:offsets[i+1]])
+    return polylines
+
+#Nesting depth of the surfaces in the boundaries of CityJSON geometries
+CityJSONSurfaceDepth = {"MultiSurface": 0, "CompositeSurface": 0, "Solid": 1, "MultiSolid": 2, "CompositeSolid": 2}
+
+def CityJSONSurfaces(geometry):
+	#Surfaces of a CityJSON geometry, a surface is a list of rings, the first ring is the outer one
+	depth = CityJSONSurfaceDepth.get(geometry.get("type"))
+	if depth is None:
+		return []
+	surfaces = geometry["boundaries"]
+	for i in range(depth):
+		surfaces = list(itertools.chain.from_iterable(surfaces))
+	return surfaces
+
+def CityJSONTriangles(data,dx,dy,lods=None,bbox=None,scale=1000):
+	#Triangles of the CityObjects of a CityJSON dict, merged per LOD. The vertices are converted to meters relative to dx,dy
+	#and multiplied with scale, every surface is split in a fan of triangles of its outer ring. lods is a list of LODs like
+	#[2] or ["1.2"], a LOD matches when it starts with one of them. With bbox (xmin,ymin,xmax,ymax) in the output units only
+	#the triangles with the first vertex inside are kept.
+	#Returns {lod: (triangles (n,3,3), ids, starts)}, the triangles of CityObject ids[i] start at starts[i]
+	vertices = np.asarray(data["vertices"],dtype=np.float64).reshape(-1,3)
+	if "transform" in data:
+		vertices = vertices * data["transform"]["scale"] + data["transform"]["translate"]
+	vertices = (vertices - [dx,dy,0]) * scale
+
+	#vertex indices of the outer rings per LOD, with the number of rings of every CityObject
+	rings = {}
+	for objectId,cityObject in data["CityObjects"].items():
+		for geometry in cityObject.get("geometry",[]):
+			lod = str(geometry.get("lod"))
+			if lods is not None and not any(lod.startswith(str(i)) for i in lods):
+				continue
+			surfaces = CityJSONSurfaces(geometry)
+			flat, lengths, ids, counts = rings.setdefault(lod,([],[],[],[]))
+			flat.extend(itertools.chain.from_iterable(i[0] for i in surfaces))
+			lengths.extend(len(i[0]) for i in surfaces)
+			if ids and ids[-1] == objectId:
+				counts[-1] = counts[-1] + len(surfaces)
+			else:
+				ids.append(objectId)
+				counts.append(len(surfaces))
+
+	result = {}
+	for lod,(flat,lengths,ids,counts) in rings.items():
+		flat = np.asarray(flat,dtype=np.int64)
+		lengths = np.asarray(lengths,dtype=np.int64)
+		starts = np.cumsum(lengths) - lengths
+		owner = np.repeat(np.arange(len(ids)),counts)
+
+		#fan triangulation, ring r gives the triangles (0,k+1,k+2) for k < length-2
+		n = np.maximum(lengths - 2,0)
+		ring = np.repeat(np.arange(len(lengths)),n)
+		k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n,n)
+		first = starts[ring]
+		triangles = vertices[np.stack([flat[first],flat[first+k+1],flat[first+k+2]],axis=1)]
+		owner = owner[ring]
+
+		if bbox is not None:
+			x = triangles[:,0,0]
+			y = triangles[:,0,1]
+			mask = (bbox[0] <= x) & (x <= bbox[2]) & (bbox[1] <= y) & (y <= bbox[3])
+			triangles = triangles[mask]
+			owner = owner[mask]
+
+		kept = np.flatnonzero(np.diff(owner,prepend=-1) != 0)
+		result[lod] = (triangles,[ids[i] for i in owner[kept]],kept)
+	return result
+
+def WMSRequest(serverName,boundingBoxString,fileLocation,pixWidth,pixHeight,cache=None):
     # perform a WMS OGC webrequest( Web Map Service). This is loading images.
+    # with a TileCache the image is stored under its request url, the returned
+    # resource is then a response object with the data of the cache
     myrequestURL = serverName + boundingBoxString
     myrequestURL = myrequestURL.replace("width=3000", "width=" + str(pixWidth))
     myrequestURL = myrequestURL.replace("height=3000", "height=" + str(pixHeight))
-    resource = urllib.request.urlopen(myrequestURL)
+    if cache is None:
+        resource = urllib.request.urlopen(myrequestURL)
+        data = resource.read()
+    else:
+        data = cache.request(requests,myrequestURL,(myrequestURL,0,0,0))
+        resource = urllib.response.addinfourl(io.BytesIO(data),email.message.Message(),myrequestURL,200)
     output1 = open(fileLocation, "wb")
-    output1.write(resource.read())
+    output1.write(data)
     output1.close()
     return fileLocation, resource, myrequestURL
 
+class LayerPipeline:
+	#Import several layers at once. The fetch step of every layer (downloads and parsing) runs in a worker pool,
+	#the build steps, which change the document, run afterwards one after another in the calling thread.
+
+	def __init__(self,workers=6):
+		self.workers = workers
+		self.layers = []
+		self.cancelled = threading.Event()
+		self.futures = {}
+
+	def add(self,name,fetch,build):
+		#fetch() runs in a worker and returns the data for build(data)
+		self.layers.append((name,fetch,build))
+
+	def cancel(self):
+		#Fetches which did not start yet are dropped at once, running ones finish in the background
+		self.cancelled.set()
+		for future in list(self.futures):
+			future.cancel()
+
+	def run(self,progress=None,poll=0.1):
+		#progress(done,total,name) is called in the calling thread when a layer is fetched and every poll seconds
+		#with name None, it can return False to cancel. Returns a dict with the exceptions of failed layers,
+		#of the fetch or of the build step.
+		results = {}
+		errors = {}
+		total = len(self.layers)
+		executor = ThreadPoolExecutor(max_workers=self.workers)
+		self.futures = {executor.submit(fetch): name for name,fetch,build in self.layers}
+		futures = self.futures
+		pending = set(futures)
+		try:
+			while pending and not self.cancelled.is_set():
+				done, pending = wait(pending,timeout=poll,return_when=FIRST_COMPLETED)
+				for future in done:
+					name = futures[future]
+					try:
+						results[name] = future.result()
+					except Exception as e:
+						errors[name] = e
+					if progress is not None and progress(len(results)+len(errors),total,name) is False:
+						self.cancel()
+				if not done and progress is not None and progress(len(results)+len(errors),total,None) is False:
+					self.cancel()
+		finally:
+			# running fetches of a cancelled import finish in the background and are dropped
+			for future in pending:
+				future.cancel()
+			executor.shutdown(wait=not self.cancelled.is_set())
+
+		# a failed build does not stop the other layers
+		for name,fetch,build in self.layers:
+			if self.cancelled.is_set():
+				break
+			if name in results:
+				try:
+					build(results[name])
+				except Exception as e:
+					errors[name] = e
+		return errors
+
 def MortonCode(X,Y,Xmod,Ymod,TileDimension):
 	# convert a x and y coordinate to a mortoncode
 	x = bin(int(math.floor(((X - Xmod)/TileDimension))))
@@ -307,8 +881,163 @@ def TMSBboxFromTileXY(TileX,TileY,zoom):
 
 	return S_deg,W_deg,N_deg,E_deg
 
-def TMS_WMTSCombinedMapFromLatLonBbox(lat,lon,bboxWidth,bboxHeight,zoomL,pixels,TMS_WMTS,ServerName):
+class TileCache:
+	#Persistent cache of map tiles in a single MBTiles-style SQLite file.
+	#Tiles are keyed by server, z, x and y, other requests are stored with
+	#z=x=y=0 under their url. Expiry follows the HTTP cache headers, the least
+	#recently used tiles are removed when the file grows beyond maxBytes.
+	#In offline mode only cached tiles are used, also when they are expired.
+
+	def __init__(self,path,maxBytes=512*1024*1024,offline=False,defaultMaxAge=7*24*3600):
+		self.path = path
+		self.maxBytes = maxBytes
+		self.offline = offline
+		self.defaultMaxAge = defaultMaxAge
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path,check_same_thread=False)
+		self.db.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+		self.db.execute("INSERT OR IGNORE INTO metadata VALUES ('name','GIS2BIM tile cache')")
+		self.db.execute("CREATE TABLE IF NOT EXISTS tiles (server TEXT, zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB, size INTEGER, expires REAL, etag TEXT, last_modified TEXT, accessed REAL, PRIMARY KEY (server, zoom_level, tile_column, tile_row))")
+		self.db.execute("CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed)")
+		self.db.commit()
+		self.size = self.db.execute("SELECT COALESCE(SUM(size),0) FROM tiles").fetchone()[0]
+
+	def get(self,server,z,x,y):
+		#Cached tile as dict with data, expires, etag and last_modified or None
+		with self.lock:
+			row = self.db.execute("SELECT tile_data, expires, etag, last_modified FROM tiles WHERE server=? AND zoom_level=? AND tile_column=? AND tile_row=?",(server,z,x,y)).fetchone()
+			if row is None:
+				return None
+			self.db.execute("UPDATE tiles SET accessed=? WHERE server=? AND zoom_level=? AND tile_column=? AND tile_row=?",(time.time(),server,z,x,y))
+			self.db.commit()
+		return {"data": row[0], "expires": row[1], "etag": row[2], "last_modified": row[3]}
+
+	def expires(self,headers):
+		#Expiry time from Cache-Control or Expires headers, None if the response must not be stored
+		now = time.time()
+		control = [i.strip().lower() for i in headers.get("Cache-Control","").split(",")]
+		if "no-store" in control:
+			return None
+		if "no-cache" in control:
+			return now
+		for i in control:
+			if i.startswith("max-age="):
+				try:
+					return now + int(i[8:])
+				except ValueError:
+					pass
+		if headers.get("Expires"):
+			try:
+				return parsedate_to_datetime(headers["Expires"]).timestamp()
+			except (TypeError,ValueError):
+				return now
+		return now + self.defaultMaxAge
+
+	def put(self,server,z,x,y,data,headers):
+		#Store a downloaded tile and remove old tiles if the cache is too large
+		expires = self.expires(headers)
+		if expires is None:
+			return
+		with self.lock:
+			old = self.db.execute("SELECT size FROM tiles WHERE server=? AND zoom_level=? AND tile_column=? AND tile_row=?",(server,z,x,y)).fetchone()
+			if old is not None:
+				self.size = self.size - old[0]
+			self.db.execute("INSERT OR REPLACE INTO tiles VALUES (?,?,?,?,?,?,?,?,?,?)",(server,z,x,y,sqlite3.Binary(data),len(data),expires,headers.get("ETag"),headers.get("Last-Modified"),time.time()))
+			self.size = self.size + len(data)
+			self.evict((server,z,x,y))
+			self.db.commit()
+
+	def refresh(self,server,z,x,y,headers):
+		#Set the new expiry time of a tile after a 304 Not Modified response
+		expires = self.expires(headers)
+		with self.lock:
+			self.db.execute("UPDATE tiles SET expires=? WHERE server=? AND zoom_level=? AND tile_column=? AND tile_row=?",(expires if expires is not None else time.time(),server,z,x,y))
+			self.db.commit()
+
+	def evict(self,keep=None):
+		#Remove the least recently used tiles until the cache fits into maxBytes
+		#the tile keep (server,z,x,y), which was just stored, is never removed
+		if self.size <= self.maxBytes:
+			return
+		if keep is None:
+			rows = self.db.execute("SELECT rowid, size FROM tiles ORDER BY accessed")
+		else:
+			rows = self.db.execute("SELECT rowid, size FROM tiles WHERE NOT (server=? AND zoom_level=? AND tile_column=? AND tile_row=?) ORDER BY accessed",keep)
+		remove = []
+		for rowid,size in rows:
+			if self.size <= self.maxBytes:
+				break
+			remove.append((rowid,))
+			self.size = self.size - size
+		self.db.executemany("DELETE FROM tiles WHERE rowid=?",remove)
+
+	def request(self,session,url,key,timeout=20):
+		#Data of url from the cache or the server, key is (server,z,x,y)
+		#session is a requests session or the requests module
+		cached = self.get(*key)
+		if cached is not None and (self.offline or cached["expires"] > time.time()):
+			return cached["data"]
+		if self.offline:
+			raise LookupError("not in the offline tile cache: " + url)
+
+		headers = {}
+		if cached is not None:
+			if cached["etag"]:
+				headers["If-None-Match"] = cached["etag"]
+			if cached["last_modified"]:
+				headers["If-Modified-Since"] = cached["last_modified"]
+		resp = session.get(url,headers=headers,timeout=timeout)
+		if resp.status_code == 304 and cached is not None:
+			self.refresh(*key,resp.headers)
+			return cached["data"]
+		resp.raise_for_status()
+		self.put(*key,resp.content,resp.headers)
+		return resp.content
+
+TileUserAgent = 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/36.0.1941.0 Safari/537.36'
+
+class TileFetcher:
+	#Download map tiles with a pool of keep-alive connections and a bounded number of workers
+
+	def __init__(self,workers=8,retries=3,timeout=20,cache=None):
+		self.workers = workers
+		self.retries = retries
+		self.timeout = timeout
+		self.cache = cache
+		self.session = HTTPSession(workers,TileUserAgent)
+
+	def fetch(self,url,key=None):
+		#Download one tile, failed requests are retried with exponential backoff
+		#with a cache and a key (server,z,x,y) the cache is checked first
+		attempt = 0
+		while True:
+			try:
+				if self.cache is not None and key is not None:
+					data = self.cache.request(self.session,url,key,self.timeout)
+				else:
+					resp = self.session.get(url,timeout=self.timeout)
+					resp.raise_for_status()
+					data = resp.content
+				tile = Image.open(io.BytesIO(data))
+				tile.load()
+				return tile
+			except (requests.RequestException,OSError):
+				if attempt >= self.retries:
+					raise
+				time.sleep(BackoffDelay(attempt))
+				attempt = attempt + 1
+
+	def mosaic(self,tiles,img):
+		#Download a list of (url,(x,y)) or (url,(x,y),key) tiles and paste each one into img at x,y as it arrives
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			futures = {executor.submit(self.fetch,url,*key): position for url,position,*key in tiles}
+			for future in as_completed(futures):
+				img.paste(future.result(),futures.pop(future))
+		return img
+
+def TMS_WMTSCombinedMapFromLatLonBbox(lat,lon,bboxWidth,bboxHeight,zoomL,pixels,TMS_WMTS,ServerName,fetcher=None):
 	#With lat/lon and bbox tilenumbers are calculated then downloaded from given server and merged into 1 images and cropped afterwards to given boundingbox
+	#fetcher is a TileFetcher, pass the same one to reuse its connections and its TileCache
 
 	#Create Boundingbox lat/lon
 	loc = GeoLocation.from_degrees(lat,lon)
@@ -375,20 +1104,18 @@ def TMS_WMTSCombinedMapFromLatLonBbox(lat,lon,bboxWidth,bboxHeight,zoomL,pixels,
 	tilesX = xl2
 	tileY = yl2
 
-	#Create URLs for image
+	#Create URLs for image and the position of each tile in the combined image
+	ServerTemplate = ServerName
 	ServerName = ServerName.replace("{z}",str(zoomL))
-	URLlist = []
-
-	for i,j in zip(tilesX,tileY):
-		URLlist.append(ServerName.replace("{y}",str(j)).replace("{x}",str(i)))
-
-	#Download TileImages
-	TileImages = []
-	opener=urllib.request.build_opener()
-	opener.addheaders=[('User-Agent','Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/36.0.1941.0 Safari/537.36')]
-	urllib.request.install_opener(opener)
-	for i in URLlist:
-		TileImages.append(Image.open(urllib.request.urlopen(i)))
+	Tiles = []
+	for t,(i,j) in enumerate(zip(tilesX,tileY)):
+		xi = t // n
+		yi = t % n
+		if TMS_WMTS:
+			position = (yi*pixels,xi*pixels)
+		else:
+			position = (xi*pixels,(n-1-yi)*pixels)
+		Tiles.append((ServerName.replace("{y}",str(j)).replace("{x}",str(i)),position,(ServerTemplate,zoomL,i,j)))
 
 	#Create new image to concatenate the tileimages in.
 	widthImg = len(rangex)*pixels
@@ -396,46 +1123,10 @@ def TMS_WMTSCombinedMapFromLatLonBbox(lat,lon,bboxWidth,bboxHeight,zoomL,pixels,
 
 	img = Image.new('RGB', (widthImg,heightImg))
 
-	LPx=[]
-	n=0
-	for i in rangex:
-		LPx.append(n*pixels)
-		n=n+1
-
-	LPy=[]
-	n=0
-	for i in rangey:
-		LPy.append(n*pixels)
-		n=n+1
-
-	LPx2=[]
-	n=len(LPy)
-	for i in LPx:
-		LPx2.append([i]*n)
-
-	LPx3=[]
-	for sublist in LPx2:
-		for item in sublist:
-			LPx3.append(item)
-
-	LPy2=[]
-	#n=len(LPy)
-	for i in LPx:
-		LPy2.append(LPy)
-
-	LPy3=[]
-	for sublist in LPy2:
-		for item in sublist:
-			LPy3.append(item)
-			
-	LPy4=LPy3[::-1]
-
-	if TMS_WMTS:
-		for i,j,k in zip(TileImages,LPy3,LPx3):
-			img.paste(i,(j,k))
-	else:
-		for i,j,k in zip(TileImages,LPx3,LPy4):
-			img.paste(i,(j,k))
+	#Download TileImages, every tile is pasted as soon as it arrives
+	if fetcher is None:
+		fetcher = TileFetcher()
+	fetcher.mosaic(Tiles,img)
 
 	#Crop Image
 	deltaHeight = TotalHeightOfTiles- bboxHeight
@@ -78,6 +78,32 @@ def CreateTempFolder(Name):
 			os.mkdir(NewFolder)
 	return NewFolder
 
+TileCache = None
+
+def GetTileCache():
+#Persistent tile cache in the FreeCAD user data folder, size (MB) and offline mode are set in the GIS preferences
+	global TileCache
+	param = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/GIS")
+	if TileCache is None:
+		folder = os.path.join(FreeCAD.ConfigGet("UserAppData"), "GIS2BIM")
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+		TileCache = GIS2BIM.TileCache(os.path.join(folder, "tilecache.mbtiles"))
+	TileCache.maxBytes = param.GetInt("TileCacheSize", 512)*1024*1024
+	TileCache.offline = param.GetBool("TileCacheOffline", False)
+	return TileCache
+
+DownloadCache = None
+
+def GetDownloadCache():
+#Download folder shared by all projects, e.g. for 3D BAG tiles, the size (MB) is set in the GIS preferences
+	global DownloadCache
+	param = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/GIS")
+	if DownloadCache is None:
+		DownloadCache = GIS2BIM.DownloadCache(os.path.join(FreeCAD.ConfigGet("UserAppData"), "GIS2BIM", "downloads"))
+	DownloadCache.maxBytes = param.GetInt("DownloadCacheSize", 2048)*1024*1024
+	return DownloadCache
+
 def ImportImage(fileLocation,width,height,scale,name,dx,dy):
 #Import image in view
     Img = FreeCAD.activeDocument().addObject('Image::ImagePlane',name)
@@ -100,8 +126,8 @@ def Buildings3D(curves3DBAG,heightData3DBAG):
         solids.append(sld)
     return solids
 
-def CurvesFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNumbers,closedValue,Face,DrawStyle,LineColor):
-    curves = GIS2BIM.PointsFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNumbers)
+def CurvesFromPoints(curves,closedValue,Face,DrawStyle,LineColor,ShapeColor=None):
+    # draw polylines given as lists of x,y coordinates
     FCcurves = []
     for i in curves:
         pointlist = []
@@ -111,9 +137,15 @@ def CurvesFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNu
         a.MakeFace = Face
         a.ViewObject.DrawStyle = DrawStyle
         a.ViewObject.LineColor = LineColor
+        if ShapeColor is not None:
+            a.ViewObject.ShapeColor = ShapeColor
         FCcurves.append(a)
     return FCcurves
 
+def CurvesFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNumbers,closedValue,Face,DrawStyle,LineColor,TargetCRS=None):
+    curves = GIS2BIM.PointsFromWFS(serverName,boundingBoxString,xPathString,dx,dy,scale,DecimalNumbers,TargetCRS)
+    return CurvesFromPoints(curves,closedValue,Face,DrawStyle,LineColor)
+
 def checkIfCoordIsInsideBoundingBox(coord, min_x, min_y, max_x, max_y):
 	if re.match(r'^-?\d+(?:\.\d+)$', coord[0]) is None or re.match(r'^-?\d+(?:\.\d+)$', coord[1]) is None:
 		return False
@@ -123,60 +155,27 @@ def checkIfCoordIsInsideBoundingBox(coord, min_x, min_y, max_x, max_y):
 		else:
 		    return False
 			
-def CurvesFromGML(tree,xPathString,dx,dy,BoxWidth,BoxHeight,scale,DecimalNumbers,closedValue,Face,DrawStyle,LineColor,ShapeColor):
-    bbx = -dx
-    bby = -dy
-	
-    # Bounding box definition
-    bounding_box = [bbx, bby, BoxWidth,BoxHeight]
-    min_x = bounding_box[0] - (bounding_box[2]/2)
-    min_y = bounding_box[1] - (bounding_box[3]/2)
-    max_x = bounding_box[0] + (bounding_box[2]/2)
-    max_y = bounding_box[1] + (bounding_box[3]/2)
-
-    # get data from xml
-    root = tree.getroot()
+def CurvesFromGML(tree,xPathString,dx,dy,BoxWidth,BoxHeight,scale,DecimalNumbers,closedValue,Face,DrawStyle,LineColor,ShapeColor,TargetCRS=None):
+    # draw the polylines with at least one point inside the bounding box
+    coords, offsets = GIS2BIM.filterGMLbboxBuffers(tree,xPathString,-dx,-dy,BoxWidth,BoxHeight,scale,TargetCRS)
+    coords = coords.tolist()
 
-    # for loop to get each element in an array
-    XMLelements = []
-    for elem in root.iter():
-        XMLelements.append(elem)
-
-    xpathfound = root.findall(xPathString)
-
-    # for loop to get all polygons in an array
     FCcurves = []
-    for x in xpathfound:
-        if x.text:
-            try:
-                newPolygon = x.text.split(" ")
-                polygon_is_inside_bounding_box = False
-                x = 0
-                xyPolygon = []
-                for i in range(0, int(len(newPolygon) / 2)):
-                    xy_coord = [newPolygon[x], newPolygon[x + 1]]
-                    xy_coord_trans = [round((float(newPolygon[x])-bbx)*scale), round((float(newPolygon[x + 1])-bby)*scale)]
-                    xyPolygon.append(xy_coord_trans)
-                    x += 2
-                    if checkIfCoordIsInsideBoundingBox(xy_coord, min_x, min_y, max_x, max_y):
-                        polygon_is_inside_bounding_box = True
-                if polygon_is_inside_bounding_box:
-                   # xyPolygons.append(xyPolygon)
-                    pointlist = []
-                    for j in xyPolygon:
-                        pointlist.append(FreeCAD.Vector(j[0], j[1], 0))
-                    a = Draft.makeWire(pointlist, closed=closedValue)
-                    a.MakeFace = Face
-                    a.ViewObject.DrawStyle = DrawStyle
-                    a.ViewObject.LineColor = LineColor
-                    a.ViewObject.ShapeColor = ShapeColor
-                    FCcurves.append(a)
-            except:
-                FCcurves.append("_none_")
-        else:
-            FCcurves.append("_none_")
+    for i in range(len(offsets)-1):
+        pointlist = [FreeCAD.Vector(x, y, 0) for x, y in coords[offsets[i]:offsets[i+1]]]
+        a = Draft.makeWire(pointlist, closed=closedValue)
+        a.MakeFace = Face
+        a.ViewObject.DrawStyle = DrawStyle
+        a.ViewObject.LineColor = LineColor
+        a.ViewObject.ShapeColor = ShapeColor
+        FCcurves.append(a)
     return FCcurves
 
+def CurvesFromGMLFile(filePath,posListTag,dx,dy,BoxWidth,BoxHeight,scale,closedValue,Face,DrawStyle,LineColor,ShapeColor):
+    # stream a gml file and draw the polylines of the features with at least one point inside the bounding box
+    curves = GIS2BIM.GMLFilePolylines(filePath,posListTag,-dx,-dy,BoxWidth,BoxHeight,scale)
+    return CurvesFromPoints(curves,closedValue,Face,DrawStyle,LineColor,ShapeColor)
+
 def PlaceText(textData,fontSize, upper):
     Texts = []
     for i, j, k in zip(textData[0], textData[1], textData[2]):
@@ -216,34 +215,25 @@ def ArchSiteCreateCheck(SiteName):
 	return ArchSiteObject
 
 def CityJSONImport(jsonFile,dX,dY,LODnumber,bboxWidth,bboxHeight):
-	#Import CityJSON File, jsonfilename, dx and dy in string/meters. Proof of Concept, very buggy and incomplete.
+	#Import CityJSON File as one mesh per LOD, jsonfilename, dx and dy in string/meters. LODnumber selects the LODs, e.g. 2 for 2.x, None for all.
+	#The ids of the CityObjects and the index of their first facet are stored in the properties CityObjectIds and CityObjectFacets.
 	layer = CreateLayer("CityJSON")	
-	data = json.load(open(jsonFile,))
-	vert = data['vertices']
-	cityobj = data['CityObjects']
-	translate = data['transform']['translate']
-	scaleX = data['transform']['scale'][0]
-	scaleY = data['transform']['scale'][1]
-	scaleZ = data['transform']['scale'][2]
-	translatex = (translate[0] -float(dX))/scaleX
-	translatey = (translate[1] -float(dY))/scaleY
-	translatez = -translate[2]/scaleZ
-	
+	with open(jsonFile) as f:
+		data = json.load(f)
+	bbox = (-500*float(bboxWidth),-500*float(bboxHeight),500*float(bboxWidth),500*float(bboxHeight))
+	lods = None if LODnumber is None else [LODnumber]
+	name = os.path.splitext(os.path.basename(jsonFile))[0]
+
 	meshes = []
-	for i in cityobj:
-		objName = i
-		for j in data['CityObjects'][objName]['geometry'][2]['boundaries']:	
-			facets = []
-			for k in j:
-				coord = (str(vert[k[0][0]][0]+translatex), str(vert[k[0][0]][1]+translatey))					
-				if checkIfCoordIsInsideBoundingBox(coord,-500*float(bboxWidth),-500*float(bboxHeight),500*float(bboxWidth),500*float(bboxHeight)):				
-					facets.append(((vert[k[0][0]][0]+translatex, vert[k[0][0]][1]+translatey, vert[k[0][0]][2]+translatez),(vert[k[0][1]][0]+translatex, vert[k[0][1]][1]+translatey, vert[k[0][1]][2]+translatez),(vert[k[0][2]][0]+translatex, vert[k[0][2]][1]+translatey, vert[k[0][2]][2]+translatez)))
-				else: pass
-			m = Mesh.Mesh(facets)
-			f = FreeCAD.activeDocument().addObject("Mesh::Feature", objName)
-			f.Mesh = m
-			meshes.append(f)
-			FreeCAD.activeDocument().getObject("CityJSON").addObject(f)
+	for lod,(triangles,ids,starts) in sorted(GIS2BIM.CityJSONTriangles(data,float(dX),float(dY),lods,bbox).items()):
+		f = FreeCAD.activeDocument().addObject("Mesh::Feature", name + "_LOD" + lod)
+		f.Mesh = Mesh.Mesh(triangles.tolist())
+		f.addProperty("App::PropertyStringList","CityObjectIds","CityJSON","Ids of the CityObjects in the mesh")
+		f.addProperty("App::PropertyIntegerList","CityObjectFacets","CityJSON","Index of the first facet of every CityObject")
+		f.CityObjectIds = ids
+		f.CityObjectFacets = starts.tolist()
+		meshes.append(f)
+		FreeCAD.activeDocument().getObject("CityJSON").addObject(f)
 	return meshes
 	
 def ArchSiteAddparameters(SiteObject):
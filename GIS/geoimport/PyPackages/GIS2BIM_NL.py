@@ -29,14 +29,12 @@ __url__ = "https://github.com/DutchSailor/GIS2BIM"
 
 from . import GIS2BIM
 
-import sys
+import os
 import json
 import urllib
 import time
 import xml.etree.ElementTree as ET
 
-import PyPackages.requests
-
 #import urllib.request, json
 
 #jsonpath = "$.GIS2BIMserversRequests.webserverRequests[?(@.title==NetherlandsPDOKServerURL)].serverrequestprefix"
@@ -92,62 +90,82 @@ def NL_GetLocationData(PDOKServer,City,Streetname,Housenumber):
 	
     return result
 	
-def bgtDownloadURL(X,Y,bboxWidth,bboxHeight,timeout):
-	polygonString = GIS2BIM.CreateBoundingBoxPolygon(X,Y,bboxWidth,bboxHeight,2)
-	
-	url = NLPDOKBGTURL1
-	url2 = NLPDOKBGTURL2
-
-	##Define data 
-	qryPart1 = '{"featuretypes":['
-	qryPart2 = '"bak","begroeidterreindeel","bord","buurt","functioneelgebied","gebouwinstallatie","installatie","kast","kunstwerkdeel","mast","onbegroeidterreindeel","ondersteunendwaterdeel","ondersteunendwegdeel","ongeclassificeerdobject","openbareruimte","openbareruimtelabel","overbruggingsdeel","overigbouwwerk","overigescheiding","paal","pand","put","scheiding","sensor","spoor","stadsdeel","straatmeubilair","tunneldeel","vegetatieobject","waterdeel","waterinrichtingselement","waterschap","weginrichtingselement","wijk","wegdeel"'
-	qryPart3 = '],"format":"gmllight","geofilter":"POLYGON('
-	qryPart4 = polygonString
-	qryPart5 = ')"}'
-	
-	data = qryPart1 +  qryPart2 + qryPart3 + qryPart4 + qryPart5
-	dataquery = data
-	
-	headers = PyPackages.requests.structures.CaseInsensitiveDict()
-	headers["accept"] = "application/json"
-	headers["Content-Type"] = "application/json"
-	
-	resp = PyPackages.requests.post(url, headers=headers, data=data)
-	
-	jsondata = json.loads(resp.text)
-	data = jsondata["downloadRequestId"]
-	urlstatus = url + "/" + data + "/status" 
-	
-	# Check URL Status
-	
-	req = urllib.request.urlopen(urlstatus)
-	req2 = req.read().decode('utf-8')
-	progressStatus = int(json.loads(req2)['progress'])
-	
-	timer = 0
-	
-	while timer < timeout:
-	    req = urllib.request.urlopen(urlstatus)
-	    req2 = req.read().decode('utf-8')    
-	    progressStatus = int(json.loads(req2)['progress'])
-	    status = json.loads(req2)['status']
-	    if status == "COMPLETED":
-	        try:
-	            downloadURL = url2 + json.loads(req2)["_links"]["download"]["href"]
-	        except:   
-	            downloadURL = "unable to get downloadlink"        
-	        message = status
-	        break
-	    elif timer > timeout:
-	        downloadURL = "empty"
-	        message = "timeout"
-	        break
-	    else: 
-	        time.sleep(1)
-	    timer = timer + 1
-	return downloadURL
+BGTFeatureTypes = ["bak","begroeidterreindeel","bord","buurt","functioneelgebied","gebouwinstallatie","installatie","kast","kunstwerkdeel","mast","onbegroeidterreindeel","ondersteunendwaterdeel","ondersteunendwegdeel","ongeclassificeerdobject","openbareruimte","openbareruimtelabel","overbruggingsdeel","overigbouwwerk","overigescheiding","paal","pand","put","scheiding","sensor","spoor","stadsdeel","straatmeubilair","tunneldeel","vegetatieobject","waterdeel","waterinrichtingselement","waterschap","weginrichtingselement","wijk","wegdeel"]
+
+class BGTDownload:
+	#Client of the PDOK BGT download api. A custom download is a job on the server, its status is polled
+	#until the zip file is ready. The interval follows the progress of the job: while it advances the next poll is
+	#planned halfway the expected rest of the time, while it does not the interval doubles, always between pollMin and pollMax.
+
+	def __init__(self,url=NLPDOKBGTURL1,host=NLPDOKBGTURL2,session=None,pollMin=0.5,pollMax=10):
+		self.url = url
+		self.host = host
+		self.session = session if session is not None else GIS2BIM.HTTPSession(2)
+		self.pollMin = pollMin
+		self.pollMax = pollMax
+
+	def request(self,X,Y,bboxWidth,bboxHeight,featuretypes=None):
+		#Start a download job for the bbox, returns the id of the job
+		polygonString = GIS2BIM.CreateBoundingBoxPolygon(X,Y,bboxWidth,bboxHeight,2)
+		data = json.dumps({"featuretypes": featuretypes or BGTFeatureTypes, "format": "gmllight", "geofilter": "POLYGON(" + polygonString + ")"})
+		headers = {"accept": "application/json", "Content-Type": "application/json"}
+		resp = self.session.post(self.url,headers=headers,data=data,timeout=30)
+		resp.raise_for_status()
+		return resp.json()["downloadRequestId"]
+
+	def status(self,requestId):
+		resp = self.session.get(self.url + "/" + requestId + "/status",timeout=30)
+		resp.raise_for_status()
+		return resp.json()
+
+	def wait(self,requestId,timeout=150):
+		#Poll the job until it is completed and return the download url, raises TimeoutError after timeout seconds
+		start = time.monotonic()
+		last = (start,0)
+		delay = self.pollMin
+		while True:
+			status = self.status(requestId)
+			if status["status"] == "COMPLETED":
+				try:
+					return self.host + status["_links"]["download"]["href"]
+				except (KeyError,TypeError):
+					raise RuntimeError("BGT download " + requestId + ": no download link")
+			if status["status"] in ("FAILED","ERROR"):
+				raise RuntimeError("BGT download " + requestId + ": " + str(status["status"]))
+			now = time.monotonic()
+			progress = int(status.get("progress",0))
+			if progress > last[1]:
+				rate = (progress - last[1]) / max(now - last[0],1e-3)
+				delay = (100 - progress) / rate / 2
+				last = (now,progress)
+			else:
+				delay = delay * 2
+			delay = min(max(delay,self.pollMin),self.pollMax)
+			remaining = start + timeout - now
+			if remaining <= 0:
+				raise TimeoutError("BGT download " + requestId + " not ready after " + str(timeout) + " s")
+			time.sleep(min(delay,remaining))
+
+	def download(self,X,Y,bboxWidth,bboxHeight,filepathZIP,folderUNZIP,timeout=150,featuretypes=None,members=None):
+		#Request, wait for and download the BGT data of a bbox, the zip file is streamed to disk and
+		#only the members matching members (e.g. ["bgt_wegdeel.gml"]) are extracted
+		downloadURL = self.wait(self.request(X,Y,bboxWidth,bboxHeight,featuretypes),timeout)
+		return GIS2BIM.downloadUnzip(downloadURL,filepathZIP,folderUNZIP,members,self.session)
+
+def bgtDownloadURL(X,Y,bboxWidth,bboxHeight,timeout,job=None):
+	#Download url of the BGT data of a bbox, "empty" after timeout seconds and
+	#"unable to get downloadlink" when the job failed or has no link, like before
+	if job is None:
+		job = BGTDownload()
+	try:
+		return job.wait(job.request(X,Y,bboxWidth,bboxHeight),timeout)
+	except TimeoutError:
+		return "empty"
+	except RuntimeError:
+		return "unable to get downloadlink"
 	
-def BAG3DDownload(bboxString, tempFolder):
+def BAG3DDownload(bboxString, tempFolder, cache=None):
+	#Download the CityJSON tiles of the 3D BAG in the bbox, tiles which are in the cache already are reused
 	url = NLTUDelftBAG3DV2
 	xPathString1 = xPathStrings3DBagV2[0]
 	xPathString2 = xPathStrings3DBagV2[1]
@@ -167,10 +185,7 @@ def BAG3DDownload(bboxString, tempFolder):
 		res.append((i.text, LBcoords, k.text, urlDownloadPrefix + i.text + ".json"))
 
 	#Download files
-	jsonFileNames = []
-	for i in res:
-		fileNme = tempFolder + '3dbag_v21031_7425c21b_' + i[0]+ '.json' 	
-		r = PyPackages.requests.get(i[3])
-		open(fileNme, 'wb').write(r.content)	
-		jsonFileNames.append(fileNme)
+	if cache is None:
+		cache = GIS2BIM.DownloadCache(os.path.join(tempFolder,"downloads"))
+	jsonFileNames = cache.fetchAll([i[3] for i in res],['3dbag_v21031_7425c21b_' + i[0] + '.json' for i in res])
 	return jsonFileNames
\ No newline at end of file
@@ -167,10 +167,8 @@ def text2coordList(datatext):
 
 def points2coordList(points):
 	''' convert Pointsobject to numpy 1D-arrays of coordinates  '''
-	x=np.array([ p[0] for p in points])
-	y=np.array([ p[1] for p in points])
-	z=np.array([ p[2] for p in points])
-	return x,y,z
+	pts=np.array(points,dtype=np.float64).reshape(-1,3)
+	return pts[:,0],pts[:,1],pts[:,2]
 #  x,y,z= points2coordList(p.Points)
 
 
@@ -178,23 +176,137 @@ def points2coordList(points):
 def coordLists2points(x,y,z):
 	''' convert coordinate lists to Points  '''
 	p=Points.Points()
-	pts=[]
-	try:
-		# simple list
-		n=len(x)
-	except Exception:
-		# numpy
-		n=x.shape(0)
-
-	for i in range(n):
-		pts.append(FreeCAD.Vector(y[i],x[i],z[i]))
-
-	p.addPoints(pts)
+	p.addPoints(np.column_stack([y,x,z]).tolist())
 	return p
 #   p= coordLists2points(x,y,z)
 
 
 
+## interpolation backends
+#
+# the old scipy.interpolate.Rbf names are kept for the dialog,
+# all radial functions are solved with RBFInterpolator on the
+# nearest neighbors of each target point
+
+RBF_KERNELS={
+	'linear' : 'linear',
+	'thin_plate' : 'thin_plate_spline',
+	'cubic' : 'cubic',
+	'quintic' : 'quintic',
+	'multiquadric' : 'multiquadric',
+	'inverse' : 'inverse_multiquadric',
+	'gaussian' : 'gaussian',
+}
+
+# kernels which are not scale invariant and need an epsilon
+RBF_SCALED=['multiquadric','inverse_multiquadric','gaussian']
+
+MODES=list(RBF_KERNELS) + ['delaunay_linear','delaunay_cubic','idw']
+
+# number of points needed by the polynomial part of the kernels
+RBF_MIN_POINTS={
+	'linear' : 1,
+	'thin_plate_spline' : 3,
+	'cubic' : 3,
+	'quintic' : 6,
+}
+
+
+def _nearest_fill(tree,z,pts,zi):
+	''' replace NaN values outside of the convex hull by the nearest data value '''
+	bad=np.isnan(zi)
+	if np.any(bad):
+		_,ix=tree.query(pts[bad])
+		zi[bad]=z[ix]
+	return zi
+
+
+def _too_few(data,mode):
+	''' True if the points cannot be solved by the mode,
+	too few points or all of them on one line '''
+	if mode in RBF_KERNELS:
+		kernel=RBF_KERNELS[mode]
+		if len(data) < RBF_MIN_POINTS.get(kernel,1):
+			return True
+		if RBF_MIN_POINTS.get(kernel,1) == 1:
+			return False
+	elif not mode.startswith('delaunay_'):
+		return False
+	if len(data) < 3:
+		return True
+	return np.linalg.matrix_rank(data-data.mean(axis=0)) < 2
+
+
+def make_interpolator(x,y,z,mode='thin_plate',neighbors=50,power=2):
+	'''make_interpolator(x,y,z,mode='thin_plate',neighbors=50,power=2)
+	returns a function f(xi,yi) which interpolates the heights z
+	for arrays xi,yi of any shape in one call
+
+	mode is one of MODES:
+	the rbf kernels use only the neighbors nearest data points,
+	delaunay_linear and delaunay_cubic interpolate on a triangulation,
+	idw weights the neighbors nearest values by distance**-power,
+	point sets too small for the mode are interpolated with idw
+	'''
+
+	from scipy.spatial import cKDTree
+
+	data=np.column_stack([np.asarray(x,dtype=np.float64),np.asarray(y,dtype=np.float64)])
+	z=np.asarray(z,dtype=np.float64)
+	k=min(neighbors,len(z))
+	tree=cKDTree(data)
+
+	if mode in MODES and _too_few(data,mode):
+		say("too few points for " + mode + ", use idw")
+		mode='idw'
+
+	if mode in RBF_KERNELS:
+		kernel=RBF_KERNELS[mode]
+		# same default shape parameter as scipy.interpolate.Rbf
+		edges=np.ptp(data,axis=0)
+		edges=edges[edges>0]
+		epsilon=1.0
+		if kernel in RBF_SCALED and len(edges):
+			epsilon=1.0/np.power(np.prod(edges)/len(z),1.0/len(edges))
+		f=scipy.interpolate.RBFInterpolator(data,z,neighbors=k,kernel=kernel,epsilon=epsilon)
+
+		def rbf(xi,yi):
+			xi=np.asarray(xi,dtype=np.float64)
+			pts=np.column_stack([xi.ravel(),np.asarray(yi,dtype=np.float64).ravel()])
+			return f(pts).reshape(xi.shape)
+
+	elif mode in ['delaunay_linear','delaunay_cubic']:
+		if mode == 'delaunay_linear':
+			f=scipy.interpolate.LinearNDInterpolator(data,z)
+		else:
+			f=scipy.interpolate.CloughTocher2DInterpolator(data,z)
+
+		def rbf(xi,yi):
+			xi=np.asarray(xi,dtype=np.float64)
+			pts=np.column_stack([xi.ravel(),np.asarray(yi,dtype=np.float64).ravel()])
+			return _nearest_fill(tree,z,pts,f(pts)).reshape(xi.shape)
+
+	elif mode == 'idw':
+
+		def rbf(xi,yi):
+			xi=np.asarray(xi,dtype=np.float64)
+			pts=np.column_stack([xi.ravel(),np.asarray(yi,dtype=np.float64).ravel()])
+			dist,ix=tree.query(pts,k=k)
+			dist=dist.reshape(len(pts),-1)
+			ix=ix.reshape(len(pts),-1)
+			with np.errstate(divide='ignore'):
+				w=1.0/dist**power
+			# a target on a data point takes its value
+			hit=np.isinf(w)
+			w[hit.any(axis=1)]=hit[hit.any(axis=1)]
+			zi=np.sum(w*z[ix],axis=1)/np.sum(w,axis=1)
+			return zi.reshape(xi.shape)
+
+	else:
+		raise ValueError("unknown interpolation mode: " + str(mode))
+
+	return rbf
+
 
 
 def interpolate(x,y,z, gridsize,mode='thin_plate',rbfmode=True,shape=None):
@@ -219,21 +331,12 @@ def interpolate(x,y,z, gridsize,mode='thin_plate',rbfmode=True,shape=None):
 	xi, yi = np.linspace(np.min(x), np.max(x), gridx), np.linspace(np.min(y), np.max(y), gridy)
 	xi, yi = np.meshgrid(xi, yi)
 
+	if not rbfmode and mode in ['linear','cubic']:
+		# the former interp2d modes
+		mode='delaunay_' + mode
 
-	if rbfmode:
-		rbf = scipy.interpolate.Rbf(x, y, z, function=mode)
-		rbf2 = scipy.interpolate.Rbf( y,x, z, function=mode)
-	else:
-		sayErr("interp2d nicht implementiert")
-		x=np.array(x)
-		y=np.array(y)
-		z=np.array(z)
-		xi, yi = np.linspace(np.min(x), np.max(x), gridx), np.linspace(np.min(y), np.max(y), gridy)
-
-		rbf = scipy.interpolate.interp2d(x, y, z, kind=mode)
-		rbf2 = scipy.interpolate.interp2d(y, x, z, kind=mode)
-
-	zi=rbf2(yi,xi)
+	rbf=make_interpolator(x,y,z,mode)
+	zi=rbf(xi,yi)
 	return [rbf,xi,yi,zi]
 
 
@@ -249,20 +352,19 @@ def showFace(rbf,rbf2,x,y,gridsize,shapeColor,bound):
 	pts2=[]
 	xi, yi = np.linspace(np.min(x), np.max(x), grids), np.linspace(np.min(y), np.max(y), grids)
 
-	for ix in xi:
-		points=[]
-		for iy in yi:
-			iz=float(rbf(ix,iy))
+	# all heights of the grid in one call
+	xx,yy=np.meshgrid(xi,yi,indexing='ij')
+	zz=rbf(xx,yy)
 
 #---------------------- special hacks #+#
-			if bound>0:
-				if iz > bound: iz = bound
-				if iz < -bound: iz = -bound
+	if bound>0:
+		zz=np.clip(zz,-bound,bound)
 
-#			if rbf2!=None:
-#				iz -= float(rbf2(ix,iy))
+#	if rbf2!=None:
+#		zz -= rbf2(xx,yy)
 
-			points.append(FreeCAD.Vector(iy,ix,iz))
+	for ix,row in enumerate(zz):
+		points=[FreeCAD.Vector(iy,xi[ix],iz) for iy,iz in zip(yi,row)]
 		w=Draft.makeWire(points,closed=False,face=False,support=None)
 		ws.append(w)
 		pts2.append(points)
@@ -328,7 +430,10 @@ def createElevationGrid(mode,rbfmode=True,source=None,gridCount=20,zfactor=20,bo
 	'inverse' : (1.0, 1.0, 0.0),
 	'multiquadric' : (1.0, .0, 1.0),
 	'gaussian' : (1.0, 1.0, 1.0),
-	'quintic' :(0.5,1.0, 0.0)
+	'quintic' :(0.5,1.0, 0.0),
+	'delaunay_linear' : (1.0, 0.6, 0.0),
+	'delaunay_cubic' : (0.0, 0.6, 1.0),
+	'idw' : (0.6, 0.6, 0.6)
 	}
 
 	say("Source",source,"mode",mode)
@@ -362,10 +467,11 @@ def createElevationGrid(mode,rbfmode=True,source=None,gridCount=20,zfactor=20,bo
 		else:
 			raise Exception("don't know to get points")
 
-		x=[v[1] for v in pts]
-		y=[v[0] for v in pts]
+		pts=np.array(pts,dtype=np.float64).reshape(-1,3)
+		x=pts[:,1]
+		y=pts[:,0]
 		# staerker
-		z=[zfactor*v[2] for v in pts]
+		z=zfactor*pts[:,2]
 		px= coordLists2points(x,y,z)
 		Points.show(Points.Points(px))
 
@@ -380,16 +486,8 @@ def createElevationGrid(mode,rbfmode=True,source=None,gridCount=20,zfactor=20,bo
 
 	gridsize=gridCount
 
-	rbf,xi,yi,zi1 = interpolate(x,y,z, gridsize,mode,rbfmode)
-	
-	# hilfsebene
-	xe=[100,-100,100,-100]
-	ye=[100,100,-100,-100]
-	ze=[20,10,20,5]
-
-	rbf2,xi2,yi2,zi2 = interpolate(xe,ye,ze, gridsize,mode,rbfmode,zi1.shape)
-	#zi=zi1-zi2
-	zi=zi1
+	rbf,xi,yi,zi = interpolate(x,y,z, gridsize,mode,rbfmode)
+	rbf2=None
 
 	try: color=modeColor[mode]
 	except Exception: color=(1.0,0.0,0.0)
@@ -404,7 +502,7 @@ def createElevationGrid(mode,rbfmode=True,source=None,gridCount=20,zfactor=20,bo
 	return rc
 
 # radial basis function interpolator instance
-# http://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.Rbf.html
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.RBFInterpolator.html
 
 
 '''
@@ -465,7 +563,7 @@ def dialog(points):
 	l=QtGui.QLabel("Model" )
 	box.addWidget(l)
 	w.mode = QtGui.QListWidget()
-	w.mode.addItems( ['linear','thin_plate', 'cubic','inverse','multiquadric','gaussian' ,'quintic' ])
+	w.mode.addItems(MODES)
 	box.addWidget(w.mode)
 
 	l=QtGui.QLabel("count grid lines" )
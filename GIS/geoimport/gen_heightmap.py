@@ -16,6 +16,8 @@ from matplotlib import cm
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d.axes3d import *
 
+from . import pointgrid
+
 
 
 
@@ -25,37 +27,12 @@ def gengrid(pcl):
 	returns a numpy array
 	'''
 
-	xmin=pcl.Points.BoundBox.XMin
-	xmax=pcl.Points.BoundBox.XMax
-	ymin=pcl.Points.BoundBox.YMin
-	ymax=pcl.Points.BoundBox.YMax
-
-	for i,p in enumerate(pcl.Points.Points):
-		if p.x== xmin and p.y == ymin: 
-			print ("a",i,p)
-			a=i
-		if p.x== xmax and p.y == ymin: 
-			print ("b",i,p)
-			b=i
-		if p.x== xmin and p.y == ymax: 
-			print ("c",i,p)
-			c=i
-		if p.x== xmax and p.y == ymax: 
-			print ("d",i,p)
-			d=i
-
-	assert(a-b==c-d)
-	assert(a-c==b-d)
-
-	lx=b-a+1
-	ly=(a-c)/lx +1 
-
-	assert(lx*ly==len(pcl.Points.Points))
-
-	pts=np.array(pcl.Points.Points)
-	grid=pts.reshape(lx,ly,3)
-	print ("dim grind ", len(pcl.Points.Points),lx,ly)
-	return grid
+	grid=pointgrid.infer_grid(pcl.Points.Points)
+	assert(grid.missing == 0)
+
+	lx,ly=grid.columns,grid.rows
+	print ("dim grind ", len(grid.pts),lx,ly)
+	return grid.points()
 
 
 ## create and display a matplotlib plot
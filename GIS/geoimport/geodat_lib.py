@@ -13,46 +13,33 @@ import numpy as np
 from pivy import coin
 import time
 
+from . import pointgrid
 
 
 
-def getShape(pts):
-
-	sx=pts[0][0]
-	sy=pts[0][1]
-	d0=0
 
-	for i,p in enumerate(pts):
-		ex=p[0]
-		ey=p[1]
-		d=abs(sx-ex)+abs(sy-ey)
-		if d<d0:
-#			print ("found ", i,p)
-			break
-		d0=d
+def getShape(pts):
+	'''columns and rows of a rectangle grid point cloud'''
 
-	assert(len(pts)%i == 0)
-	return i,len(pts)//i
+	grid=pointgrid.infer_grid(pts)
+	if grid.missing:
+		raise ValueError("the point cloud is not a complete grid, {} of {} x {} points are missing".format(
+			grid.missing,grid.columns,grid.rows))
+	return grid.columns,grid.rows
 
 
 def reduceGrid(pts,ku=100,kv=50):
 	''' simplify data '''
 
 	wb, eb, sb, nb = 3, 3, 3, 1
-	lu,lv=getShape(pts)
-
-	pts2=[]
-	for v in range(lv):
-		if v<sb or v>lv-nb-1:
-			pass
-		else:
-			if v%kv !=0: continue
-		for u in range(lu):
-			if u<wb or u>lu-eb-1:
-				pass
-			else:
-				if u%ku !=0: continue 
-			pts2.append(pts[v*lu+u])
+	grid=pointgrid.infer_grid(pts)
+	lu,lv=grid.columns,grid.rows
+
+	u=np.arange(lu)
+	v=np.arange(lv)
+	keepu=(u%ku==0)|(u<wb)|(u>lu-eb-1)
+	keepv=(v%kv==0)|(v<sb)|(v>lv-nb-1)
+	pts2=[FreeCAD.Vector(*p) for p in grid.points()[keepv][:,keepu].reshape(-1,3)]
 
 	p=Points.Points(pts2)
 	Points.show(p)
@@ -73,7 +60,8 @@ def showFrame(pts,u=0,v=0,d=10,lu=None,lv=None):
 		ff=FreeCAD.ActiveDocument.addObject("Part::FeaturePython","frame")
 		ViewProvider(ff.ViewObject)
 
-	a,b,c,d = pts[u+v*lu], pts[u+v*lu+d],  pts[u+v*lu +d*lu +d],pts[u+v*lu +d*lu],
+	rows=pointgrid.raster(pts,lu)
+	a,b,c,d = [FreeCAD.Vector(*rows[j,i]) for j,i in [(v,u),(v,u+d),(v+d,u+d),(v+d,u)]]
 	sha=Part.makePolygon([a,b,c,d,a])
 
 	ff.Shape=sha
@@ -32,14 +32,16 @@ https://github.com/Jorl17/open-elevation/issues/33
 https://github.com/Jorl17/open-elevation/issues/29
 """
 
+import atexit
 import json
-import requests
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-# import FreeCAD
-import FreeCADGui
+from .http_tools import TokenBucket, backoff_delay, make_session
 
-base_source = "https://api.open-elevation.com/api/v1/lookup?locations="
+base_source = "https://api.open-elevation.com/api/v1/lookup"
 
 """
 browser
@@ -48,115 +50,193 @@ https://api.open-elevation.com/api/v1/lookup?locations=46.7869,8.0439
 is on Brienzer Rothorn, thus 2242 is correct :-)
 
 Python
-import requests, json
-r=requests.get("https://api.open-elevation.com/api/v1/lookup?locations=46.78690,8.04390", timeout=30)
-r.text
-'{"results": [{"latitude": 46.7869, "elevation": 2242, "longitude": 8.0439}]}'
-json.loads(r.text)["results"][0]["elevation"]
-json.loads('{"results": [{"latitude": 46.7869, "elevation": 2242, "longitude": 8.0439}]}')["results"][0]["elevation"]
-{"results": [{"latitude": 46.7869, "elevation": 2242, "longitude": 8.0439}]}
-
 from freecad.geoosm import get_elevation_openelevation
 import importlib
 importlib.reload(get_elevation_openelevation)
 get_elevation_openelevation.get_height_single(46.7869, 8.0439)
 
-return 390000.00
+return 2242000.0
 return 0.0
 
 """
 
 
-def get_height_single(b, l):
-    """
-    get height of a single point with latitude b, longitude l
-    """
-    source = "{}{},{}".format(base_source, b, l)
-    print(source)
-
-    answer = elevation_request(source)
-
-    if answer is not None:
-        print("Answer: {}".format(answer))
-        data = json.loads(answer)["results"]
-        elevation = data[0]["elevation"]
-        return round(elevation * 1000, 2)  # in mm with 2 dezimals
-    else:
-        print("No elevation, return 0.0")
-        return 0.0
-
-
 """
-browser
-https://api.open-elevation.com/api/v1/lookup?locations=46.8076, 8.0596|46.8011, 8.0548
+bulk lookup, the points are sent as json body of a POST request
+https://github.com/Jorl17/open-elevation/blob/master/docs/api.md
 
-Python
-import requests, json
-r=requests.get("https://api.open-elevation.com/api/v1/lookup?locations=46.8076, 8.0596|46.8011, 8.0548", timeout=30)
-r.text
-"{"results": [{"latitude": 46.8076, "elevation": 1246, "longitude": 8.0596}, {"latitude": 46.8011, "elevation": 1636, "longitude": 8.0548}]}'
-d=json.loads(r.text)["results"]
-[{"latitude": 46.8076, "elevation": 1246, "longitude": 8.0596}, {"latitude": 46.8011, "elevation": 1636, "longitude": 8.0548}]
+POST https://api.open-elevation.com/api/v1/lookup
+{"locations": [{"latitude": 46.8076, "longitude": 8.0596}, {"latitude": 46.8011, "longitude": 8.0548}]}
+{"results": [{"latitude": 46.8076, "elevation": 1246, "longitude": 8.0596}, {"latitude": 46.8011, "elevation": 1636, "longitude": 8.0548}]}
 
 from freecad.geoosm import get_elevation_openelevation
 import importlib
 importlib.reload(get_elevation_openelevation)
 get_elevation_openelevation.get_height_list([["620877237", "46.8076263", "8.0596176"], ["5067330264", "46.8010987", "8.0548266"]])
 
-return {'50.3407298 11.2325036': 404000, '50.3407539 11.2327103': 404000, '50.3408268 11.2326894': 404000, '50.3408026 11.2324827': 404000, '60.0000000 10.0000000': 0}
-return {}
+return {'46.8076263 8.0596176': 1246000.0, '46.8010987 8.0548266': 1636000.0}
 
+a local stand-in server is used by giving its url:
+client = get_elevation_openelevation.OpenElevationClient(url="http://127.0.0.1:8080/api/v1/lookup")
 """
 
 
+def cache_key(lat, lon, digits=6):
+    """
+    key of a point in the result cache, 6 digits are about 0.1 m
+    """
+    return "{:.{d}f} {:.{d}f}".format(float(lat), float(lon), d=digits)
+
+
+class OpenElevationClient:
+    """
+    batch client for the open-elevation lookup api
+
+    batch_size points are sent per POST request, up to workers requests
+    run at the same time, and not more than rate requests per second are
+    started. Failed requests are retried with exponential backoff.
+    Results are kept in the json file cache_file, None disables the cache,
+    new results are written at most every save_interval seconds and by
+    flush.
+    """
+
+    def __init__(self, url=base_source, batch_size=100, workers=4, rate=2.0,
+            retries=8, timeout=30, cache_file="default", save_interval=10.0):
+        self.url = url
+        self.batch_size = batch_size
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate, capacity=workers)
+        self.session = make_session(workers)
+
+        if cache_file == "default":
+            import FreeCAD
+            cache_file = os.path.join(FreeCAD.ConfigGet("UserAppData"), "OpenElevation.json")
+        self.cache_file = cache_file
+        self.save_interval = save_interval
+        self.cache = {}
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        self.lock = threading.Lock()
+        if cache_file and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    self.cache = json.load(f)
+            except Exception:
+                print("Open-elevation cache {} is not readable, ignored".format(cache_file))
+
+    def request(self, batch):
+        """
+        elevations in m of a list of (lat, lon),
+        None if the server did not answer after all retries
+        """
+        body = {"locations": [{"latitude": float(lat), "longitude": float(lon)} for lat, lon in batch]}
+        for attempt in range(self.retries):
+            self.limiter.acquire()
+            try:
+                response = self.session.post(self.url, json=body, timeout=self.timeout)
+                if response.status_code == 200:
+                    results = response.json()["results"]
+                    if len(results) == len(batch):
+                        return [point["elevation"] for point in results]
+                print("Open-elevation answered {}, attempt {}".format(response.status_code, attempt + 1))
+            except Exception as e:
+                print("Open-elevation request failed, attempt {}: {}".format(attempt + 1, e))
+            if attempt + 1 < self.retries:
+                time.sleep(backoff_delay(attempt))
+        return None
+
+    def _fetch(self, batch):
+        elevations = self.request(batch)
+        if elevations is not None:
+            with self.lock:
+                for (lat, lon), elevation in zip(batch, elevations):
+                    self.cache[cache_key(lat, lon)] = elevation
+                self.dirty = True
+        return elevations
+
+    def elevations(self, points):
+        """
+        elevations in m of a list of (lat, lon), None for failed points
+        """
+        keys = [cache_key(lat, lon) for lat, lon in points]
+        missing = {}
+        for key, point in zip(keys, points):
+            if key not in self.cache and key not in missing:
+                missing[key] = point
+
+        todo = list(missing.values())
+        batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(self._fetch, batches))
+            self.save()
+
+        return [self.cache.get(key) for key in keys]
+
+    def save(self, force=False):
+        """
+        write the cache file if new results were added and the last
+        write is older than save_interval seconds, or with force
+        """
+        if not self.cache_file or not self.dirty:
+            return
+        if not force and time.monotonic() - self.saved_at < self.save_interval:
+            return
+        with self.lock:
+            data = dict(self.cache)
+            self.dirty = False
+            self.saved_at = time.monotonic()
+        with open(self.cache_file + ".part", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(self.cache_file + ".part", self.cache_file)
+
+    def flush(self):
+        """write all new results to the cache file"""
+        self.save(force=True)
+
+
+_client = None
+
+
+def get_client():
+    """
+    the client shared by all importers
+    """
+    global _client
+    if _client is None:
+        _client = OpenElevationClient()
+        atexit.register(_client.flush)
+    return _client
+
+
+def get_height_single(b, l):
+    """
+    get height of a single point with latitude b, longitude l
+    """
+    elevation = get_client().elevations([(b, l)])[0]
+
+    if elevation is not None:
+        return round(elevation * 1000, 2)  # in mm with 2 dezimals
+    else:
+        print("No elevation, return 0.0")
+        return 0.0
+
+
 def get_height_list(points):
     """
-    get heights for a list of points
+    get heights for a list of points [id, lat, lon]
+    points without answer of the server are missing in the result
     """
+    latlon = [(float(p[1]), float(p[2])) for p in points]
     heights = {}
-    i = 0
-    size = len(points)
-    while i < size:
-        source = base_source
-        ii = 0
-        if i > 0:
-            time.sleep(1)
-        while ii < 20 and i < size:  # send maximum 20 points in one request
-            p = points[i]
-            ss = "{}, {}|".format(p[1], p[2])
-            source += ss
-            i += 1
-            ii += 1
-        source += "60.0,10.0"  # what is the reason for this?
-        print(source)
-
-        answer = elevation_request(source)
-
-        if answer is not None:
-            print("Answer: {}".format(answer))
-            data = json.loads(answer)["results"]
-            for point in data:
-                key = "{:.7f} {:.7f}".format(point["latitude"], point["longitude"])
-                heights[key] = round(point["elevation"] * 1000, 2)
+    client = get_client()
+    elevations = client.elevations(latlon)
+    client.flush()
+    for (lat, lon), elevation in zip(latlon, elevations):
+        if elevation is not None:
+            key = "{:.7f} {:.7f}".format(lat, lon)
+            heights[key] = round(elevation * 1000, 2)
 
     return heights
-
-
-def elevation_request(apistring):
-    answer = None
-    count = 1
-    while count < 50:  # 50 x 30 = 1500 sek = halbe stunde!!!
-        print("Try fetching elevations, attempt {}".format(count))
-        FreeCADGui.updateGui()
-        try:
-            response = requests.get(apistring, timeout=30)
-        except Exception:
-            response = None
-        count += 1
-        time.sleep(5)
-        if response is not None:
-            answer = response.text
-            if "502 Bad Gateway" not in answer:
-                break
-
-    return answer
@@ -52,6 +52,11 @@ get_elevation_srtm4.get_height_list(pts)
 
 """
 
+import os
+from collections import OrderedDict
+
+import numpy as np
+
 try:
     from srtm4 import srtm4
     nosrtm4 = False
@@ -60,6 +65,181 @@ except Exception:
     nosrtm4 = True
 
 
+"""
+srtm4 starts an external program for every call. To not call it per point,
+for batches of at least BATCH_MIN points in a tile the heights are sampled
+once on the 3 arc second SRTM grid of the tile and the grid is saved as
+.npy file. Later lookups load the tile memory-mapped and interpolate
+bilinear, all points of a tile in one array operation. Fewer points in a
+tile which is not sampled yet are asked from srtm4 directly.
+"""
+
+TILE_SIZE = 0.25  # degree
+TILE_SAMPLES = 301  # 3 arc seconds
+BATCH_MIN = 256  # points in a tile to sample the whole tile
+
+
+class ElevationService:
+    """
+    heights in mm from SRTM tiles cached on disk
+    max_tiles tiles are kept open, least recently used ones are closed
+    """
+
+    def __init__(self, directory=None, max_tiles=16, batch_min=BATCH_MIN):
+        if directory is None:
+            import FreeCAD
+            directory = os.path.join(FreeCAD.ConfigGet("UserAppData"), "geodat_SRTM4")
+        self.directory = directory
+        self.max_tiles = max_tiles
+        self.batch_min = batch_min
+        self.tiles = OrderedDict()
+        self.nodes = {}
+        # False if the srtm4 version only takes single points
+        self.list_input = True
+
+    def tile_path(self, i, j):
+        return os.path.join(self.directory, "srtm4_{}_{}_{}.npy".format(TILE_SIZE, i, j))
+
+    def direct(self, lat, lon):
+        """
+        heights in mm of a few points asked from srtm4 directly,
+        in one call if srtm4 takes lists
+        """
+        lat = np.asarray(lat, dtype=np.float64).tolist()
+        lon = np.asarray(lon, dtype=np.float64).tolist()
+        heights = None
+        if self.list_input:
+            try:
+                heights = srtm4(lon, lat)
+            except TypeError:
+                self.list_input = False
+        if heights is None:
+            heights = [srtm4(x, y) for x, y in zip(lon, lat)]
+        return np.round(np.asarray(heights, dtype=np.float64).reshape(-1) * 1000, 2)
+
+    def sample_tile(self, i, j):
+        """
+        heights in m on the grid of tile i, j, row index is latitude,
+        None if srtm4 does not take lists, the grid is not asked point
+        by point
+        """
+        if not self.list_input:
+            return None
+        steps = np.linspace(0.0, TILE_SIZE, TILE_SAMPLES)
+        lat, lon = np.meshgrid(i * TILE_SIZE + steps, j * TILE_SIZE + steps, indexing="ij")
+        try:
+            # one call of the srtm4 program for the whole grid
+            heights = srtm4(lon.ravel().tolist(), lat.ravel().tolist())
+        except TypeError:
+            self.list_input = False
+            return None
+        return np.asarray(heights, dtype=np.float32).reshape(TILE_SAMPLES, TILE_SAMPLES)
+
+    def has_tile(self, i, j):
+        """True if the grid of tile i, j is sampled already"""
+        return (i, j) in self.tiles or os.path.isfile(self.tile_path(i, j))
+
+    def tile(self, i, j):
+        """
+        the height grid of tile i, j, sampled on first use,
+        None if it can not be sampled
+        """
+        key = (i, j)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+
+        path = self.tile_path(i, j)
+        if not os.path.isfile(path):
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            grid = self.sample_tile(i, j)
+            if grid is None:
+                return None
+            with open(path + ".part", "wb") as f:
+                np.save(f, grid)
+            os.replace(path + ".part", path)
+
+        self.tiles[key] = np.load(path, mmap_mode="r")
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return self.tiles[key]
+
+    def heights(self, lat, lon):
+        """
+        heights in mm of the points lat, lon, arrays of the same shape
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        result = np.zeros(lat.shape)
+        if nosrtm4 is True or result.size == 0:
+            return result
+
+        flat_lat = lat.ravel()
+        flat_lon = lon.ravel()
+        flat = result.ravel()
+        ti = np.floor(flat_lat / TILE_SIZE).astype(np.int64)
+        tj = np.floor(flat_lon / TILE_SIZE).astype(np.int64)
+        keys, inverse = np.unique(np.stack([ti, tj], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        scale = (TILE_SAMPLES - 1) / TILE_SIZE
+        counts = np.bincount(inverse, minlength=len(keys))
+        for k, (i, j) in enumerate(keys.tolist()):
+            mask = inverse == k
+            grid = None
+            if counts[k] >= self.batch_min or self.has_tile(i, j):
+                grid = self.tile(i, j)
+            if grid is None:
+                flat[mask] = self.direct(flat_lat[mask], flat_lon[mask])
+                continue
+
+            # bilinear interpolation in the grid cell of each point
+            r = (flat_lat[mask] - i * TILE_SIZE) * scale
+            c = (flat_lon[mask] - j * TILE_SIZE) * scale
+            r0 = np.clip(np.floor(r).astype(np.int64), 0, TILE_SAMPLES - 2)
+            c0 = np.clip(np.floor(c).astype(np.int64), 0, TILE_SAMPLES - 2)
+            dr = r - r0
+            dc = c - c0
+            h = (grid[r0, c0] * (1 - dr) * (1 - dc)
+                + grid[r0 + 1, c0] * dr * (1 - dc)
+                + grid[r0, c0 + 1] * (1 - dr) * dc
+                + grid[r0 + 1, c0 + 1] * dr * dc)
+            flat[mask] = np.round(h * 1000, 2)
+
+        return result
+
+    def node_heights(self, ids, lat, lon):
+        """
+        heights in mm of osm nodes, every node id is looked up once
+        until forget_nodes is called
+        """
+        ids = np.asarray(ids).tolist()
+        missing = [k for k, node_id in enumerate(ids) if node_id not in self.nodes]
+        if missing:
+            lat = np.asarray(lat, dtype=np.float64)[missing]
+            lon = np.asarray(lon, dtype=np.float64)[missing]
+            for k, h in zip(missing, self.heights(lat, lon).tolist()):
+                self.nodes[ids[k]] = h
+        return np.array([self.nodes[node_id] for node_id in ids])
+
+    def forget_nodes(self):
+        self.nodes = {}
+
+
+_service = None
+
+
+def get_service():
+    """
+    the elevation service shared by all importers
+    """
+    global _service
+    if _service is None:
+        _service = ElevationService()
+    return _service
+
+
 def get_height_single(b, l):
     """
     get height of a single point with latitude b, longitude l
@@ -68,20 +248,17 @@ def get_height_single(b, l):
         return(0.0)
 
     elevation = srtm4(float(l), float(b))
-    # print("lat: {}, long: {}, ele: {}".format(b, l, elevation))
     return round(elevation * 1000, 2)
 
 
 def get_height_list(points):
     """
-    uses get_height_single to get the height of each point
+    get the heights of a list of points [id, lat, lon] in one batch
     """
+    lat = [float(pt[1]) for pt in points]
+    lon = [float(pt[2]) for pt in points]
     heights = {}
-    for pt in points:
-        # print(pt)
-        key = "{:.7f} {:.7f}".format(float(pt[1]), float(pt[2]))
-        # print(key)
-        # swap will happen in other method
-        heights[key] = get_height_single(pt[1], pt[2])
-        # print(heights[key])
+    for b, l, h in zip(lat, lon, get_service().heights(lat, lon).tolist()):
+        key = "{:.7f} {:.7f}".format(b, l)
+        heights[key] = h
     return heights
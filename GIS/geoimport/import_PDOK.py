@@ -207,62 +207,74 @@ class GIS_NL_Dialog(QtWidgets.QDialog):
 		width = float(self.bboxWidth.text())
 		height = float(self.bboxHeight.text())
 		GIS2BIM_FreeCAD.CreateLayer("PDOK")
-		fileLocationWMS = self.tempFolderPath + "wms.jpg"
+		tileCache = GIS2BIM_FreeCAD.GetTileCache()
+
+		#All downloads run at the same time, the layers are added to the document when all data is there
+		pipeline = GIS2BIM.LayerPipeline()
 
 		#Create Cadastral Parcels 2D
 		if self.clsCad.isChecked() is True:
-			GIS_2D_Cadastral_Parcel = GIS2BIM_FreeCAD.CreateLayer("GIS_2D_Cadastral_Parcel")	
-			CadastralParcelCurves = GIS2BIM_FreeCAD.CurvesFromWFS(GIS2BIM_NL.NLPDOKCadastreCadastralParcels,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISposList,-float(self.X),-float(self.Y),1000,3,False,False,u"Dashdot",(0.0,0.0,0.0))
-			FreeCAD.activeDocument().getObject("GIS_2D_Cadastral_Parcel").addObjects(CadastralParcelCurves)
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_2D_Cadastral_Parcel"))
+			def build(curves):
+				GIS_2D_Cadastral_Parcel = GIS2BIM_FreeCAD.CreateLayer("GIS_2D_Cadastral_Parcel")	
+				CadastralParcelCurves = GIS2BIM_FreeCAD.CurvesFromPoints(curves,False,False,u"Dashdot",(0.0,0.0,0.0))
+				FreeCAD.activeDocument().getObject("GIS_2D_Cadastral_Parcel").addObjects(CadastralParcelCurves)
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_2D_Cadastral_Parcel"))
+			pipeline.add("Cadastral Parcels",lambda: GIS2BIM.PointsFromWFS(GIS2BIM_NL.NLPDOKCadastreCadastralParcels,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISposList,-float(self.X),-float(self.Y),1000,3,self.CRS),build)
 
 		#Create Building outline 2D
 		if self.clsBld.isChecked() is True:
-			GIS_2D_Building_Outline = GIS2BIM_FreeCAD.CreateLayer("GIS_2D_Building_Outline")	
-			BAGCurves = GIS2BIM_FreeCAD.CurvesFromWFS(GIS2BIM_NL.NLPDOKBAGBuildingCountour,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISposList,-float(self.X),-float(self.Y),1000,3,True, True,u"Solid",(0.7,0.0,0.0))
-			FreeCAD.activeDocument().getObject("GIS_2D_Building_Outline").addObjects(BAGCurves)
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_2D_Building_Outline"))
+			def build(curves):
+				GIS_2D_Building_Outline = GIS2BIM_FreeCAD.CreateLayer("GIS_2D_Building_Outline")	
+				BAGCurves = GIS2BIM_FreeCAD.CurvesFromPoints(curves,True, True,u"Solid",(0.7,0.0,0.0))
+				FreeCAD.activeDocument().getObject("GIS_2D_Building_Outline").addObjects(BAGCurves)
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_2D_Building_Outline"))
+			pipeline.add("Building Outlines",lambda: GIS2BIM.PointsFromWFS(GIS2BIM_NL.NLPDOKBAGBuildingCountour,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISposList,-float(self.X),-float(self.Y),1000,3,self.CRS),build)
 
 		#Create 3D Building BAG 3D V2
 		if self.clsBAG3D.isChecked() is True:
-			dx = -float(self.X) * 1000
-			dy = -float(self.Y) * 1000		
-			bboxString = GIS2BIM.CreateBoundingBox(float(GIS2BIM_FreeCAD.ArchSiteCreateCheck(self.sitename).CRS_x),float(GIS2BIM_FreeCAD.ArchSiteCreateCheck(self.sitename).CRS_y),float(self.bboxWidth.text()),float(self.bboxHeight.text()),0)
-			jsonFileNames = GIS2BIM_NL.BAG3DDownload(Bbox,self.tempFolderPath)
-				
-			#Import JSON
-			for jsonFile in jsonFileNames:
-				meshes = GIS2BIM_FreeCAD.CityJSONImport(jsonFile,self.X,self.Y,2,float(self.bboxWidth.text()),float(self.bboxHeight.text()))
-
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("CityJSON"))
+			def build(jsonFileNames):
+				#Import JSON
+				for jsonFile in jsonFileNames:
+					meshes = GIS2BIM_FreeCAD.CityJSONImport(jsonFile,self.X,self.Y,2,width,height)
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("CityJSON"))
+			downloadCache = GIS2BIM_FreeCAD.GetDownloadCache()
+			pipeline.add("3D BAG",lambda: GIS2BIM_NL.BAG3DDownload(Bbox,self.tempFolderPath,downloadCache),build)
 
 		# Import Aerialphoto in view
 		if self.clsAerial.isChecked() is True:
-			GIS_Raster = GIS2BIM_FreeCAD.CreateLayer("GIS_Raster")	
-			a = GIS2BIM.WMSRequest(GIS2BIM.GetWebServerData("NL_PDOK_Luchtfoto_2020_28992", "webserverRequests", "serverrequestprefix"),Bbox,fileLocationWMS,3000,3000)
-			ImageAerialPhoto = GIS2BIM_FreeCAD.ImportImage(fileLocationWMS,width,height,1000,"luchtfoto2020",0,0)
-			ImageAerialPhoto.addProperty("App::PropertyString","WMSRequestURL")
-			ImageAerialPhoto.WMSRequestURL = a[2]
-			FreeCAD.activeDocument().getObject("GIS_Raster").addObject(FreeCAD.activeDocument().getObject(ImageAerialPhoto.Label))
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_Raster"))
+			fileLocationAerial = self.tempFolderPath + "wms.jpg"
+			def build(a):
+				GIS_Raster = GIS2BIM_FreeCAD.CreateLayer("GIS_Raster")	
+				ImageAerialPhoto = GIS2BIM_FreeCAD.ImportImage(fileLocationAerial,width,height,1000,"luchtfoto2020",0,0)
+				ImageAerialPhoto.addProperty("App::PropertyString","WMSRequestURL")
+				ImageAerialPhoto.WMSRequestURL = a[2]
+				FreeCAD.activeDocument().getObject("GIS_Raster").addObject(FreeCAD.activeDocument().getObject(ImageAerialPhoto.Label))
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_Raster"))
+			pipeline.add("Aerial Photo",lambda: GIS2BIM.WMSRequest(GIS2BIM.GetWebServerData("NL_PDOK_Luchtfoto_2020_28992", "webserverRequests", "serverrequestprefix"),Bbox,fileLocationAerial,3000,3000,tileCache),build)
 			
 		#Create Textdata Cadastral Parcels
 		if self.clsAnnotation.isChecked() is True:
-			GIS_Annotation = GIS2BIM_FreeCAD.CreateLayer("GIS_Annotation")	
-			textDataCadastralParcels = GIS2BIM.DataFromWFS(GIS2BIM_NL.NLPDOKCadastreCadastralParcelsNummeraanduiding,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISPos,GIS2BIM_NL.xPathStringsCadastreTextAngle,-float(self.X),-float(self.Y),1000,3)
-			textDataOpenbareRuimtenaam = GIS2BIM.DataFromWFS(GIS2BIM_NL.NLPDOKCadastreOpenbareruimtenaam,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISPos,GIS2BIM_NL.xPathStringsCadastreTextAngle,-float(self.X),-float(self.Y),1000,3)
-			placeTextFreeCAD1 = GIS2BIM_FreeCAD.PlaceText(textDataCadastralParcels,500,0)
-			placeTextFreeCAD2 = GIS2BIM_FreeCAD.PlaceText(textDataOpenbareRuimtenaam,2000,1)
-			FreeCAD.activeDocument().getObject("GIS_Annotation").addObjects(placeTextFreeCAD1)
-			FreeCAD.activeDocument().getObject("GIS_Annotation").addObjects(placeTextFreeCAD2)
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_Annotation"))
+			def fetch():
+				textDataCadastralParcels = GIS2BIM.DataFromWFS(GIS2BIM_NL.NLPDOKCadastreCadastralParcelsNummeraanduiding,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISPos,GIS2BIM_NL.xPathStringsCadastreTextAngle,-float(self.X),-float(self.Y),1000,3,self.CRS)
+				textDataOpenbareRuimtenaam = GIS2BIM.DataFromWFS(GIS2BIM_NL.NLPDOKCadastreOpenbareruimtenaam,Bbox,GIS2BIM_NL.NLPDOKxPathOpenGISPos,GIS2BIM_NL.xPathStringsCadastreTextAngle,-float(self.X),-float(self.Y),1000,3,self.CRS)
+				return textDataCadastralParcels, textDataOpenbareRuimtenaam
+			def build(textData):
+				GIS_Annotation = GIS2BIM_FreeCAD.CreateLayer("GIS_Annotation")	
+				placeTextFreeCAD1 = GIS2BIM_FreeCAD.PlaceText(textData[0],500,0)
+				placeTextFreeCAD2 = GIS2BIM_FreeCAD.PlaceText(textData[1],2000,1)
+				FreeCAD.activeDocument().getObject("GIS_Annotation").addObjects(placeTextFreeCAD1)
+				FreeCAD.activeDocument().getObject("GIS_Annotation").addObjects(placeTextFreeCAD2)
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_Annotation"))
+			pipeline.add("Annotations",fetch,build)
 
 		#Create Ruimtelijke plannen outline 2D
 		if self.clsBouwvlak.isChecked() is True:
-			GIS_2D_Ruimtelijke_Plannen = GIS2BIM_FreeCAD.CreateLayer("GIS_2D_Ruimtelijke_Plannen")	
-			RuimtelijkePlannenBouwvlakCurves = GIS2BIM_FreeCAD.CurvesFromWFS(GIS2BIM_NL.NLRuimtelijkeplannenBouwvlak,Bbox,".//{http://www.opengis.net/gml}posList",-float(self.X),-float(self.Y),1000,3,False, False,u"Solid",(0.0,0.0,1.0))
-			FreeCAD.activeDocument().getObject("GIS_2D_Ruimtelijke_Plannen").addObjects(RuimtelijkePlannenBouwvlakCurves)
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_2D_Ruimtelijke_Plannen"))
+			def build(curves):
+				GIS_2D_Ruimtelijke_Plannen = GIS2BIM_FreeCAD.CreateLayer("GIS_2D_Ruimtelijke_Plannen")	
+				RuimtelijkePlannenBouwvlakCurves = GIS2BIM_FreeCAD.CurvesFromPoints(curves,False, False,u"Solid",(0.0,0.0,1.0))
+				FreeCAD.activeDocument().getObject("GIS_2D_Ruimtelijke_Plannen").addObjects(RuimtelijkePlannenBouwvlakCurves)
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_2D_Ruimtelijke_Plannen"))
+			pipeline.add("Ruimtelijke Plannen",lambda: GIS2BIM.PointsFromWFS(GIS2BIM_NL.NLRuimtelijkeplannenBouwvlak,Bbox,".//{http://www.opengis.net/gml}posList",-float(self.X),-float(self.Y),1000,3,self.CRS),build)
 
 		#Create BGT 2D
 		if self.clsBGT.isChecked() is True:
@@ -270,12 +282,6 @@ class GIS_NL_Dialog(QtWidgets.QDialog):
 			folderBGT = GIS2BIM_FreeCAD.CreateTempFolder(self.tempFolderName+ '/BGT')	
 			filepathZIP = folderBGT + '.zip'
 			
-			#Download BGT
-			URL = GIS2BIM_NL.bgtDownloadURL(float(self.X),float(self.Y),float(self.bboxWidth.text()),float(self.bboxHeight.text()),timeout)
-			GIS2BIM.downloadUnzip(URL,filepathZIP,folderBGT)
-			
-			#Create Curves
-			
 			bgt_curves_faces = ["bgt_begroeidterreindeel",
 			"bgt_onbegroeidterreindeel",
 			"bgt_ondersteunendwaterdeel",
@@ -304,40 +310,70 @@ class GIS_NL_Dialog(QtWidgets.QDialog):
 			"bgt_spoor",
 			"bgt_tunneldeel"]
 
-			xpath = './/{http://www.opengis.net/gml}posList'
+			posListTag = '{http://www.opengis.net/gml}posList'
+
+			def fetch():
+				#Download BGT, only the feature types which are drawn
+				featuretypes = sorted(set(bgt_curves_lines + bgt_curves_faces))
+				GIS2BIM_NL.BGTDownload().download(float(self.X),float(self.Y),width,height,filepathZIP,folderBGT,timeout,[i[4:] for i in featuretypes],[i + '.gml' for i in featuretypes])
+
+				#Read the polylines of all files
+				curves = {}
+				for i in featuretypes:
+					path = folderBGT + '/' + i + '.gml'
+					curves[i] = GIS2BIM.GMLFilePolylines(path,posListTag,float(self.X),float(self.Y),width,height,1000)
+				return curves
+
+			def build(curves):
+				GIS2BIM_FreeCAD.CreateLayer("BGT")
 
-			GIS2BIM_FreeCAD.CreateLayer("BGT")
+				#Draw bgt_curves_lines
+				for i in bgt_curves_lines:
+					Curves = GIS2BIM_FreeCAD.CurvesFromPoints(curves[i],0,0,"Solid",(0.7,0.0,0.0),(0.0,0.0,0.0))
+					GIS2BIM_FreeCAD.CreateLayer(i)
+					FreeCAD.activeDocument().getObject(i).addObjects(Curves)
+					FreeCAD.activeDocument().getObject("BGT").addObject(FreeCAD.activeDocument().getObject(i))
+					FreeCAD.ActiveDocument.recompute()
 
-			#Draw bgt_curves_lines
-			for i in bgt_curves_lines:
-				path = folderBGT + '/' + i + '.gml'
-				tree = ET.parse(path)
-				Curves = GIS2BIM_FreeCAD.CurvesFromGML(tree,xpath,-float(self.X),-float(self.Y),float(self.bboxWidth.text()),float(self.bboxHeight.text()),1000,0,0,0,"Solid",(0.7,0.0,0.0),(0.0,0.0,0.0))
-				GIS2BIM_FreeCAD.CreateLayer(i)
-				FreeCAD.activeDocument().getObject(i).addObjects(Curves)
-				FreeCAD.activeDocument().getObject("BGT").addObject(FreeCAD.activeDocument().getObject(i))
-				FreeCAD.ActiveDocument.recompute()
+				for i,j in zip(bgt_curves_faces,bgt_curves_faces_color):
+					Curves = GIS2BIM_FreeCAD.CurvesFromPoints(curves[i],1,1,"Solid",(0.7,0.0,0.0),j)
+					GIS2BIM_FreeCAD.CreateLayer(i)
+					FreeCAD.activeDocument().getObject(i).addObjects(Curves)
+					FreeCAD.activeDocument().getObject("BGT").addObject(FreeCAD.activeDocument().getObject(i))
+					FreeCAD.ActiveDocument.recompute()
 
-			for i,j in zip(bgt_curves_faces,bgt_curves_faces_color):
-				path = folderBGT + '/' + i + '.gml'
-				tree = ET.parse(path)
-				Curves = GIS2BIM_FreeCAD.CurvesFromGML(tree,xpath,-float(self.X),-float(self.Y),float(self.bboxWidth.text()),float(self.bboxHeight.text()),1000,2,1,1,"Solid",(0.7,0.0,0.0),j)
-				GIS2BIM_FreeCAD.CreateLayer(i)
-				FreeCAD.activeDocument().getObject(i).addObjects(Curves)
-				FreeCAD.activeDocument().getObject("BGT").addObject(FreeCAD.activeDocument().getObject(i))
-				FreeCAD.ActiveDocument.recompute()
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("BGT"))
 
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("BGT"))
+			pipeline.add("BGT",fetch,build)
 
 		# Import bestemmingsplankaart
 		if self.clsBestemmingsplan.isChecked() is True:
-			GIS_Raster = GIS2BIM_FreeCAD.CreateLayer("GIS_Raster")	
-			a = GIS2BIM.WMSRequest(GIS2BIM.GetWebServerData("NL_INSPIRE_Ruimtelijke_Plannen_Totaal_28992", "webserverRequests", "serverrequestprefix"),Bbox,fileLocationWMS,3000,3000)
-			ImageAerialPhoto = GIS2BIM_FreeCAD.ImportImage(fileLocationWMS,width,height,1000,"Ruimtelijke Plannen",0,0)
-			ImageAerialPhoto.addProperty("App::PropertyString","WMSRequestURL")
-			ImageAerialPhoto.WMSRequestURL = a[2]
-			FreeCAD.activeDocument().getObject("GIS_Raster").addObject(FreeCAD.activeDocument().getObject(ImageAerialPhoto.Label))
-			FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_Raster"))
+			fileLocationPlan = self.tempFolderPath + "wms_bestemmingsplan.jpg"
+			def build(a):
+				GIS_Raster = GIS2BIM_FreeCAD.CreateLayer("GIS_Raster")	
+				ImageAerialPhoto = GIS2BIM_FreeCAD.ImportImage(fileLocationPlan,width,height,1000,"Ruimtelijke Plannen",0,0)
+				ImageAerialPhoto.addProperty("App::PropertyString","WMSRequestURL")
+				ImageAerialPhoto.WMSRequestURL = a[2]
+				FreeCAD.activeDocument().getObject("GIS_Raster").addObject(FreeCAD.activeDocument().getObject(ImageAerialPhoto.Label))
+				FreeCAD.activeDocument().getObject("PDOK").addObject(FreeCAD.activeDocument().getObject("GIS_Raster"))
+			pipeline.add("Bestemmingsplan",lambda: GIS2BIM.WMSRequest(GIS2BIM.GetWebServerData("NL_INSPIRE_Ruimtelijke_Plannen_Totaal_28992", "webserverRequests", "serverrequestprefix"),Bbox,fileLocationPlan,3000,3000,tileCache),build)
+
+		#Progress and cancel
+		progress = QtWidgets.QProgressDialog("Loading PDOK data", "Cancel", 0, len(pipeline.layers), self)
+		progress.setWindowModality(QtCore.Qt.WindowModal)
+		progress.show()
+
+		def onProgress(done,total,name):
+			progress.setValue(done)
+			if name is not None:
+				progress.setLabelText(name + " loaded")
+			QtWidgets.QApplication.processEvents()
+			return not progress.wasCanceled()
+
+		errors = pipeline.run(onProgress)
+		progress.close()
+		for name in errors:
+			FreeCAD.Console.PrintError("PDOK " + name + ": " + str(errors[name]) + "\n")
 
 		FreeCAD.ActiveDocument.recompute()
 		self.close()
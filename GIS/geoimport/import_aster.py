@@ -101,11 +101,11 @@ def import_ast(b=50.26,l=11.39):
 
 	z0= data[px,py] # relative height to origin px,py
 
-	for x in range(px-d1,px+d1):
-		for y in range(py-d2,py+d2):
-			ll=tm.fromGeographic(bs+1-1.0/3600*x,ls+1.0/3600*y)
-			pt=FreeCAD.Vector(ll[0]-center[0],ll[1]-center[1], 1000.0* (data[x,y]-z0))
-			pts.append(pt)
+	xs,ys=np.meshgrid(np.arange(px-d1,px+d1),np.arange(py-d2,py+d2),indexing='ij')
+	llx,lly=tm.fromGeographicArray(bs+1-1.0/3600*xs,ls+1.0/3600*ys)
+	zs=1000.0*(data[xs,ys]-z0)
+	for x,y,z in zip((llx-center[0]).ravel().tolist(),(lly-center[1]).ravel().tolist(),zs.ravel().tolist()):
+		pts.append(FreeCAD.Vector(x,y,z))
 
 	# display the point cloud
 	p=Points.Points(pts)
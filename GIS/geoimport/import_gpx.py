@@ -73,16 +73,16 @@ def import_gpx(filename, orig, hi):
 		print(tm.lat, tm.lon)
 		print("----------")
 
+	# map all points to xy-plane
+	center = tm.fromGeographic(tm.lat, tm.lon)
+	xs, ys = tm.fromGeographicArray(lats, lons)
+	lls = iter(zip(xs.tolist(), ys.tolist()))
+
 	for s in seg:
 		trkpts = s['trkpt']
-		n = trkpts[0]
-		center = tm.fromGeographic(tm.lat, tm.lon)
 
-		# map all points to xy-plane
 		for n in trkpts:
-			lats.append(float(n['@lat']))
-			lons.append(float(n['@lon']))
-			ll = tm.fromGeographic(float(n['@lat']), float(n['@lon']))
+			ll = next(lls)
 			h = n['ele']
 			tim = n['time']
 			t2 = re.sub('^.*T', '', tim)
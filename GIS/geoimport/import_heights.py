@@ -11,6 +11,7 @@
 import FreeCAD, FreeCADGui, Draft
 from  .transversmercator import TransverseMercator
 from .say import say
+from .progress import Progress
 
 tm=TransverseMercator()
 
@@ -41,8 +42,9 @@ def getheight(b,l):
 
 
 ## download the heights from open-elevation
+# every request is a step of reporter, without reporter the gui is updated at the end
 
-def run(b0=50.35,l0=11.17,b=50.35,le=11.17,size=40):
+def run(b0=50.35,l0=11.17,b=50.35,le=11.17,size=40,reporter=None):
 
 	tm.lat=b0
 	tm.lon=l0
@@ -77,9 +79,13 @@ def run(b0=50.35,l0=11.17,b=50.35,le=11.17,size=40):
 					)
 			points.append(v)
 
+		if reporter is not None:
+			reporter.advance()
+
 	Draft.makeWire(points,closed=False,face=False,support=None)
 	FreeCAD.activeDocument().recompute()
-	FreeCADGui.updateGui()
+	if reporter is None:
+		FreeCADGui.updateGui()
 	return FreeCAD.activeDocument().ActiveObject
 	
 
@@ -88,11 +94,13 @@ def run(b0=50.35,l0=11.17,b=50.35,le=11.17,size=40):
 def import_heights(b,le,size):
 	size=30
 
+	reporter=Progress(4*size*size,pump=FreeCADGui.updateGui)
 	lines=[]
 	for ld in range(-size,size): 
 		say("run",ld)
-		res=run(b,le,b,le +ld*0.001,size)
+		res=run(b,le,b,le +ld*0.001,size,reporter)
 		lines.append(res)
+	reporter.finish()
 
 	ll=FreeCAD.activeDocument().addObject('Part::Loft','Loft')
 	ll.Sections=lines
@@ -138,16 +138,12 @@ def import_latlon(filename,orig,hi,op):
 		pass
 	'''
 
-	lats=[]
-	lons=[]
-
-	points=[]
-	for i in range(0, len(vals), 3):
-		print(vals[i],vals[i+1],vals[i+2])
-		lats.append(float(vals[i]))
-		lons.append(float(vals[i+1]))
-		ll=tm.fromGeographic(float(vals[i]),float(vals[i+1]))
-		points.append(FreeCAD.Vector(ll[0]-center[0],ll[1]-center[1],1000*(float(vals[i+2]))))
+	vals=np.array(vals).reshape(-1,3)
+	lats=vals[:,0].tolist()
+	lons=vals[:,1].tolist()
+	px,py=tm.fromGeographicArray(vals[:,0],vals[:,1])
+	points=[FreeCAD.Vector(x,y,z) for x,y,z in zip(
+			(px-center[0]).tolist(),(py-center[1]).tolist(),(1000*vals[:,2]).tolist())]
 
 	print (min(lats),max(lats))
 	print (min(lons),max(lons))
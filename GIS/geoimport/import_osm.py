@@ -29,41 +29,58 @@ Import data from OpenStreetMap
 import FreeCAD, FreeCADGui
 import Part
 
-import urllib.request
 import os
 
-from . import my_xmlparser
+from . import osm_cache
+from . import osm_nodes
+from . import osm_pbf
+from . import osm_query
 from . import transversmercator
+from .progress import Cancelled, Progress
 
 from .get_elevation_srtm4 import get_height_single
-from .get_elevation_srtm4 import get_height_list
+from .get_elevation_srtm4 import get_service as get_elevation_service
 
 from .say import say
-from .say import sayErr
 
-def import_osm(latitude, longitude, length, progressbar=None, status=None, elevation=False):
-
-    if progressbar:
-        progressbar.setValue(0)
-    if status:
-        status.setText("Get data from openstreetmap.org and parse it for later usage ...")
-
-    # Get and parse osm data
-    tree = get_osmdata(latitude, longitude, length/2)
-
-    if tree is None:
+LANDUSE_COLORS = {
+    "residential": (1.0, 0.6, 0.6),
+    "meadow": (0.0, 1.0, 0.0),
+    "farmland": (0.8, 0.8, 0.0),
+    "forest": (1.0, 0.4, 0.4),
+}
+
+def import_osm(latitude, longitude, length, progressbar=None, status=None, elevation=False,
+        compound=False, pbf_file=None, categories=None, reporter=None):
+    """
+    import the osm data of a square around latitude, longitude
+    compound: create one compound shape per category instead of
+    two document objects per way, the osm id, name and height of
+    each way are kept in list properties of the compound object
+    pbf_file: cut the area from a local .osm.pbf extract instead of
+    asking the osm api
+    categories: the drawn categories of building, road, landuse and
+    path (all other ways), None for all, without path only the ways of
+    the categories are asked from an Overpass server
+    reporter: progress.Progress of the import, one on progressbar and
+    status if None, its token cancels the import
+    """
+
+    if reporter is None:
+        reporter = Progress(100, progressbar, status, FreeCADGui.updateGui)
+    reporter.start(100, "Get data from openstreetmap.org and parse it for later usage ...")
+
+    # Get osm data, parsed from the local tile cache or a pbf extract
+    reader = get_osmdata(latitude, longitude, length/2, pbf_file, categories)
+
+    if reader is None or reader.bounds is None:
         FreeCAD.Console.PrintError("Something went wrong on retrieving OSM data.")
         return False
 
     # Get map nodes data
-    if status:
-        status.setText("Transform data ...")
+    reporter.text("Transform data ...")
 
-    nodes = tree.getiterator("node")
-    objects = tree.getiterator("way")
-    bounds = tree.getiterator("bounds")[0]
-
-    tm, size, corner_min, points, nodesbyid = map_data(nodes, bounds)
+    tm, size, corner_min, nodes = map_data(reader.node_store(), reader.bounds)
 
     # Get active document or create new one
     doc = FreeCAD.ActiveDocument
@@ -72,8 +89,7 @@ def import_osm(latitude, longitude, length, progressbar=None, status=None, eleva
         FreeCAD.Console.PrintMessage("New FreeCAD document created.\n")
 
     # Create base area and get base height
-    if status:
-        status.setText("create visualizations...")
+    reporter.start(len(reader.way_ids), "create visualizations...")
 
     area = doc.addObject("Part::Plane", "area")
     area.Length = size[0] * 2
@@ -83,6 +99,7 @@ def import_osm(latitude, longitude, length, progressbar=None, status=None, eleva
         FreeCAD.Rotation(0.00, 0.00, 0.00, 1.00))
 
     if elevation:
+        lookup_heights(nodes)
         baseheight = get_height_single(latitude, longitude)
         elearea = doc.addObject("Part::Feature","Elevation_Area")
         elearea.Shape = get_elebase_sh(corner_min, size, baseheight, tm)
@@ -102,24 +119,67 @@ def import_osm(latitude, longitude, length, progressbar=None, status=None, eleva
     landuse = doc.addObject("App::DocumentObjectGroup","Landuse")
     buildings = doc.addObject("App::DocumentObjectGroup","Buildings")
 
-    # Import objects
-    for obj in objects:
+    # Collected shapes and properties per category in compound mode
+    batches = {"building": [], "road": [], "landuse": [], "path": []}
+
+    # Import objects, cancelling keeps the objects made so far
+    try:
+        import_ways(reader, doc, nodes, baseheight, elevation, compound, categories,
+            batches, (buildings, roads, landuse, paths), reporter)
+    except Cancelled:
+        FreeCAD.Console.PrintWarning("OSM import cancelled after {} of {} ways\n".format(
+            reporter.done - 1, reporter.total))
+
+    if compound:
+        add_osm_compound(doc, buildings, "Buildings", batches["building"])
+        add_osm_compound(doc, roads, "Roads", batches["road"])
+        add_osm_compound(doc, landuse, "Landuse", batches["landuse"])
+        add_osm_compound(doc, paths, "Paths", batches["path"])
+
+    reporter.finish("import finished.")
+
+    FreeCAD.ActiveDocument.recompute()
+    FreeCADGui.activeDocument().ActiveView.viewAxonometric()
+
+def import_ways(reader, doc, nodes, baseheight, elevation, compound, categories, batches,
+        groups, reporter):
+    """
+    one object per way, or its shape in batches in compound mode,
+    every way is a step of reporter
+    """
+    buildings, roads, landuse, paths = groups
+    for obj in reader.ways():
+        reporter.advance()
+
         # Get object properties
         name, object_type, use_type, number, building_height = get_properties(obj)
+        category = object_type if object_type in batches else "path"
+        if categories is not None and category not in categories:
+            continue
 
         # Get object polygon points
         if not elevation:
-            polygon_points = []
-            for n in obj.getiterator("nd"):
-                wpt = points[str(n.params["ref"])]
-                polygon_points.append(wpt)
+            idx = nodes.index(obj.refs)
+            polygon_points = [FreeCAD.Vector(x, y, 0)
+                for x, y in zip(nodes.x[idx].tolist(), nodes.y[idx].tolist())]
         else:
             # Get heights for object polygon points
-            polygon_points = get_ppts_with_heights(obj, object_type, points, nodesbyid, baseheight)
+            polygon_points = get_ppts_with_heights(obj, object_type, nodes, baseheight)
+
+        if compound:
+            if object_type == "building":
+                if building_height == 0:
+                    building_height = 2800
+            else:
+                # the other categories are extruded 1 mm, see make_osm_shape
+                building_height = 1
+            shape = make_osm_shape(polygon_points, object_type, building_height)
+            batches[category].append((shape, obj.id, name, building_height, use_type))
+            continue
 
         # Wire for each object polygon
         polygon_obj = doc.addObject("Part::Feature", "OsmPolygon")
-        polygon_obj.Label = obj.params["id"]
+        polygon_obj.Label = str(obj.id)
         polygon_obj.Shape = Part.makePolygon(polygon_points)
 
         osm_object = doc.addObject("Part::Extrusion", "OsmObject")
@@ -145,72 +205,136 @@ def import_osm(latitude, longitude, length, progressbar=None, status=None, eleva
         elif object_type == "landuse":
             landuse.addObject(osm_object)
             osm_object.Solid = True
-            if use_type == "residential":
-                osm_object.ViewObject.ShapeColor = (1.0, 0.6, 0.6)
-            elif use_type == "meadow":
-                osm_object.ViewObject.ShapeColor = (0.0, 1.0, 0.0)
-            elif use_type == "farmland":
-                osm_object.ViewObject.ShapeColor = (0.8, 0.8, 0.0)
-            elif use_type == "forest":
-                osm_object.ViewObject.ShapeColor = (1.0, 0.4, 0.4)
+            if use_type in LANDUSE_COLORS:
+                osm_object.ViewObject.ShapeColor = LANDUSE_COLORS[use_type]
 
         else:
             paths.addObject(osm_object)
             osm_object.ViewObject.ShapeColor = (1.0, 1.0, 0.0)
             osm_object.Solid = True
 
-        if progressbar:
-            progressbar.setValue(int(100 * objects.index(obj)+1 / len(objects)))
-
-    if status:
-        status.setText("import finished.")
+def make_osm_shape(polygon_points, object_type, building_height):
+    """
+    extruded shape of a way polygon, the same shape the
+    Part::Extrusion of the default import mode creates
+    """
+    wire = Part.makePolygon(polygon_points)
+    if object_type == "building":
+        direction = FreeCAD.Vector(0, 0, building_height)
+    else:
+        direction = FreeCAD.Vector(0, 0, 1)
 
-    FreeCAD.ActiveDocument.recompute()
-    FreeCADGui.activeDocument().ActiveView.viewAxonometric()
+    # roads are not solid, open or non planar polygons can not be
+    if object_type != "road" and wire.isClosed():
+        try:
+            return Part.Face(wire).extrude(direction)
+        except Exception:
+            pass
+
+    return wire.extrude(direction)
+
+def add_osm_compound(doc, group, label, items):
+    """
+    one Part::Feature with a compound of all shapes of a category,
+    the list properties OsmIds, OsmNames, OsmHeights and OsmUseTypes
+    hold the data of the compound child with the same index
+    """
+    if not items:
+        return None
+
+    shapes, ids, names, heights, use_types = zip(*items)
+
+    osm_object = doc.addObject("Part::Feature", "Osm" + label)
+    osm_object.Label = label
+    osm_object.Shape = Part.makeCompound(list(shapes))
+
+    osm_object.addProperty("App::PropertyStringList", "OsmIds", "OSM", "osm id of each way")
+    osm_object.addProperty("App::PropertyStringList", "OsmNames", "OSM", "name of each way")
+    osm_object.addProperty("App::PropertyFloatList", "OsmHeights", "OSM", "extrusion height of each way")
+    osm_object.addProperty("App::PropertyStringList", "OsmUseTypes", "OSM", "landuse type of each way")
+    osm_object.OsmIds = [str(i) for i in ids]
+    osm_object.OsmNames = list(names)
+    osm_object.OsmHeights = [float(h) for h in heights]
+    osm_object.OsmUseTypes = list(use_types)
+
+    group.addObject(osm_object)
+
+    if label == "Buildings":
+        osm_object.ViewObject.ShapeColor = (1.0, 1.0, 1.0)
+    elif label == "Roads":
+        osm_object.ViewObject.LineColor = (0.0, 0.0, 1.0)
+        osm_object.ViewObject.LineWidth = 10
+    elif label == "Landuse":
+        # color the faces of each child by its landuse type
+        default = osm_object.ViewObject.ShapeColor
+        colors = []
+        for shape, use_type in zip(shapes, use_types):
+            colors += [LANDUSE_COLORS.get(use_type, default)] * len(shape.Faces)
+        osm_object.ViewObject.DiffuseColor = colors
+    else:
+        osm_object.ViewObject.ShapeColor = (1.0, 1.0, 0.0)
+
+    return osm_object
+
+def get_osmdata(latitude, longitude, length, pbf_file=None, categories=None):
+    """
+    return a reader on the osm data of the area, the data is read from
+    the local tile cache, only tiles which are not cached are downloaded
+    from the OSM api, with pbf_file the area is cut from the extract
+    if categories does not contain path, only the ways with the tag keys
+    of the categories are asked from an Overpass server
+    """
+    keys = None
+    if categories is not None and "path" not in categories:
+        keys = [osm_query.CATEGORY_KEYS[c] for c in categories if c in osm_query.CATEGORY_KEYS]
+
+    # Find the boundary
+    b1 = latitude - length / 1113 * 10
+    l1 = longitude - length / 713 * 10
+    b2 = latitude + length / 1113 * 10
+    l2 = longitude + length / 713 * 10
+
+    if pbf_file:
+        FreeCAD.Console.PrintMessage("Local OSM data: area of {}\n".format(pbf_file))
+        try:
+            reader = osm_pbf.read(pbf_file, (b1, l1, b2, l2))
+            return reader if keys is None else osm_query.keep_keys(reader, keys)
+        except Exception as e:
+            FreeCAD.Console.PrintError("Reading of {} failed: {}\n".format(pbf_file, e))
+            return None
+
+    if keys is not None:
+        url = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/GIS").GetString(
+            "OverpassUrl", osm_query.base_source)
+        storage = os.path.join(FreeCAD.ConfigGet("UserAppData"), "OsmData", "overpass")
+        backend = osm_query.OverpassQuery(storage, keys, url)
+        FreeCAD.Console.PrintMessage("OSM data: ways with {} from {}\n".format(", ".join(keys), url))
+        try:
+            return backend.reader(b1, l1, b2, l2)
+        except Exception as e:
+            FreeCAD.Console.PrintError("Download of OSM data failed: {}\n".format(e))
+            return None
 
-def get_osmdata(latitude, longitude, length):
-    # If there is no backup, connect to OSM api
-    storage = os.path.join(FreeCAD.ConfigGet("UserAppData"), "OsmData")
-    if not os.path.isdir(storage):
-        os.makedirs(storage)
+    storage = os.path.join(FreeCAD.ConfigGet("UserAppData"), "OsmData", "tiles")
+    cache = osm_cache.OsmTileCache(storage)
 
-    backup = os.path.join(storage, "{}-{}-{}".format(latitude, longitude, length))
-    FreeCAD.Console.PrintMessage("Local OSM data file: {}\n".format(backup))
+    tiles = osm_cache.tile_range(b1, l1, b2, l2, cache.size)
+    missing = [tile for tile in tiles if not cache.cached(tile)]
+    FreeCAD.Console.PrintMessage("Local OSM data: {} tiles in {}, {} to download\n".format(
+        len(tiles), cache.folder, len(missing)))
 
     try:
-        FreeCAD.Console.PrintMessage("Try to read data from a former existing OSM data file...\n")
-        tree = my_xmlparser.getData(backup)
-
-    except Exception:
-        FreeCAD.Console.PrintMessage("No former existing osm data file\n")
-        FreeCAD.Console.PrintMessage("Connecting to openstreetmap.org...\n")
-
-        # Find the boundary
-        b1 = latitude - length / 1113 * 10
-        l1 = longitude - length / 713 * 10
-        b2 = latitude + length / 1113 * 10
-        l2 = longitude + length / 713 * 10
-
-        koord_str = "{},{},{},{}".format(l1, b1, l2, b2)
-        source = "http://api.openstreetmap.org/api/0.6/map?bbox=" + koord_str
-
-        response = urllib.request.urlopen(source)
-
-        # Write to file for later usage
-        osm_file = open(backup, "w", encoding="utf-8")
-        osm_file.write(response.read().decode("utf8"))
-        osm_file.close()
-
-        tree = my_xmlparser.getData(backup)
-
-    return tree
+        return cache.reader(b1, l1, b2, l2)
+    except Exception as e:
+        FreeCAD.Console.PrintError("Download of OSM data failed: {}\n".format(e))
+        return None
 
 def map_data(nodes, bounds):
     # Center of the scene
-    minlat = float(bounds.params["minlat"])
-    minlon = float(bounds.params["minlon"])
-    maxlat = float(bounds.params["maxlat"])
-    maxlon = float(bounds.params["maxlon"])
+    minlat = bounds.minlat
+    minlon = bounds.minlon
+    maxlat = bounds.maxlat
+    maxlon = bounds.maxlon
 
     # Note: Setting values changes the result, see transversmerctor module
     tm = transversmercator.TransverseMercator()
@@ -226,14 +350,13 @@ def map_data(nodes, bounds):
     size = [center[0] - corner_min[0], center[1] - corner_min[1]]
 
     # Map all points to xy-plane
-    points = {}
-    nodesbyid = {}
-    for n in nodes:
-        nodesbyid[n.params["id"]] = n
-        ll = tm.fromGeographic(float(n.params["lat"]), float(n.params["lon"]))
-        points[str(n.params["id"])] = FreeCAD.Vector(ll[0] - center[0], ll[1] - center[1], 0)
+    if isinstance(nodes, osm_nodes.NodeStore):
+        store = nodes
+    else:
+        store = osm_nodes.NodeStore(nodes)
+    store.project(tm, center)
 
-    return tm, size, corner_min, points, nodesbyid
+    return tm, size, corner_min, store
 
 def get_properties(obj):
     name = ""
@@ -243,38 +366,38 @@ def get_properties(obj):
     object_type = ""
     building_height = 0
 
-    for tag in obj.getiterator("tag"):
+    for k, v in obj.tags.items():
         try:
-            if str(tag.params["k"]) == "name":
-                name = tag.params["v"]
+            if k == "name":
+                name = v
 
-            if str(tag.params["k"]) == "ref":
-                name += " /" + tag.params["v"]
+            if k == "ref":
+                name += " /" + v
 
-            if str(tag.params["k"]) == "building":
+            if k == "building":
                 object_type = "building"
 
-            elif str(tag.params["k"]) == "landuse":
+            elif k == "landuse":
                 object_type = "landuse"
-                use_type = tag.params["v"]
+                use_type = v
 
-            elif str(tag.params["k"]) == "highway":
+            elif k == "highway":
                 object_type = "road"
 
-            if str(tag.params["k"]) == "addr:city":
+            if k == "addr:city":
                 pass
 
-            if str(tag.params["k"]) == "addr:street":
-                street = tag.params["v"]
+            if k == "addr:street":
+                street = v
 
-            if str(tag.params["k"]) == "addr:housenumber":
-                number = str(tag.params["v"])
+            if k == "addr:housenumber":
+                number = str(v)
 
-            if str(tag.params["k"]) == "building:levels":
-                building_height = int(str(tag.params["v"]))*1000*2.8
+            if k == "building:levels":
+                building_height = int(v)*1000*2.8
 
-            if str(tag.params["k"]) == "building:height":
-                building_height = int(str(tag.params["v"]))*1000
+            if k == "building:height":
+                building_height = int(v)*1000
 
         except Exception:
             FreeCAD.Console.PrintError("unexpected error {}\n".format(50*"#"))
@@ -340,12 +463,12 @@ def get_elebase_sh(corner_min, size, baseheight, tm):
         0,
     )
     # move mesh points z-koord
-    for pt_msh in msh.Points:
-        # say(pt_msh.Index)
-        # say(pt_msh.Vector)
-        pt_tm = tm.toGeographic(pt_msh.Vector.x, pt_msh.Vector.y)
-        height = get_height_single(pt_tm[0], pt_tm[1])  # mm
-        # say(height)
+    mesh_points = msh.Points
+    lats, lons = tm.toGeographicArray(
+        [pt_msh.Vector.x for pt_msh in mesh_points],
+        [pt_msh.Vector.y for pt_msh in mesh_points])
+    heights = get_elevation_service().heights(lats, lons)  # mm
+    for pt_msh, height in zip(mesh_points, heights.tolist()):
         pt_msh.move(FreeCAD.Vector(0, 0, height))
     # move mesh back centered on origin
     msh.translate(
@@ -361,78 +484,31 @@ def get_elebase_sh(corner_min, size, baseheight, tm):
     return sh
 
 
-def get_ppts_with_heights(way, way_type, points, nodesbyid, baseheight):
+def lookup_heights(nodes):
+    """
+    heights of all nodes of the import in one batch, the tiles of the
+    area are sampled or loaded once, the ways read the heights from
+    the node memo of the elevation service
+    """
+    service = get_elevation_service()
+    service.forget_nodes()
+    service.node_heights(nodes.ids, nodes.lat, nodes.lon)
+
+def get_ppts_with_heights(way, way_type, nodes, baseheight):
 
-    plg_pts_latlon = []
-    for n in way.getiterator("nd"):
-        # say(n.params)
-        m = nodesbyid[n.params["ref"]]
-        plg_pts_latlon.append([
-            n.params["ref"],
-            m.params["lat"],
-            m.params["lon"]
-        ])
-    say("    baseheight: {}".format(baseheight))
-    say("    get heights for " + str(len(plg_pts_latlon)))
-    heights = get_height_list(plg_pts_latlon)
-    # say(heights)
+    idx = nodes.index(way.refs)
+    # heights of shared nodes are looked up only once per import
+    heights = get_elevation_service().node_heights(
+        nodes.ids[idx], nodes.lat[idx], nodes.lon[idx])
+
+    if way_type == "building":
+        # for buildings use the height of the first point for all
+        # TODO use 10 cm below the lowest not the first
+        heights[:] = heights[0]
+    elif way_type == "landuse":
+        # use 1 mm above base height
+        heights[:] = baseheight + 1
 
     # set the scaled height for each way polygon point
-    height = None
-    polygon_points = []
-    for n in way.getiterator("nd"):
-        wpt = points[str(n.params["ref"])]
-        # say(wpt)
-        m = nodesbyid[n.params["ref"]]
-        # say(m.params)
-        hkey = "{:.7f} {:.7f}".format(
-            float(m.params["lat"]),
-            float(m.params["lon"])
-        )
-        # say(hkey)
-        if way_type == "building":
-            # for buildings use the height of the first point for all
-            # thus code a bit different from the others
-            # TODO use 10 cm below the lowest not the first
-            # Why do we get all heights if only use one
-            # but we need them all to get the lowest
-            if height is None:
-                say("    Building")
-                if hkey in heights:
-                    say("    height abs: {}".format(heights[hkey]))
-                    height = heights[hkey]
-                    say(heights[hkey])
-                    say("    height rel: {}".format(height))
-                else:
-                    sayErr("   ---no height in heights for " + hkey)
-                    height = baseheight
-        elif way_type == "highway":
-            # use the height for all points
-            if height is None:
-                say("    Highway")
-            if hkey in heights:
-                height = heights[hkey]
-            else:
-                sayErr("   ---no height in heights for " + hkey)
-                height = baseheight
-        elif way_type == "landuse":
-            # use 1 mm above base height
-            if height is None:
-                sayErr("    ---no height used for landuse ATM")
-                height = baseheight + 1
-        else:
-            # use the height for all points
-            if height is None:
-                say("    Other")
-            if hkey in heights:
-                height = heights[hkey]
-            else:
-                sayErr("   ---no height in heights for " + hkey)
-                height = baseheight
-        if height is None:
-            height = baseheight
-        wpt.z = height - baseheight
-        # say("    with base: {}".format(wpt.z))
-        polygon_points.append(wpt)
-
-    return polygon_points
+    return [FreeCAD.Vector(x, y, z) for x, y, z in zip(
+        nodes.x[idx].tolist(), nodes.y[idx].tolist(), (heights - baseheight).tolist())]
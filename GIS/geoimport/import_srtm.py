@@ -11,8 +11,12 @@ Import srtm data
 
 import FreeCAD, FreeCADGui
 import math
-import os, zipfile, re
+import os, zipfile
 import urllib.request
+from array import array
+import numpy as np
+from . import osm_reader
+from .progress import Progress
 from .transversmercator import TransverseMercator
 from .say import say
 from PySide import QtCore, QtGui
@@ -36,9 +40,63 @@ def createProgressBar(label=None):
 	return w
 
 
+# convert the contour curves of a srtm osm file into a .npy point table
+# rows are lat, lon, ele in m sorted by lat
+# the progress is shown on reporter, a progress bar window if None
+def convert(fn, target, reporter=None):
+	size=os.path.getsize(fn)
+	pb=None
+	if reporter is None:
+		pb=createProgressBar(label="convert Elevations " + os.path.basename(fn) )
+		reporter=Progress(size,pb.pb,pump=FreeCADGui.updateGui)
+	reporter.start(size)
+
+	lats=array('d')
+	lons=array('d')
+	eles=array('d')
+	poss={}
+
+	with open(fn,'rb') as f:
+		for element in osm_reader.iter_elements(f):
+			if isinstance(element,osm_reader.Node):
+				poss[element.id]=(element.lat,element.lon)
+				continue
+
+			if isinstance(element,osm_reader.Way):
+				elev=float(element.tags.get("ele",0))
+				for nd in element.refs:
+					lat,lon=poss[nd]
+					lats.append(lat)
+					lons.append(lon)
+					eles.append(elev)
+
+				# the nodes of a contour are written just before it
+				poss={}
+				reporter.update(f.tell())
+
+	data=np.stack([np.frombuffer(lats),np.frombuffer(lons),np.frombuffer(eles)],axis=1)
+	data=data[np.argsort(data[:,0],kind='stable')]
+	with open(target+".part",'wb') as f:
+		np.save(f,data)
+	os.replace(target+".part",target)
+
+	reporter.finish()
+	if pb is not None:
+		pb.hide()
+	return target
+
+
+_tiles={}
+
+# load a converted tile memory-mapped, once per session
+def load(fn):
+	if fn not in _tiles:
+		_tiles[fn]=np.load(fn,mmap_mode='r')
+	return _tiles[fn]
+
+
 # create contour curve points list
 def runfile(fn, xw, xe, ys, yn, ox=0, oy=0):
-	f = 100000000
 
 	tm = TransverseMercator()
 	tm.lat = 0.5*(yn+ys)
@@ -46,77 +104,22 @@ def runfile(fn, xw, xe, ys, yn, ox=0, oy=0):
 
 	center = tm.fromGeographic(tm.lat, tm.lon)
 
-	xw *= f
-	xe *= f
-	ys *= f
-	yn *= f
-	ox *= f
-	oy *= f
-	pts = []
-	poss = {}
-	nds = []
-	elev = -1
-
-	c = 0
-
-
-	#Gui.ActiveDocument.ActiveView.setAnimationEnabled(False)
-	pb=createProgressBar(label="create Elevations " + os.path.basename(fn) )
-
-	# file = open('/home/microelly2/Downloads/Lat50Lon11Lat51Lon12.osm', 'r')
-	file =open(fn)
-#	pb.pb.setValue(10)
-
-	for line in file.readlines():
-
-		c += 1
-		# if c == 100000: break
-		pb.pb.setValue((c/100)%100)
-
-		m = re.match(r'.*<node id="([^"]+)" lat="([^"]+)" lon="([^"]+)".*', line)
-		if m:
-			y=float(m.group(2))*f
-			x=float(m.group(3))*f
-			id=m.group(1)
-			poss[id]=(x,y)
-			continue
-
-		m = re.match(r'.*<nd ref="([^"]+)".*', line)
-		if m:
-			nds.append(m.group(1))
-			continue
-
-		m = re.match(r'.*<tag k="ele" v="([^"]+)".*', line)
-		if m:
-			elev=float(m.group(1))
-			continue
-
-		m = re.match(r'.*/way.*', line)
-		if m:
-
-			for nd in nds:
-				x=poss[nd][0]
-				y=poss[nd][1]
-				if xw<x and x<xe and ys<y and y<yn:
-					ll=tm.fromGeographic(y/f,x/f)
-					pts.append(FreeCAD.Vector(ll[0]-center[0],ll[1]-center[1],elev*1000))
-
-#			if len(pts)>2:
-#				d=Draft.makeWire(pts)
-#			if len(pts)==1:
-#				d=Draft.makePoint(pts[0])
-
-			c +=1
-
-			poss={}
-			elev=0
-			nds=[]
-			continue
-
-	pb.hide()
+	# rows are sorted by lat, slice the lat band and mask the lon range
+	data=load(fn)
+	lo=np.searchsorted(data[:,0],ys,side='right')
+	hi=np.searchsorted(data[:,0],yn,side='left')
+	band=np.asarray(data[lo:hi])
+	band=band[(xw<band[:,1]) & (band[:,1]<xe)]
+
+	# project all points in one call
+	px,py=tm.fromGeographicArray(band[:,0],band[:,1])
+	px=(px-center[0]).tolist()
+	py=(py-center[1]).tolist()
+	pts=[FreeCAD.Vector(x,y,z) for x,y,z in zip(px,py,(band[:,2]*1000).tolist())]
 	return pts
 
 ## download the data files from /geoweb.hft-stuttgart.de/SRTM
+## the first download is converted to dat.npy, the osm file is removed
 
 def getdata(directory,dat):
 
@@ -124,6 +127,10 @@ def getdata(directory,dat):
 	source="http://geoweb.hft-stuttgart.de/SRTM/srtm_as_osm/{}.osm.zip".format(dat)
 
 	fn=directory+"/"+dat+".osm"
+	target=directory+"/"+dat+".npy"
+	if os.path.exists(target):
+		return target
+
 	if not os.path.exists(fn):
 
 		if not os.path.exists(zipfilename):
@@ -140,6 +147,10 @@ def getdata(directory,dat):
 		zfile.extractall(directory)
 		fh.close()
 
+	convert(fn,target)
+	os.remove(fn)
+	return target
+
 
 ## get the date from files,create a point cloud
 
@@ -167,8 +178,7 @@ def run(mx,my,dx,dy):
 		os.makedirs(directory)
 
 	for dat in dats:
-		getdata(directory,dat)
-		fn=directory+"/"+dat+".osm"
+		fn=getdata(directory,dat)
 		pts=runfile(fn,xw,xe,ys,yn,mx,my)
 
 		# Get or create "Point_Groups".
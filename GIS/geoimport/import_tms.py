@@ -65,6 +65,9 @@ class GIS_TMS_Dialog(QtWidgets.QDialog):
 		self.pixels = 256
 		self.TMS_WMTS = 0
 
+		#Keep-alive connections and the persistent tile cache for the tile downloads of this dialog
+		self.tileFetcher = GIS2BIM.TileFetcher(cache=GIS2BIM_FreeCAD.GetTileCache())
+
 		#Set Style
 		self.setStyleSheet("QWidget {background-color: rgb(68, 68, 68)} QPushButton { background-color: black } QGroupBox {border: 1px solid grey; }") #margin: 2px;
 
@@ -206,7 +209,7 @@ class GIS_TMS_Dialog(QtWidgets.QDialog):
 
 	def onTest(self):
 		self.ServerName = self.request.text()		
-		TMS = GIS2BIM.TMS_WMTSCombinedMapFromLatLonBbox(float(self.lat),float(self.lon),float(self.bboxWidth.text()),float(self.bboxHeight.text()),int(self.zoomLevel.text()),self.pixels,self.TMS_WMTS,self.ServerName)
+		TMS = GIS2BIM.TMS_WMTSCombinedMapFromLatLonBbox(float(self.lat),float(self.lon),float(self.bboxWidth.text()),float(self.bboxHeight.text()),int(self.zoomLevel.text()),self.pixels,self.TMS_WMTS,self.ServerName,self.tileFetcher)
 		fileLocationTMS = self.tempFolder + self.imageName.text() + '.jpg'
 		TMS[0].save(fileLocationTMS)
 		if self.cbGrayscale.checkState():
@@ -243,7 +246,7 @@ class GIS_TMS_Dialog(QtWidgets.QDialog):
 		dx = float(self.dx.text())*1000
 		dy = float(self.dy.text())*1000
 		fileLocationTMS = self.tempFolder + self.imageName.text() + '.jpg'
-		TMS = GIS2BIM.TMS_WMTSCombinedMapFromLatLonBbox(float(self.lat),float(self.lon),float(self.bboxWidth.text()),float(self.bboxHeight.text()),int(self.zoomLevel.text()),self.pixels,self.TMS_WMTS,self.ServerName)
+		TMS = GIS2BIM.TMS_WMTSCombinedMapFromLatLonBbox(float(self.lat),float(self.lon),float(self.bboxWidth.text()),float(self.bboxHeight.text()),int(self.zoomLevel.text()),self.pixels,self.TMS_WMTS,self.ServerName,self.tileFetcher)
 		TMS[0].save(fileLocationTMS)
 		if self.cbGrayscale.checkState():
 			img = Image.open(fileLocationTMS)
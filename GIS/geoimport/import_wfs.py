@@ -312,7 +312,7 @@ class GISWFS_Dialog(QtWidgets.QDialog):
 		closedValue = self.clsPolygon.isChecked()
 		makeFaceValue = self.clsCreateFace.isChecked()
 		drawStyle = str(self.linePattern.currentText())  
-		Curves = GIS2BIM_FreeCAD.CurvesFromWFS(url,self.bboxString,xpathstr,-float(self.X),-float(self.Y),1000,3,closedValue,makeFaceValue,drawStyle,(0.7,0.0,0.0))
+		Curves = GIS2BIM_FreeCAD.CurvesFromWFS(url,self.bboxString,xpathstr,-float(self.X),-float(self.Y),1000,3,closedValue,makeFaceValue,drawStyle,(0.7,0.0,0.0),self.CRS)
 		GIS2BIM_FreeCAD.CreateLayer(self.groupName.text())
 		FreeCAD.activeDocument().getObject(self.groupName.text()).addObjects(Curves)
 		FreeCAD.ActiveDocument.recompute()
@@ -212,7 +212,7 @@ class GISWMS_Dialog(QtWidgets.QDialog):
 		self.pixHeight = int((pixWidth*height)/width)
 		pixHeight = self.pixHeight
 		Bbox = GIS2BIM.CreateBoundingBox(float(self.X),float(self.Y),width,height,2)
-		GIS2BIM.WMSRequest(URL,Bbox,self.tempFileName,pixWidth,pixHeight)
+		GIS2BIM.WMSRequest(URL,Bbox,self.tempFileName,pixWidth,pixHeight,GIS2BIM_FreeCAD.GetTileCache())
 		if self.cbGrayscale.checkState():
 			img = Image.open(fileLocationWMS)
 			fileLocationWMS2 = self.tempFolder + self.imageName.text() + '_gray.jpg'
@@ -248,7 +248,7 @@ class GISWMS_Dialog(QtWidgets.QDialog):
 		dy = float(self.dy.text())*1000
 		fileLocationWMS = self.tempFolder + self.imageName.text() + '.jpg'
 		Bbox = GIS2BIM.CreateBoundingBox(X,Y,width,height,2)
-		result = GIS2BIM.WMSRequest(URL,Bbox,fileLocationWMS,self.pixelwidth.text(),int(self.pixHeight))
+		result = GIS2BIM.WMSRequest(URL,Bbox,fileLocationWMS,self.pixelwidth.text(),int(self.pixHeight),GIS2BIM_FreeCAD.GetTileCache())
 		if self.cbGrayscale.checkState():
 			img = Image.open(fileLocationWMS)
 			fileLocationWMS2 = self.tempFolder + self.imageName.text() + '_gray.jpg'
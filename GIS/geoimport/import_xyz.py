@@ -9,13 +9,22 @@
 #-- GNU Lesser General Public License (LGPL)
 #-------------------------------------------------
 
+import itertools
+import os
+import random
 import time
 
+import numpy as np
+
+import FreeCAD
 import FreeCAD as App
+import FreeCADGui as Gui
 
 import Part
 import Points
 
+from . import pointgrid
+from .progress import Progress
 from .say import say
 from .say import sayErr
 from .say import sayexc
@@ -68,37 +77,120 @@ example data
 
 def getShape(pts):
 	'''given a point cloud of a rectangle area get the shape of a appropriate array'''
-	dists={}
-	ls=[]
-	for i,p in enumerate(pts):
-		if i>0:
-			pa=pts[i-1]
-			p1=FreeCAD.Vector(p.x,p.y,0)
-			p2=FreeCAD.Vector(pa.x,pa.y,0)
-			dist=(p1-p2).Length
-			dist=round(dist)
-			ls.append(dist)
-			try:dists[dist] += 1
-			except Exception: dists[dist]=1
-	say(dists.keys())
-	mm=np.mean(list(dists.keys()))
-
-	tts=[]
-	ia=-1
-	for i,d in enumerate(ls):
-			if d>mm:
-				tts.append(i-ia)
-				ia=i
-	say(tts)
 	try:
-		dx=int(np.mean(tts))
-		dy=len(pts)/dx
-		say(("getshape shape: ",dx,dy))
+		grid=pointgrid.infer_grid(pts)
+		dx,dy=grid.columns,grid.rows
+		say(("getshape shape: ",dx,dy,"missing",grid.missing))
 		return dx,dy
 	except Exception:
 		return (len(pts),1)
 
 
+def _parse_lines(lines,start):
+	'''x y z columns of the text lines, lines which can not be read are skipped'''
+	try:
+		return np.loadtxt(lines,usecols=(0,1,2),ndmin=2)
+	except ValueError:
+		pts=[]
+		for i,l in enumerate(lines):
+			p=l.split()
+			try:
+				pts.append((float(p[0]),float(p[1]),float(p[2])))
+			except Exception:
+				sayErr(("error line ",start+i,p,l))
+		return np.array(pts,dtype=np.float64).reshape(-1,3)
+
+
+def _read_blocks(f,chunk,hfac,reporter):
+	'''x y z arrays of chunk lines of the open file f'''
+	start=0
+	while True:
+		lines=list(itertools.islice(f,chunk))
+		if not lines:
+			return
+		block=_parse_lines(lines,start)
+		block[:,2]*=hfac
+		reporter.advance(sum(map(len,lines)))
+		start += len(block)
+		yield block
+
+
+def _first_row(blocks):
+	'''
+	the row length and the blocks up to the end of the first row joined,
+	a row can be longer than a block
+	'''
+	head=[]
+	for block in blocks:
+		head.append(block)
+		joined=np.concatenate(head)
+		lu=pointgrid.row_length(joined)
+		if lu<len(joined):
+			return lu,joined
+	if not head:
+		return None,np.zeros((0,3))
+	return len(joined),joined
+
+
+def load_xyz(filename,ku=1,kv=1,hfac=3,chunk=1000000,reporter=None):
+	'''load_xyz(filename,ku=1,kv=1,hfac=3,chunk=1000000,reporter=None)
+	read the x y z columns of the file into a (N,3) float64 array, chunk lines at a time
+	the heights are scaled by hfac
+	the characters read are the steps of reporter, a progress.Progress
+	if ku and kv are greater than 1 the grid is reduced while reading,
+	with the same rows and columns reduceGrid keeps
+	'''
+
+	wb, eb, sb, nb = 3, 3, 3, 3
+	reduce=ku>1 and kv>1
+
+	parts=[]
+	rows=[]
+	tail=np.zeros((0,3))
+	tailrows=np.zeros(0,dtype=np.int64)
+	start=0
+
+	if reporter is None:
+		reporter=Progress(pump=Gui.updateGui)
+	reporter.start(os.path.getsize(filename))
+
+	with open(filename) as f:
+		blocks=_read_blocks(f,chunk,hfac,reporter)
+		if not reduce:
+			parts=list(blocks)
+		else:
+			lu,first=_first_row(blocks)
+			for block in itertools.chain([first],blocks):
+				if not len(block):
+					continue
+
+				# grid index of each point, keep the columns and rows reduceGrid keeps
+				idx=np.arange(start,start+len(block))
+				u=idx%lu
+				v=idx//lu
+				keepu=(u%ku==0)|(u<wb)|(u>lu-eb-1)
+				mask=keepu&((v%kv==0)|(v<sb))
+				parts.append(block[mask])
+				rows.append(v[mask])
+
+				# the last rows are kept too, but the number of rows is not known yet
+				tail=np.concatenate([tail,block[keepu]])[-nb*lu:]
+				tailrows=np.concatenate([tailrows,v[keepu]])[-nb*lu:]
+				start += len(block)
+	reporter.finish()
+
+	if not parts:
+		return np.zeros((0,3))
+	if not reduce:
+		return np.concatenate(parts)
+
+	lv=start//lu
+	pts=np.concatenate(parts)
+	rows=np.concatenate(rows)
+	last=tailrows>=lv-nb
+	pts=np.concatenate([pts[rows<lv-nb],tail[last&(tailrows<lv)]])
+	say(("reduced grid",lu,lv,len(pts)))
+	return pts
 
 
 ## reduce the size of a grid 
@@ -109,24 +201,17 @@ def reduceGrid(pts,ku=100,kv=50,lu=0,lv=0):
 	''' simplify data '''
 
 	wb, eb, sb, nb = 3, 3, 3, 3
-	lu,lv=getShape(pts)
+	grid=pointgrid.infer_grid(pts)
+	lu,lv=grid.columns,grid.rows
 
-	pts2=[]
-	for v in range(lv):
-		if v<sb or v>lv-nb-1:
-			pass
-		else:
-			if v%kv !=0: continue
-		for u in range(lu):
-			if u<wb or u>lu-eb-1:
-				pass
-			else:
-				if u%ku !=0: continue 
-			pts2.append(pts[v*lu+u])
+	u=np.arange(lu)
+	v=np.arange(lv)
+	keepu=(u%ku==0)|(u<wb)|(u>lu-eb-1)
+	keepv=(v%kv==0)|(v<sb)|(v>lv-nb-1)
 
 #	p=Points.Points(pts2)
 #	Points.show(p)
-	return pts2
+	return grid.points()[keepv][:,keepu].reshape(-1,3)
 
 
 def showFrame(pts,u=0,v=0,d=10,lu=None,lv=None):
@@ -149,8 +234,8 @@ def showFrame(pts,u=0,v=0,d=10,lu=None,lv=None):
 		ff=FreeCAD.ActiveDocument.addObject("Part::FeaturePython","frame")
 		ViewProvider(ff.ViewObject)
 
-	iix=[u+v*lu,u+v*lu+d,u+v*lu +d*lu +d,u+v*lu +d*lu]
-	a,b,c,d = pts[iix[0]], pts[iix[1]],  pts[iix[2]], pts[iix[3]],
+	rows=pointgrid.raster(pts,lu)
+	a,b,c,d = [FreeCAD.Vector(*rows[j,i]) for j,i in [(v,u),(v,u+d),(v+d,u+d),(v+d,u)]]
 
 	sha=Part.makePolygon([a,b,c,d,a])
 
@@ -163,9 +248,10 @@ def removeFrame():
 
 
 
-def import_xyz(mode,filename="/tmp/test.xyz",label='',ku=20, kv=10,lu=0,lv=0):
-	'''import_xyz(mode,filename="/tmp/test.xyz",label='',ku=20, kv=10,lu=0,lv=0)
+def import_xyz(mode,filename="/tmp/test.xyz",label='',ku=20, kv=10,lu=0,lv=0,reporter=None):
+	'''import_xyz(mode,filename="/tmp/test.xyz",label='',ku=20, kv=10,lu=0,lv=0,reporter=None)
 	import the point cloud from the file
+	the progress of reading is shown on reporter, a progress.Progress
 	'''
 
 	print("Import mode=",mode)
@@ -225,35 +311,9 @@ def import_xyz(mode,filename="/tmp/test.xyz",label='',ku=20, kv=10,lu=0,lv=0):
 		if fn.startswith('UserAppData'):
 			fn=fn.replace('UserAppData',FreeCAD.ConfigGet("UserAppData"))
 
-		f=open(fn)
-		lines=f.readlines()
-		say("readlines",len(lines))
-
-		'''
-		# utm coords 32356000.00 5638000.00
-		# height scale factor
-		hfac=3
-		'''
-
-
-		pts=[]
-		Gui.updateGui()
-		for i,l in enumerate(lines):
-			p=l.split()
-			hfac=3
-			try:
-				#pts.append(FreeCAD.Vector(float(p[0])-32356000.00,float(p[1])-5638000.00,hfac*float(p[2])))
-
-				pts.append(FreeCAD.Vector(float(p[0]),float(p[1]),hfac*float(p[2])))
-			except Exception: 
-				sayErr(("error line ",i,p,l))
-			if i % 1000 == 0:
-				Gui.updateGui()
-#			if i >100: break
-
-
-		if ku>1 and kv>1:
-			pts=reduceGrid(pts,ku,kv)
+		# the file is parsed in chunks and reduced while reading
+		pts=load_xyz(fn,ku,kv,reporter=reporter)
+		say("points",len(pts))
 
 		head, tail = os.path.split(fn)
 
@@ -261,7 +321,7 @@ def import_xyz(mode,filename="/tmp/test.xyz",label='',ku=20, kv=10,lu=0,lv=0):
 		PointGroup.Label = tail[:-4]
 		FreeCAD.ActiveDocument.Point_Groups.addObject(PointGroup)
 		PointObject = PointGroup.Points.copy()
-		PointObject.addPoints(pts)
+		PointObject.addPoints(pts.tolist())
 		PointGroup.Points = PointObject
 
 		App.ActiveDocument.ActiveObject.ViewObject.hide()
@@ -713,10 +773,12 @@ def muv(app,u=3,v=5,d=10,la=100,lb=100):
 	say([ "(wb,eb,sb,nb,du,dv)", (wb,eb,sb,nb,du,dv)])
 	try: pts=app.pts
 	except Exception: pts=app
+	rows=pointgrid.raster(pts,la)
 
 	for k in range(dv):
-		pu += pts[u+v*la+la*k:u+v*la+du+la*k]
-		uu.append(pts[u+v*la+la*k:u+v*la+du+la*k])
+		row=[FreeCAD.Vector(*p) for p in rows[v+k,u:u+du]]
+		pu += row
+		uu.append(row)
 
 	color=(1-0.5*random.random(),1-0.5*random.random(),1-0.5*random.random())
 
@@ -752,9 +814,11 @@ def suv(app,u=3,v=5,d=10,la=100,lb=100):
 	say('u,v',u,v)
 	try: pts=app.pts
 	except Exception: pts=app
+	rows=pointgrid.raster(pts,la)
 	for k in range(dv):
-		pu += pts[u+v*la+la*k:u+v*la+du+la*k]
-		uu.append(pts[u+v*la+la*k:u+v*la+du+la*k])
+		row=[FreeCAD.Vector(*p) for p in rows[v+k,u:u+du]]
+		pu += row
+		uu.append(row)
 		
 		say(k,u+v*la+la*k,u+v*la+du+la*k)
 	
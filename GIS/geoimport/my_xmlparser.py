@@ -6,8 +6,10 @@ fn='/home/thomas/Dokumente/freecad_buch/D006_landxml/FreeCAD_Document.xml'
 
 import re
 from .say import say
+from .progress import Progress
 from PySide import QtGui
 import FreeCAD
+import FreeCADGui
 
 class node():
 
@@ -68,11 +70,17 @@ def parseParams(string):
 
 
 
-def getData(fn,pb=None):
-	
-	if pb is None:
-		pb=QtGui.QProgressBar()
-		pb.show()
+def getData(fn,pb=None,reporter=None):
+	'''getData(fn,pb=None,reporter=None)
+	parse the xml file fn into a node tree
+	the progress is shown on reporter, a progress.Progress on pb if None
+	'''
+
+	if reporter is None:
+		if pb is None:
+			pb=QtGui.QProgressBar()
+			pb.show()
+		reporter=Progress(100,pb,pump=FreeCADGui.updateGui)
 
 
 	stack=[0,0]*4
@@ -94,9 +102,9 @@ def getData(fn,pb=None):
 	say(cl)
 
 	i=-1
-	pb.setMaximum(cl)
+	reporter.start(cl)
 	while i<cl-1:
-		pb.setValue(i)
+		reporter.update(i)
 		i += 1
 
 		line=content[i].strip()
@@ -111,7 +119,7 @@ def getData(fn,pb=None):
 
 
 	content=c2
-	pb.setMaximum(len(content))
+	reporter.start(len(content))
 
 	for lc,line in enumerate(content):
 
@@ -119,7 +127,7 @@ def getData(fn,pb=None):
 			say ("break A")
 			continue
 
-		pb.setValue(lc)
+		reporter.update(lc)
 
 #		if lc%100 == 0:
 #			say(lc)
@@ -232,5 +240,6 @@ def getData(fn,pb=None):
 	FreeCAD.stackpointer=stackpointer
 	FreeCAD.stack=stack
 	FreeCAD.objs=objs
+	reporter.finish()
 
 	return stack[0]
\ No newline at end of file
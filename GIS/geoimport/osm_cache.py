@@ -0,0 +1,131 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Local cache of OpenStreetMap data in fixed tiles
+"""
+
+"""
+The osm api is asked for tiles of a fixed grid of size degrees, one file
+per tile. An area is read from the tiles it touches, only tiles which are
+not cached yet are downloaded, so a moved or resized area reuses the
+data of the former imports.
+
+Every tile is parsed once into the binary columns of osm_columns, the
+columns of the tiles are merged and nodes and ways on tile borders are
+kept once. Like the api, only ways with a node inside the area are kept.
+
+from freecad.trails.geomatics.geoimport import osm_cache
+cache = osm_cache.OsmTileCache("/tmp/OsmData/tiles")
+reader = cache.reader(46.80, 8.04, 46.82, 8.07)
+reader.bounds
+for node in reader.nodes(): ...
+for way in reader.ways(): ...
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import osm_columns
+from . import osm_reader
+from .http_tools import backoff_delay, make_session
+
+base_source = "https://api.openstreetmap.org/api/0.6/map"
+
+
+def tile_range(minlat, minlon, maxlat, maxlon, size):
+    """grid indices (row, column) of the tiles which touch the area"""
+    rows = range(math.floor(minlat / size), max(math.ceil(maxlat / size), math.floor(minlat / size) + 1))
+    columns = range(math.floor(minlon / size), max(math.ceil(maxlon / size), math.floor(minlon / size) + 1))
+    return [(i, j) for i in rows for j in columns]
+
+
+class OsmTileCache:
+    """
+    osm xml files of the tiles of a size degrees grid in folder,
+    tiles older than max_age seconds are downloaded again
+    """
+
+    def __init__(self, folder, size=0.01, url=base_source, workers=2, retries=3,
+            max_age=30 * 24 * 3600):
+        self.folder = os.path.join(folder, "{:g}".format(size))
+        self.size = size
+        self.url = url
+        self.workers = workers
+        self.retries = retries
+        self.max_age = max_age
+        self.session = make_session(workers)
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+    def path(self, tile):
+        return os.path.join(self.folder, "{}_{}.osm".format(*tile))
+
+    def bbox(self, tile):
+        """minlon, minlat, maxlon, maxlat of a tile, the order of the api"""
+        i, j = tile
+        return (round(j * self.size, 7), round(i * self.size, 7),
+            round((j + 1) * self.size, 7), round((i + 1) * self.size, 7))
+
+    def cached(self, tile):
+        path = self.path(tile)
+        return os.path.isfile(path) and time.time() - os.path.getmtime(path) < self.max_age
+
+    def download(self, tile):
+        """download one tile, failed requests are retried with backoff"""
+        path = self.path(tile)
+        params = {"bbox": "{},{},{},{}".format(*self.bbox(tile))}
+        attempt = 0
+        while True:
+            try:
+                with self.session.get(self.url, params=params, stream=True, timeout=120) as response:
+                    response.raise_for_status()
+                    with open(path + ".part", "wb") as f:
+                        for chunk in response.iter_content(1024 * 1024):
+                            f.write(chunk)
+                os.replace(path + ".part", path)
+                return path
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    def update(self, tiles):
+        """download the tiles which are not cached, returns their number"""
+        missing = [tile for tile in tiles if not self.cached(tile)]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(self.download, missing))
+        return len(missing)
+
+    def reader(self, minlat, minlon, maxlat, maxlon):
+        """
+        osm_columns.OsmColumns of the area, missing tiles are
+        downloaded first, it has the interface of osm_reader.OsmReader
+        """
+        tiles = tile_range(minlat, minlon, maxlat, maxlon, self.size)
+        self.update(tiles)
+        return osm_columns.merge([osm_columns.load(self.path(tile)) for tile in tiles],
+            osm_reader.Bounds(minlat, minlon, maxlat, maxlon))
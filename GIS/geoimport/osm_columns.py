@@ -0,0 +1,289 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Parsed OpenStreetMap data in columns, saved as compressed binary file
+"""
+
+"""
+An osm xml file is parsed once and saved next to it as .npz file:
+node ids and lat/lon in 1e-7 degrees in typed arrays, the node refs of
+the ways as offsets + refs pair (CSR), tags as key/value index pairs into
+one string table. Later imports load the arrays without xml parsing.
+
+from freecad.trails.geomatics.geoimport import osm_columns
+data = osm_columns.load("/tmp/OsmData/tiles/0.01/4680_800.osm")
+data.node_ids, data.lat(), data.lon()
+data.way_refs[data.way_offsets[i]:data.way_offsets[i + 1]]
+for way in data.ways(): ...
+
+The columns of several files are merged with merge, nodes and ways
+which are in more than one file are kept once.
+"""
+
+import os
+
+import numpy as np
+
+from . import osm_nodes
+from . import osm_reader
+
+# changed when the layout of the arrays changes, older files are parsed again
+VERSION = 1
+
+# lat/lon are kept as integers like in the osm database
+COORD_SCALE = 10000000
+
+
+def _csr_take(offsets, values, rows):
+    """offsets and values of the rows of a CSR pair"""
+    lengths = offsets[rows + 1] - offsets[rows]
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    idx = np.repeat(offsets[rows] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return new_offsets, values[idx]
+
+
+def _csr_concat(pairs):
+    """one CSR pair of a list of (offsets, values) pairs"""
+    shift = 0
+    offsets = [np.zeros(1, dtype=np.int64)]
+    for o, v in pairs:
+        offsets.append(o[1:] + shift)
+        shift += len(v)
+    return np.concatenate(offsets), np.concatenate([v for o, v in pairs])
+
+
+class OsmColumns:
+    """
+    nodes and ways of an osm file as arrays with the interface of
+    osm_reader.OsmReader, the elements are sorted by id
+    """
+
+    def __init__(self, bounds, node_ids, node_lat, node_lon, node_tag_offsets, node_tags,
+            way_ids, way_offsets, way_refs, way_tag_offsets, way_tags, strings):
+        self.bounds = bounds
+        self.node_ids = node_ids
+        self.node_lat = node_lat
+        self.node_lon = node_lon
+        self.node_tag_offsets = node_tag_offsets
+        self.node_tags = node_tags
+        self.way_ids = way_ids
+        self.way_offsets = way_offsets
+        self.way_refs = way_refs
+        self.way_tag_offsets = way_tag_offsets
+        self.way_tags = way_tags
+        self.strings = strings
+
+    @classmethod
+    def from_elements(cls, elements):
+        """columns of a stream of osm_reader Bounds, Node and Way tuples"""
+        bounds = None
+        strings = {}
+        node_ids, node_lat, node_lon, node_tag_offsets, node_tags = [], [], [], [0], []
+        way_ids, way_offsets, way_refs, way_tag_offsets, way_tags = [], [0], [], [0], []
+
+        def add_tags(tags, target, offsets):
+            for k, v in tags.items():
+                target.append((strings.setdefault(k, len(strings)), strings.setdefault(v, len(strings))))
+            offsets.append(len(target))
+
+        for element in elements:
+            if isinstance(element, osm_reader.Node):
+                node_ids.append(element.id)
+                node_lat.append(element.lat)
+                node_lon.append(element.lon)
+                add_tags(element.tags, node_tags, node_tag_offsets)
+            elif isinstance(element, osm_reader.Way):
+                way_ids.append(element.id)
+                way_refs.extend(element.refs)
+                way_offsets.append(len(way_refs))
+                add_tags(element.tags, way_tags, way_tag_offsets)
+            elif isinstance(element, osm_reader.Bounds):
+                bounds = element
+
+        columns = cls(
+            bounds,
+            np.array(node_ids, dtype=np.int64),
+            np.rint(np.array(node_lat, dtype=np.float64) * COORD_SCALE).astype(np.int32),
+            np.rint(np.array(node_lon, dtype=np.float64) * COORD_SCALE).astype(np.int32),
+            np.array(node_tag_offsets, dtype=np.int64),
+            np.array(node_tags, dtype=np.int32).reshape(-1, 2),
+            np.array(way_ids, dtype=np.int64),
+            np.array(way_offsets, dtype=np.int64),
+            np.array(way_refs, dtype=np.int64),
+            np.array(way_tag_offsets, dtype=np.int64),
+            np.array(way_tags, dtype=np.int32).reshape(-1, 2),
+            list(strings))
+        return columns.sorted()
+
+    def sorted(self):
+        """the columns with nodes and ways sorted by id"""
+        if np.all(np.diff(self.node_ids) > 0) and np.all(np.diff(self.way_ids) > 0):
+            return self
+        return self.take(np.argsort(self.node_ids, kind="stable"), np.argsort(self.way_ids, kind="stable"))
+
+    def take(self, nodes, ways):
+        """columns of a selection of node and way positions"""
+        node_tag_offsets, node_tags = _csr_take(self.node_tag_offsets, self.node_tags, nodes)
+        way_offsets, way_refs = _csr_take(self.way_offsets, self.way_refs, ways)
+        way_tag_offsets, way_tags = _csr_take(self.way_tag_offsets, self.way_tags, ways)
+        return OsmColumns(self.bounds,
+            self.node_ids[nodes], self.node_lat[nodes], self.node_lon[nodes],
+            node_tag_offsets, node_tags,
+            self.way_ids[ways], way_offsets, way_refs, way_tag_offsets, way_tags,
+            self.strings)
+
+    def save(self, path):
+        """write the columns to a compressed .npz file"""
+        blob = [s.encode("utf-8") for s in self.strings]
+        string_offsets = np.zeros(len(blob) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blob], out=string_offsets[1:])
+        bounds = np.array(self.bounds if self.bounds else [np.nan] * 4, dtype=np.float64)
+
+        with open(path + ".part", "wb") as f:
+            np.savez_compressed(
+                f, version=np.array(VERSION), bounds=bounds,
+                node_ids=self.node_ids, node_lat=self.node_lat, node_lon=self.node_lon,
+                node_tag_offsets=self.node_tag_offsets, node_tags=self.node_tags,
+                way_ids=self.way_ids, way_offsets=self.way_offsets, way_refs=self.way_refs,
+                way_tag_offsets=self.way_tag_offsets, way_tags=self.way_tags,
+                string_offsets=string_offsets,
+                string_data=np.frombuffer(b"".join(blob), dtype=np.uint8))
+        os.replace(path + ".part", path)
+
+    @classmethod
+    def read(cls, path):
+        """columns of a file written by save, None if it has another version"""
+        with np.load(path) as f:
+            if int(f["version"]) != VERSION:
+                return None
+            data = f["string_data"].tobytes()
+            o = f["string_offsets"].tolist()
+            strings = [data[o[i]:o[i + 1]].decode("utf-8") for i in range(len(o) - 1)]
+            bounds = f["bounds"]
+            return cls(
+                None if np.isnan(bounds[0]) else osm_reader.Bounds(*bounds.tolist()),
+                f["node_ids"], f["node_lat"], f["node_lon"],
+                f["node_tag_offsets"], f["node_tags"],
+                f["way_ids"], f["way_offsets"], f["way_refs"],
+                f["way_tag_offsets"], f["way_tags"],
+                strings)
+
+    def lat(self):
+        return self.node_lat / COORD_SCALE
+
+    def lon(self):
+        return self.node_lon / COORD_SCALE
+
+    def _tags(self, offsets, tags, i):
+        s = self.strings
+        return {s[k]: s[v] for k, v in tags[offsets[i]:offsets[i + 1]].tolist()}
+
+    def nodes(self):
+        """yield all nodes as osm_reader.Node"""
+        lat = self.lat().tolist()
+        lon = self.lon().tolist()
+        for i, node_id in enumerate(self.node_ids.tolist()):
+            yield osm_reader.Node(node_id, lat[i], lon[i],
+                self._tags(self.node_tag_offsets, self.node_tags, i))
+
+    def ways(self):
+        """yield all ways as osm_reader.Way"""
+        refs = self.way_refs.tolist()
+        offsets = self.way_offsets.tolist()
+        for i, way_id in enumerate(self.way_ids.tolist()):
+            yield osm_reader.Way(way_id, refs[offsets[i]:offsets[i + 1]],
+                self._tags(self.way_tag_offsets, self.way_tags, i))
+
+    def node_store(self):
+        """osm_nodes.NodeStore of all nodes"""
+        return osm_nodes.NodeStore.from_arrays(self.node_ids, self.lat(), self.lon())
+
+    def progress(self):
+        """the data is in memory, for the interface of osm_reader.OsmReader"""
+        return 1.0
+
+
+def load(osm_path):
+    """
+    columns of an osm xml file, read from the .npz file next to it,
+    which is written on the first call and when the xml file is newer
+    """
+    path = os.path.splitext(osm_path)[0] + ".npz"
+    if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(osm_path):
+        columns = OsmColumns.read(path)
+        if columns is not None:
+            return columns
+
+    columns = OsmColumns.from_elements(osm_reader.iter_elements(osm_path))
+    columns.save(path)
+    return columns
+
+
+def merge(parts, bounds=None):
+    """
+    one OsmColumns of several, elements with the same id are kept once
+    with bounds only ways with at least one node inside are kept, like
+    the osm api does for an area
+    """
+    parts = list(parts)
+
+    # one string table, the tag indices of every part are mapped onto it
+    table = {}
+    node_tags = []
+    way_tags = []
+    for part in parts:
+        mapping = np.array([table.setdefault(s, len(table)) for s in part.strings] or [0], dtype=np.int32)
+        node_tags.append((part.node_tag_offsets, mapping[part.node_tags].reshape(-1, 2)))
+        way_tags.append((part.way_tag_offsets, mapping[part.way_tags].reshape(-1, 2)))
+
+    node_tag_offsets, node_tag_values = _csr_concat(node_tags)
+    way_tag_offsets, way_tag_values = _csr_concat(way_tags)
+    way_offsets, way_refs = _csr_concat([(p.way_offsets, p.way_refs) for p in parts])
+    merged = OsmColumns(
+        bounds,
+        np.concatenate([p.node_ids for p in parts]),
+        np.concatenate([p.node_lat for p in parts]),
+        np.concatenate([p.node_lon for p in parts]),
+        node_tag_offsets, node_tag_values,
+        np.concatenate([p.way_ids for p in parts]),
+        way_offsets, way_refs, way_tag_offsets, way_tag_values,
+        list(table))
+
+    # first position of every id, sorted by id
+    node_ids, nodes = np.unique(merged.node_ids, return_index=True)
+    way_ids, ways = np.unique(merged.way_ids, return_index=True)
+
+    if bounds is not None:
+        lat = merged.node_lat[nodes]
+        lon = merged.node_lon[nodes]
+        b = np.rint(np.array(bounds) * COORD_SCALE)
+        inside = node_ids[(b[0] <= lat) & (lat <= b[2]) & (b[1] <= lon) & (lon <= b[3])]
+
+        # number of refs inside the bounds per way
+        pos = np.minimum(np.searchsorted(inside, merged.way_refs), max(len(inside) - 1, 0))
+        hit = inside[pos] == merged.way_refs if len(inside) else np.zeros(len(merged.way_refs), bool)
+        count = np.concatenate([[0], np.cumsum(hit)])
+        ways = ways[count[merged.way_offsets[ways + 1]] > count[merged.way_offsets[ways]]]
+
+    return merged.take(nodes, ways)
@@ -0,0 +1,113 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Compact coordinate table of OpenStreetMap nodes
+"""
+
+"""
+Node ids are kept in a sorted int64 array, lat/lon and the projected x/y
+in parallel float64 arrays, 40 bytes per node. The nodes of a way are
+found by binary search and gathered in one step.
+
+from freecad.trails.geomatics.geoimport import osm_nodes
+store = osm_nodes.NodeStore(reader.nodes())
+store.project(tm, center)
+idx = store.index(way.refs)
+store.x[idx], store.y[idx]
+"""
+
+from array import array
+
+import numpy as np
+
+
+class NodeStore:
+    """
+    lat/lon and projected x/y of osm nodes, sorted by node id
+    """
+
+    def __init__(self, nodes=()):
+        ids = array("q")
+        lat = array("d")
+        lon = array("d")
+        for n in nodes:
+            ids.append(n.id)
+            lat.append(n.lat)
+            lon.append(n.lon)
+
+        self._set(np.frombuffer(ids, dtype=np.int64),
+            np.frombuffer(lat, dtype=np.float64),
+            np.frombuffer(lon, dtype=np.float64))
+
+    @classmethod
+    def from_arrays(cls, ids, lat, lon):
+        """store on node id, lat and lon arrays without a loop over the nodes"""
+        store = cls()
+        store._set(np.asarray(ids, dtype=np.int64),
+            np.asarray(lat, dtype=np.float64),
+            np.asarray(lon, dtype=np.float64))
+        return store
+
+    def _set(self, ids, lat, lon):
+        self.ids = ids
+        self.lat = lat
+        self.lon = lon
+
+        # the osm api writes nodes sorted by id, sort only if needed
+        if len(self.ids) > 1 and np.any(self.ids[1:] < self.ids[:-1]):
+            order = np.argsort(self.ids, kind="stable")
+            self.ids = self.ids[order]
+            self.lat = self.lat[order]
+            self.lon = self.lon[order]
+
+        self.x = np.zeros(len(self.ids))
+        self.y = np.zeros(len(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        i = np.searchsorted(self.ids, node_id)
+        return i < len(self.ids) and self.ids[i] == node_id
+
+    def project(self, tm, center=(0.0, 0.0)):
+        """
+        set x/y of all nodes with the transverse mercator tm,
+        relative to center
+        """
+        x, y = tm.fromGeographicArray(self.lat, self.lon)
+        self.x = x - center[0]
+        self.y = y - center[1]
+
+    def index(self, refs):
+        """
+        array positions of the node ids in refs,
+        raises KeyError for ids which are not in the store
+        """
+        refs = np.asarray(refs, dtype=np.int64)
+        idx = np.searchsorted(self.ids, refs)
+        idx[idx == len(self.ids)] = 0
+        missing = self.ids[idx] != refs if len(self.ids) else np.ones(len(refs), bool)
+        if np.any(missing):
+            raise KeyError("nodes not found: {}".format(refs[missing].tolist()))
+        return idx
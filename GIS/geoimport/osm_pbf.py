@@ -0,0 +1,429 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Read OpenStreetMap .osm.pbf extracts from local disk
+"""
+
+"""
+A pbf file is a sequence of independent zlib compressed blocks. Only the
+block positions are read in the main process, the blocks are decoded in
+a process pool into the columns of osm_columns and merged, the result
+has the reader interface which import_osm uses for the osm api data.
+
+With an area only the nodes inside it, the ways with at least one node
+inside and the other nodes of these ways are kept, like the osm api does:
+the first pass keeps the nodes inside, the second one the ways, the third
+one reads the missing nodes from the blocks which can contain them.
+
+from freecad.trails.geomatics.geoimport import osm_pbf
+reader = osm_pbf.read("/tmp/switzerland-latest.osm.pbf", (46.80, 8.04, 46.82, 8.07))
+reader.bounds
+for way in reader.ways(): ...
+
+The protobuf messages are decoded without the protobuf package, packed
+arrays with numpy. Only raw and zlib compressed blobs are supported,
+relations are skipped.
+"""
+
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from . import osm_columns
+from . import osm_reader
+
+# the osm database keeps lat/lon in 1e-7 degrees, pbf in nanodegrees
+NANO = 1000000000 // osm_columns.COORD_SCALE
+
+
+def _varint(buf, pos):
+    """value and end position of the varint at pos"""
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf):
+    """yield field number and value of the fields of a protobuf message"""
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        wire = key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 2:
+            length, pos = _varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire == 1:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire == 5:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError("Unsupported protobuf wire type {}".format(wire))
+        yield key >> 3, value
+
+
+def _zigzag(v):
+    return (v >> 1) ^ -(v & 1)
+
+
+def _int64(v):
+    return v - (1 << 64) if v >= 1 << 63 else v
+
+
+def _packed(buf):
+    """packed varints as uint64 array"""
+    b = np.frombuffer(buf, dtype=np.uint8)
+    if len(b) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    shift = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    values = (b & 0x7f).astype(np.uint64) << (7 * shift).astype(np.uint64)
+    return np.add.reduceat(values, starts)
+
+
+def _packed_sint(buf):
+    """packed zigzag encoded varints as int64 array"""
+    v = _packed(buf)
+    return (v >> np.uint64(1)).astype(np.int64) ^ -(v & np.uint64(1)).astype(np.int64)
+
+
+def _packed_segments(buffers, signed=False):
+    """
+    the packed varints of several fields decoded at once,
+    values and CSR offsets of the fields
+    """
+    joined = b"".join(buffers)
+    values = _packed_sint(joined) if signed else _packed(joined).astype(np.int64)
+    ends = np.zeros(len(buffers) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in buffers], out=ends[1:])
+    last = np.concatenate([[0], np.cumsum(np.frombuffer(joined, dtype=np.uint8) < 0x80)])
+    return values, last[ends]
+
+
+def _delta_segments(values, offsets):
+    """undo the delta coding of every segment of a CSR pair"""
+    total = np.cumsum(values)
+    before = np.concatenate([[0], total])[offsets[:-1]]
+    return total - np.repeat(before, np.diff(offsets))
+
+
+def _empty_columns():
+    zero = np.zeros(1, dtype=np.int64)
+    return osm_columns.OsmColumns(
+        None,
+        np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+        zero, np.zeros((0, 2), dtype=np.int32),
+        np.zeros(0, dtype=np.int64), zero, np.zeros(0, dtype=np.int64),
+        zero, np.zeros((0, 2), dtype=np.int32),
+        [])
+
+
+def scan(path):
+    """
+    bounds of the header block and (offset, size) of the data blobs,
+    only the blob headers are read
+    """
+    bounds = None
+    blocks = []
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(4)
+            if len(head) < 4:
+                break
+            header = dict(_fields(f.read(struct.unpack(">I", head)[0])))
+            kind = bytes(header.get(1, b"")).decode("ascii")
+            size = header.get(3, 0)
+            offset = f.tell()
+            if kind == "OSMHeader":
+                bounds = _header_bounds(_blob_data(f.read(size)))
+            else:
+                if kind == "OSMData":
+                    blocks.append((offset, size))
+                f.seek(size, os.SEEK_CUR)
+    return bounds, blocks
+
+
+def _blob_data(blob):
+    for field, value in _fields(memoryview(blob)):
+        if field == 1:
+            return value
+        if field == 3:
+            return memoryview(zlib.decompress(value))
+    raise ValueError("Unsupported pbf blob compression")
+
+
+def _header_bounds(data):
+    for field, value in _fields(data):
+        if field == 1:
+            box = {f: _zigzag(v) / 1e9 for f, v in _fields(value)}
+            # left, right, top, bottom
+            return osm_reader.Bounds(box.get(4, 0.0), box.get(1, 0.0), box.get(3, 0.0), box.get(2, 0.0))
+    return None
+
+
+def decode_block(data):
+    """osm_columns.OsmColumns of the nodes and ways of a PrimitiveBlock"""
+    strings = []
+    groups = []
+    granularity = 100
+    lat_offset = lon_offset = 0
+    for field, value in _fields(data):
+        if field == 1:
+            strings = [bytes(s).decode("utf-8") for f, s in _fields(value) if f == 1]
+        elif field == 2:
+            groups.append(value)
+        elif field == 17:
+            granularity = value
+        elif field == 19:
+            lat_offset = _int64(value)
+        elif field == 20:
+            lon_offset = _int64(value)
+
+    nodes = []
+    node_tags = []
+    node_tag_counts = []
+    way_ids = []
+    way_refs = []
+    way_keys = []
+    way_vals = []
+
+    for group in groups:
+        for field, value in _fields(group):
+            if field == 1:
+                # single nodes, rare in extracts
+                node = {}
+                keys = vals = b""
+                for f, v in _fields(value):
+                    if f == 2:
+                        keys = v
+                    elif f == 3:
+                        vals = v
+                    elif f in (1, 8, 9):
+                        node[f] = _zigzag(v)
+                nodes.append((np.array([node.get(1, 0)]), np.array([node.get(8, 0)]),
+                    np.array([node.get(9, 0)])))
+                pairs = np.stack([_packed(keys), _packed(vals)], axis=1).astype(np.int64)
+                node_tags.append(pairs)
+                node_tag_counts.append(np.array([len(pairs)]))
+            elif field == 2:
+                dense = {1: b"", 8: b"", 9: b"", 10: b""}
+                for f, v in _fields(value):
+                    if f in dense:
+                        dense[f] = v
+                ids = np.cumsum(_packed_sint(dense[1]))
+                nodes.append((ids, np.cumsum(_packed_sint(dense[8])), np.cumsum(_packed_sint(dense[9]))))
+                # keys and values of all nodes, the tags of a node end with 0
+                kv = _packed(dense[10]).astype(np.int64)
+                if len(kv):
+                    end = kv == 0
+                    owner = (np.cumsum(end) - end)[~end][0::2]
+                    kv = kv[~end]
+                    node_tags.append(np.stack([kv[0::2], kv[1::2]], axis=1))
+                    node_tag_counts.append(np.bincount(owner, minlength=len(ids)))
+                else:
+                    node_tags.append(np.zeros((0, 2), dtype=np.int64))
+                    node_tag_counts.append(np.zeros(len(ids), dtype=np.int64))
+            elif field == 3:
+                way = {1: 0, 2: b"", 3: b"", 8: b""}
+                for f, v in _fields(value):
+                    if f in way:
+                        way[f] = v
+                way_ids.append(way[1])
+                way_keys.append(way[2])
+                way_vals.append(way[3])
+                way_refs.append(way[8])
+
+    columns = _empty_columns()
+    columns.strings = strings
+    if nodes:
+        ids, lat, lon = (np.concatenate(c) for c in zip(*nodes))
+        columns.node_ids = ids.astype(np.int64)
+        columns.node_lat = ((lat_offset + granularity * lat) // NANO).astype(np.int32)
+        columns.node_lon = ((lon_offset + granularity * lon) // NANO).astype(np.int32)
+        columns.node_tag_offsets = np.concatenate([[0], np.cumsum(np.concatenate(node_tag_counts))]).astype(np.int64)
+        columns.node_tags = np.concatenate(node_tags).astype(np.int32).reshape(-1, 2)
+    if way_ids:
+        refs, offsets = _packed_segments(way_refs, signed=True)
+        keys, tag_offsets = _packed_segments(way_keys)
+        vals, _ = _packed_segments(way_vals)
+        columns.way_ids = np.array(way_ids, dtype=np.int64)
+        columns.way_offsets = offsets
+        columns.way_refs = _delta_segments(refs, offsets)
+        columns.way_tag_offsets = tag_offsets
+        columns.way_tags = np.stack([keys, vals], axis=1).astype(np.int32).reshape(-1, 2)
+    return columns.sorted()
+
+
+def _read_block(path, offset, size):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return decode_block(_blob_data(f.read(size)))
+
+
+def _inside(columns, bbox):
+    """mask of the nodes inside bbox (minlat, minlon, maxlat, maxlon)"""
+    b = np.rint(np.array(bbox) * osm_columns.COORD_SCALE)
+    lat = columns.node_lat
+    lon = columns.node_lon
+    return (b[0] <= lat) & (lat <= b[2]) & (b[1] <= lon) & (lon <= b[3])
+
+
+def _contains(ids, values):
+    """mask of the values which are in the sorted array ids"""
+    if len(ids) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+    return ids[pos] == values
+
+
+# sorted node ids shared with the worker processes by _init
+_selection = None
+
+
+def _init(selection):
+    global _selection
+    _selection = selection
+
+
+def _nodes_pass(path, offset, size, bbox):
+    """
+    the nodes of a block inside bbox, the id range of all its nodes
+    and if it contains ways
+    """
+    columns = _read_block(path, offset, size)
+    ids = columns.node_ids
+    id_range = (int(ids[0]), int(ids[-1])) if len(ids) else None
+    ways = np.arange(len(columns.way_ids)) if bbox is None else np.zeros(0, dtype=np.int64)
+    nodes = np.arange(len(ids)) if bbox is None else np.flatnonzero(_inside(columns, bbox))
+    return columns.take(nodes, ways), id_range, len(columns.way_ids) > 0
+
+
+def _ways_pass(path, offset, size):
+    """the ways of a block with at least one node in the selection"""
+    columns = _read_block(path, offset, size)
+    count = np.concatenate([[0], np.cumsum(_contains(_selection, columns.way_refs))])
+    ways = np.flatnonzero(count[columns.way_offsets[1:]] > count[columns.way_offsets[:-1]])
+    return columns.take(np.zeros(0, dtype=np.int64), ways)
+
+
+def _refs_pass(path, offset, size):
+    """the nodes of a block which are in the selection"""
+    columns = _read_block(path, offset, size)
+    nodes = np.flatnonzero(_contains(_selection, columns.node_ids))
+    return columns.take(nodes, np.zeros(0, dtype=np.int64))
+
+
+def _context():
+    """
+    spawn context for the workers, inside FreeCAD sys.executable is the
+    FreeCAD binary, the workers are started with the python next to it,
+    None if there is no python to start them with
+    """
+    context = multiprocessing.get_context("spawn")
+    name = os.path.basename(sys.executable).lower()
+    if "python" in name:
+        return context
+    folder = os.path.dirname(sys.executable)
+    for candidate in ("python.exe", "python3", "python"):
+        if os.path.isfile(os.path.join(folder, candidate)):
+            context.set_executable(os.path.join(folder, candidate))
+            return context
+    return None
+
+
+def _map(func, tasks, workers, selection=None):
+    """
+    results of func for every task in a process pool of workers, in the
+    current process if workers is 0 or 1 or the pool can not be started
+    """
+    context = _context() if workers > 1 and len(tasks) > 1 else None
+    if context is not None:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context,
+                    initializer=_init, initargs=(selection,)) as executor:
+                return list(executor.map(func, *zip(*tasks)))
+        except (BrokenProcessPool, OSError):
+            pass
+    _init(selection)
+    try:
+        return [func(*task) for task in tasks]
+    finally:
+        _init(None)
+
+
+def read(path, bbox=None, workers=None):
+    """
+    osm_columns.OsmColumns of a pbf file, with the interface of
+    osm_reader.OsmReader, bbox: (minlat, minlon, maxlat, maxlon)
+    to keep only an area like the osm api does, the whole file without
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    path = os.path.abspath(path)
+    header_bounds, blocks = scan(path)
+
+    results = _map(_nodes_pass, [(path, offset, size, bbox) for offset, size in blocks], workers)
+    parts = [r[0] for r in results] or [_empty_columns()]
+    if bbox is None:
+        columns = osm_columns.merge(parts)
+        columns.bounds = header_bounds
+        if columns.bounds is None and len(columns.node_ids):
+            lat = columns.lat()
+            lon = columns.lon()
+            columns.bounds = osm_reader.Bounds(lat.min(), lon.min(), lat.max(), lon.max())
+        return columns
+
+    bounds = osm_reader.Bounds(*bbox)
+    inside = np.unique(np.concatenate([p.node_ids for p in parts] or [np.zeros(0, dtype=np.int64)]))
+    way_blocks = [(path, offset, size) for (offset, size), r in zip(blocks, results) if r[2]]
+    ways = _map(_ways_pass, way_blocks, workers, inside)
+    parts.extend(ways)
+
+    # nodes of the ways outside the area, only from blocks with a matching id range
+    refs = np.unique(np.concatenate([w.way_refs for w in ways] or [np.zeros(0, dtype=np.int64)]))
+    missing = refs[~_contains(inside, refs)]
+    if len(missing):
+        node_blocks = [block for block, r in zip(blocks, results) if r[1] is not None
+            and np.any((missing >= r[1][0]) & (missing <= r[1][1]))]
+        parts.extend(_map(_refs_pass, [(path, offset, size) for offset, size in node_blocks],
+            workers, missing))
+
+    return osm_columns.merge(parts, bounds)
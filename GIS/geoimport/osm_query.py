@@ -0,0 +1,141 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Filtered OpenStreetMap queries on an Overpass server
+"""
+
+"""
+The osm api returns everything in an area, most of it is not drawn by
+import_osm. OverpassQuery asks an Overpass server only for the ways with
+one of the tag keys of the enabled categories, with their tags, and for
+the plain coordinates of their nodes. It has the reader method of
+osm_cache.OsmTileCache, so both can be used as backend of get_osmdata.
+
+from freecad.trails.geomatics.geoimport import osm_query
+backend = osm_query.OverpassQuery("/tmp/OsmData/overpass", ["building", "highway"])
+print(backend.query(46.80, 8.04, 46.82, 8.07))
+reader = backend.reader(46.80, 8.04, 46.82, 8.07)
+for way in reader.ways(): ...
+
+Answers are kept per query text, the same area and categories are read
+from disk again.
+"""
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from . import osm_columns
+from . import osm_reader
+from .http_tools import backoff_delay, make_session
+
+base_source = "https://overpass-api.de/api/interpreter"
+
+# tag keys of the ways drawn by import_osm, per category of get_properties
+CATEGORY_KEYS = {"building": "building", "road": "highway", "landuse": "landuse"}
+
+
+def build_query(minlat, minlon, maxlat, maxlon, keys, timeout=180):
+    """
+    overpass ql query for the ways with one of the tag keys in the area,
+    the ways with their tags, their nodes without tags
+    """
+    ways = "".join('way["{}"];'.format(key) for key in keys)
+    return ("[out:xml][timeout:{}][bbox:{:.7f},{:.7f},{:.7f},{:.7f}];"
+        "({})->.ways;.ways out body qt;.ways >;out skel qt;").format(
+        timeout, minlat, minlon, maxlat, maxlon, ways)
+
+
+def keep_keys(columns, keys):
+    """osm_columns.OsmColumns with only the ways which have one of the tag keys"""
+    wanted = np.array([s in keys for s in columns.strings] or [False])
+    hit = wanted[columns.way_tags[:, 0]] if len(columns.way_tags) else np.zeros(0, dtype=bool)
+    count = np.concatenate([[0], np.cumsum(hit)])
+    offsets = columns.way_tag_offsets
+    ways = np.flatnonzero(count[offsets[1:]] > count[offsets[:-1]])
+    return columns.take(np.arange(len(columns.node_ids)), ways)
+
+
+class OverpassQuery:
+    """
+    ways with the tag keys keys from an Overpass server, answers are
+    kept in folder, answers older than max_age seconds are asked again
+    """
+
+    def __init__(self, folder, keys=("building", "highway", "landuse"), url=base_source,
+            retries=3, timeout=180, max_age=30 * 24 * 3600):
+        self.folder = folder
+        self.keys = list(keys)
+        self.url = url
+        self.retries = retries
+        self.timeout = timeout
+        self.max_age = max_age
+        self.session = make_session(1)
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+    def query(self, minlat, minlon, maxlat, maxlon):
+        return build_query(minlat, minlon, maxlat, maxlon, self.keys, self.timeout)
+
+    def path(self, query):
+        return os.path.join(self.folder, hashlib.sha1(query.encode("utf-8")).hexdigest() + ".osm")
+
+    def cached(self, query):
+        path = self.path(query)
+        return os.path.isfile(path) and time.time() - os.path.getmtime(path) < self.max_age
+
+    def download(self, query):
+        """
+        post the query, failed requests and busy answers of the
+        server are retried with backoff
+        """
+        path = self.path(query)
+        attempt = 0
+        while True:
+            try:
+                with self.session.post(self.url, data={"data": query}, stream=True,
+                        timeout=self.timeout + 30) as response:
+                    response.raise_for_status()
+                    with open(path + ".part", "wb") as f:
+                        for chunk in response.iter_content(1024 * 1024):
+                            f.write(chunk)
+                os.replace(path + ".part", path)
+                return path
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    def reader(self, minlat, minlon, maxlat, maxlon):
+        """
+        osm_columns.OsmColumns of the area, with the interface of
+        osm_reader.OsmReader
+        """
+        query = self.query(minlat, minlon, maxlat, maxlon)
+        if not self.cached(query):
+            self.download(query)
+        return osm_columns.merge([osm_columns.load(self.path(query))],
+            osm_reader.Bounds(minlat, minlon, maxlat, maxlon))
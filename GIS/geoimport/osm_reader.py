@@ -0,0 +1,148 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Streaming reader for OpenStreetMap xml data
+"""
+
+"""
+The osm api and the planet extracts write the elements in a fixed order:
+bounds, all nodes, all ways, all relations. The reader walks the file once
+with an incremental pull parser and drops every element as soon as it is
+handled, so memory does not grow with the document.
+
+from freecad.trails.geomatics.geoimport import osm_reader
+reader = osm_reader.OsmReader("/tmp/map.osm")
+reader.bounds
+nodes = {n.id: (n.lat, n.lon) for n in reader.nodes()}
+for way in reader.ways():
+    print(way.id, way.refs, way.tags)
+"""
+
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+
+Bounds = namedtuple("Bounds", ["minlat", "minlon", "maxlat", "maxlon"])
+Node = namedtuple("Node", ["id", "lat", "lon", "tags"])
+Way = namedtuple("Way", ["id", "refs", "tags"])
+
+# document order of the yielded element types
+_RANK = {Bounds: 0, Node: 1, Way: 2}
+
+
+def _tags(elem):
+    return {tag.get("k"): tag.get("v") for tag in elem.iterfind("tag")}
+
+
+def iter_elements(source):
+    """
+    yield Bounds, Node and Way tuples of an osm xml file in document order
+    source is a file name or a file object opened in binary mode
+    relations and all other elements are skipped
+    """
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == "node":
+            yield Node(
+                int(elem.get("id")),
+                float(elem.get("lat")),
+                float(elem.get("lon")),
+                _tags(elem))
+
+        elif elem.tag == "way":
+            yield Way(
+                int(elem.get("id")),
+                [int(nd.get("ref")) for nd in elem.iterfind("nd")],
+                _tags(elem))
+
+        elif elem.tag == "bounds":
+            yield Bounds(
+                float(elem.get("minlat")),
+                float(elem.get("minlon")),
+                float(elem.get("maxlat")),
+                float(elem.get("maxlon")))
+
+        elif elem.tag != "relation":
+            # children of node, way and relation are read with the parent
+            continue
+
+        # the top level element is done, release it and its children
+        root.clear()
+
+
+class OsmReader:
+    """
+    One pass view on an osm xml file.
+    bounds is read on creation, nodes() and ways() have to be consumed
+    in this order. Elements of an earlier type which were not consumed
+    are skipped.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.size = os.path.getsize(filename)
+        self._file = None
+        self._elements = self._iter_elements()
+        self._pending = next(self._elements, None)
+
+        self.bounds = None
+        if isinstance(self._pending, Bounds):
+            self.bounds = self._pending
+            self._pending = next(self._elements, None)
+
+    def _iter_elements(self):
+        with open(self.filename, "rb") as self._file:
+            for element in iter_elements(self._file):
+                yield element
+
+    def _take(self, kind):
+        rank = _RANK[kind]
+        while self._pending is not None:
+            element = self._pending
+            element_rank = _RANK[type(element)]
+            if element_rank > rank:
+                return
+
+            self._pending = next(self._elements, None)
+            if element_rank == rank:
+                yield element
+
+    def nodes(self):
+        """yield all nodes"""
+        return self._take(Node)
+
+    def ways(self):
+        """yield all ways"""
+        return self._take(Way)
+
+    def progress(self):
+        """fraction of the file read so far"""
+        if self._file is None or self._file.closed or not self.size:
+            return 1.0
+        return min(1.0, self._file.tell() / self.size)
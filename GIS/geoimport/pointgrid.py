@@ -0,0 +1,187 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Detect the raster layout of gridded point clouds
+"""
+
+"""
+Elevation models like DGM1 are written as x y z lines, row by row.
+infer_grid finds the layout of such a point array and returns the heights
+as 2D raster, a view on the point array if no cell is missing.
+
+from freecad.trails.geomatics.geoimport import pointgrid
+grid = pointgrid.infer_grid(pts)
+grid.shape, grid.spacing, grid.origin, grid.axis, grid.missing
+grid.heights[v, u]
+grid.points()[v, u]
+"""
+
+import numpy as np
+
+
+def _as_points(pts):
+    return np.asarray(pts, dtype=np.float64).reshape(-1, 3)
+
+
+def _fast_axis(pts):
+    """0 if x changes from point to point inside a row, 1 if y does"""
+    d = np.diff(pts[:, :2], axis=0) != 0
+    return 0 if np.count_nonzero(d[:, 0]) >= np.count_nonzero(d[:, 1]) else 1
+
+
+def _step(values, steps):
+    """
+    grid spacing of the coordinate values, the distance of neighbouring
+    distinct values, with the sign of most of the steps in file order
+    """
+    d = np.diff(np.unique(values))
+    if len(d):
+        # differences of rounding noise are no grid steps
+        d = d[d > 1e-6 * d.max()]
+    if len(d) == 0:
+        return 0.0
+    sign = -1.0 if np.count_nonzero(steps < 0) > np.count_nonzero(steps > 0) else 1.0
+    return sign * float(np.median(d))
+
+
+def row_length(pts):
+    """
+    number of points of the first row, the row ends where the
+    coordinate which is constant inside a row changes
+    """
+    pts = _as_points(pts)
+    if len(pts) < 2:
+        return len(pts)
+    slow = pts[:, 1 - _fast_axis(pts)]
+    breaks = np.flatnonzero(np.diff(slow) != 0)
+    if len(breaks) == 0:
+        return len(pts)
+    return int(breaks[0]) + 1
+
+
+class Grid:
+    """
+    raster layout of a point array
+    shape: (rows, columns), a row is a run of points along axis
+    axis: "x" or "y", the axis which changes inside a row
+    spacing: (column step, row step), signed, in file order
+    origin: x, y of the raster cell (0, 0)
+    missing: number of raster cells without a point
+    heights: 2D array of z, NaN for missing cells
+    """
+
+    def __init__(self, pts, shape, axis, spacing, origin, missing, heights, ordered):
+        self.pts = pts
+        self.shape = shape
+        self.axis = axis
+        self.spacing = spacing
+        self.origin = origin
+        self.missing = missing
+        self.heights = heights
+        self.ordered = ordered
+
+    @property
+    def rows(self):
+        return self.shape[0]
+
+    @property
+    def columns(self):
+        return self.shape[1]
+
+    def points(self):
+        """
+        the points as (rows, columns, 3) array,
+        a view if the points are complete and in raster order
+        """
+        if self.ordered:
+            return self.pts.reshape(self.rows, self.columns, 3)
+
+        fast = 0 if self.axis == "x" else 1
+        u = np.arange(self.columns) * self.spacing[0] + self.origin[fast]
+        v = np.arange(self.rows) * self.spacing[1] + self.origin[1 - fast]
+        uu, vv = np.meshgrid(u, v)
+        if fast == 0:
+            return np.stack([uu, vv, self.heights], axis=2)
+        return np.stack([vv, uu, self.heights], axis=2)
+
+
+def infer_grid(pts):
+    """
+    layout of a gridded point array (N, 3) or a list of vectors
+    the points can be in any order and gaps are allowed, the raster
+    is a view on pts if they are complete and sorted row by row
+    """
+    pts = _as_points(pts)
+    n = len(pts)
+    if n < 2:
+        return Grid(pts, (1, n), "x", (0.0, 0.0), tuple(pts[0, :2]) if n else (0.0, 0.0),
+            0, pts[:, 2].reshape(1, n), True)
+
+    fast = _fast_axis(pts)
+    steps = np.diff(pts[:, :2], axis=0)
+    in_row = steps[:, 1 - fast] == 0
+
+    # the grid spacing along and across the rows, the direction in file order
+    du = _step(pts[:, fast], steps[in_row, fast])
+    dv = _step(pts[:, 1 - fast], steps[~in_row, 1 - fast])
+
+    # raster index of every point relative to the first one
+    u = np.zeros(n, np.int64)
+    v = np.zeros(n, np.int64)
+    if du:
+        u = np.rint((pts[:, fast] - pts[0, fast]) / du).astype(np.int64)
+    if dv:
+        v = np.rint((pts[:, 1 - fast] - pts[0, 1 - fast]) / dv).astype(np.int64)
+
+    # rows starting before the first point move the origin
+    umin = u.min()
+    vmin = v.min()
+    u -= umin
+    v -= vmin
+    origin = [0.0, 0.0]
+    origin[fast] = pts[0, fast] + umin * du
+    origin[1 - fast] = pts[0, 1 - fast] + vmin * dv
+    origin = (float(origin[0]), float(origin[1]))
+
+    columns = int(u.max()) + 1
+    rows = int(v.max()) + 1
+    cell = v * columns + u
+
+    ordered = n == rows * columns and np.array_equal(cell, np.arange(n))
+    if ordered:
+        heights = pts[:, 2].reshape(rows, columns)
+        missing = 0
+    else:
+        heights = np.full((rows, columns), np.nan)
+        heights[v, u] = pts[:, 2]
+        missing = rows * columns - len(np.unique(cell))
+
+    return Grid(pts, (rows, columns), "xy"[fast], (float(du), float(dv)), origin, missing, heights, ordered)
+
+
+def raster(pts, columns):
+    """
+    the points as (rows, columns, 3) array for a known row length,
+    a view if pts is already a float array
+    """
+    return _as_points(pts).reshape(-1, int(columns), 3)
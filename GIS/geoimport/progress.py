@@ -0,0 +1,144 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Hakan Seven <hakanseven12@gmail.com>               *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Throttled progress reports and cancellation of imports
+"""
+
+"""
+The loops of the importers report every step to a Progress, the progress
+bar is set and the gui events are processed at most rate times per
+second, independent of the number of steps. A cancel button sets the
+CancelToken of the Progress, the next step raises Cancelled.
+
+from freecad.trails.geomatics.geoimport.progress import Progress, Cancelled
+reporter = Progress(len(items), progressbar, status, pump=FreeCADGui.updateGui)
+button.clicked.connect(reporter.token.cancel)
+try:
+    for item in items:
+        reporter.advance()
+        ...
+except Cancelled:
+    ...
+reporter.finish("import finished.")
+"""
+
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """raised by the step of an import which was cancelled"""
+
+
+class CancelToken:
+    """thread safe cancel request shared by the gui and an import"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """raise Cancelled if the import was cancelled"""
+        if self._event.is_set():
+            raise Cancelled()
+
+
+class Progress:
+    """
+    progress of total work units, shown on bar (setValue in percent)
+    and status (setText) at most rate times per second, pump is called
+    after each shown update to process the gui events
+    """
+
+    def __init__(self, total=100, bar=None, status=None, pump=None, token=None, rate=20,
+            clock=time.monotonic):
+        self.total = total
+        self.done = 0
+        self.bar = bar
+        self.status = status
+        self.pump = pump
+        self.token = token if token is not None else CancelToken()
+        self.interval = 1.0 / rate
+        self.clock = clock
+        self.shown = 0
+        self._last = None
+
+    def fraction(self):
+        if not self.total:
+            return 1.0
+        return min(1.0, self.done / self.total)
+
+    def start(self, total, text=None):
+        """begin a new stage of total work units"""
+        self.total = total
+        self.done = 0
+        if text is not None:
+            self.text(text)
+        else:
+            self._show()
+
+    def text(self, text):
+        """set the status text and show it at once"""
+        if self.status is not None:
+            self.status.setText(text)
+        self._show()
+
+    def advance(self, steps=1):
+        """count steps done, raises Cancelled if the import was cancelled"""
+        self.done += steps
+        self._tick()
+
+    def update(self, done):
+        """set the work units done, raises Cancelled if the import was cancelled"""
+        self.done = done
+        self._tick()
+
+    def finish(self, text=None):
+        self.done = self.total
+        if text is not None:
+            self.text(text)
+        else:
+            self._show()
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def _tick(self):
+        if self._last is None or self.clock() - self._last >= self.interval:
+            self._show()
+        self.token.check()
+
+    def _show(self):
+        if self.bar is not None:
+            self.bar.setValue(int(100 * self.fraction()))
+        if self.pump is not None:
+            self.pump()
+        self.shown += 1
+        self._last = self.clock()
@@ -5,6 +5,11 @@ import FreeCAD as App
 import FreeCADGui as Gui
 from .say import say
 
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 """
 
 from freecad.trails.geomatics.geoimport import run_tests
@@ -26,6 +31,66 @@ run_tests.test_import_srtm()
 from freecad.trails.geomatics.geoimport import run_tests
 run_tests.test_import_xyz()
 
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_openelevation_client()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_tile_fetcher()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_tile_cache()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_server_catalogue()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_gml_features()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_gml_buffers()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_layer_pipeline()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_bgt_download()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_download_cache()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_cityjson_triangles()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_crs_transform()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_osm_tile_cache()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_osm_columns()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_osm_pbf()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_osm_query()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_progress()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_srtm_service()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_point_grid()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_load_xyz()
+
+from freecad.trails.geomatics.geoimport import run_tests
+run_tests.test_interpolator_modes()
+
 from freecad.trails.geomatics.geoimport import run_tests
 run_tests.test_dummy()
 
@@ -127,6 +192,1153 @@ def test_import_xyz():
     """
 
 
+@contextmanager
+def local_server(handler):
+    """run a local stand-in http server, yields its base url"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:{}".format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_openelevation_client():
+
+    import os
+    import tempfile
+    import time
+    from . import get_elevation_openelevation
+    reload(get_elevation_openelevation)
+
+    class Handler(BaseHTTPRequestHandler):
+        posts = []
+        fail = [True]
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            # the first request fails to check the retry
+            if self.fail[0]:
+                self.fail[0] = False
+                self.send_response(502)
+                self.end_headers()
+                return
+            self.posts.append(body)
+            results = [dict(p, elevation=p["latitude"] + p["longitude"]) for p in body["locations"]]
+            data = json.dumps({"results": results}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    with local_server(Handler) as url:
+        client = get_elevation_openelevation.OpenElevationClient(
+            url=url + "/api/v1/lookup", batch_size=10, rate=100, cache_file=None)
+        points = [(46.0 + i / 1000, 8.0) for i in range(25)]
+        elevations = client.elevations(points)
+        assert elevations == [lat + lon for lat, lon in points]
+        assert len(Handler.posts) == 3
+
+        # the second lookup is answered from the cache
+        client.elevations(points[:5])
+        assert len(Handler.posts) == 3
+
+        # the cache file is written for new results only, at most every save_interval
+        cache_file = os.path.join(tempfile.mkdtemp(), "OpenElevation.json")
+        client = get_elevation_openelevation.OpenElevationClient(
+            url=url + "/api/v1/lookup", rate=100, cache_file=cache_file, save_interval=3600)
+        client.elevations(points[:2])
+        assert not os.path.isfile(cache_file) and client.dirty
+        client.flush()
+        stamp = os.path.getmtime(cache_file)
+        os.utime(cache_file, (0, 0))
+        client.elevations(points[:2])
+        client.flush()
+        assert os.path.getmtime(cache_file) == 0
+        client = get_elevation_openelevation.OpenElevationClient(
+            url=url + "/api/v1/lookup", cache_file=cache_file)
+        assert len(client.cache) == 2 and stamp > 0
+
+    # no sleep after the last failed attempt
+    client = get_elevation_openelevation.OpenElevationClient(
+        url="http://127.0.0.1:9/api/v1/lookup", retries=1, timeout=1, cache_file=None)
+    start = time.monotonic()
+    assert client.request([(46.0, 8.0)]) is None
+    assert time.monotonic() - start < 1.0
+
+
+def test_tile_fetcher():
+
+    import io
+    import re
+    from PIL import Image
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+        fail = [True]
+
+        def do_GET(self):
+            # the first tile request fails to check the retry
+            if self.fail[0]:
+                self.fail[0] = False
+                self.send_response(503)
+                self.end_headers()
+                return
+            self.requests.append(self.path)
+            z, x, y = map(int, re.findall(r"\d+", self.path))
+            out = io.BytesIO()
+            Image.new("RGB", (256, 256), (x % 256, y % 256, z)).save(out, "PNG")
+            data = out.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    with local_server(Handler) as url:
+        fetcher = GIS2BIM.TileFetcher(workers=4)
+        tiles = [(url + "/17/{}/{}.png".format(x, y), ((x - 10) * 256, (y - 20) * 256))
+            for x in range(10, 13) for y in range(20, 22)]
+        img = Image.new("RGB", (3 * 256, 2 * 256))
+        fetcher.mosaic(tiles, img)
+        assert len(Handler.requests) == 6
+        assert img.getpixel((2 * 256 + 5, 256 + 5)) == (12, 21, 17)
+
+        image, width, height = GIS2BIM.TMS_WMTSCombinedMapFromLatLonBbox(
+            52.0, 5.0, 300, 300, 17, 256, 0, url + "/{z}/{x}/{y}.png", fetcher)
+        assert width % 256 == 0 and height % 256 == 0
+        assert image.size[0] > 0 and image.size[1] > 0
+
+    # GIS2BIM is kept in sync with upstream, it imports without this package
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("GIS2BIM_alone", GIS2BIM.__file__)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+    assert 0 <= GIS2BIM.BackoffDelay(3) <= 4 and GIS2BIM.BackoffDelay(20) <= 10
+
+
+def test_tile_cache():
+
+    import os
+    import tempfile
+    import requests
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_GET(self):
+            self.requests.append((self.path, self.headers.get("If-None-Match")))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("Cache-Control", "max-age=3600")
+                self.end_headers()
+                return
+            data = self.path.encode() * 100
+            self.send_response(200)
+            # tiles below /old/ have to be revalidated on every use
+            self.send_header("Cache-Control", "no-cache" if self.path.startswith("/old/") else "max-age=3600")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    folder = tempfile.mkdtemp()
+    cache = GIS2BIM.TileCache(os.path.join(folder, "tiles.mbtiles"), maxBytes=5000)
+    with local_server(Handler) as url:
+        key = (url + "/{z}/{x}/{y}", 1, 1, 1)
+        data = cache.request(requests, url + "/1/1/1", key)
+        assert cache.request(requests, url + "/1/1/1", key) == data
+        assert len(Handler.requests) == 1
+
+        # an expired tile is revalidated with its etag
+        key = (url + "/old/{z}/{x}/{y}", 1, 1, 1)
+        data = cache.request(requests, url + "/old/1/1/1", key)
+        assert cache.request(requests, url + "/old/1/1/1", key) == data
+        assert Handler.requests[-1] == ("/old/1/1/1", '"v1"')
+
+        # the least recently used tiles are removed
+        for x in range(10):
+            cache.request(requests, url + "/2/{}/0".format(x), (url + "/{z}/{x}/{y}", 2, x, 0))
+        assert cache.size <= 5000
+        assert cache.get(url + "/{z}/{x}/{y}", 1, 1, 1) is None
+        assert cache.get(url + "/{z}/{x}/{y}", 2, 9, 0) is not None
+
+        # a tile larger than the cache is kept until the next one arrives
+        big = "/big/" + "x" * 60
+        data = cache.request(requests, url + big, (url + big, 0, 0, 0))
+        assert len(data) > 5000 and cache.get(url + big, 0, 0, 0) is not None
+
+        # a wms image from the cache comes with a response like urlopen
+        location = os.path.join(folder, "wms.png")
+        fileLocation, resource, requestURL = GIS2BIM.WMSRequest(url + "/wms?", "bbox=0,0,1,1", location, 10, 10, cache)
+        assert requestURL == url + "/wms?bbox=0,0,1,1" and resource.geturl() == requestURL
+        assert resource.getcode() == 200 and resource.read() == open(location, "rb").read()
+
+    cache.offline = True
+    count = len(Handler.requests)
+    assert cache.request(requests, url + "/wms?bbox=0,0,1,1", (url + "/wms?bbox=0,0,1,1", 0, 0, 0))
+    assert len(Handler.requests) == count
+    try:
+        cache.request(requests, url + "/3/0/0", (url + "/{z}/{x}/{y}", 3, 0, 0))
+        assert False
+    except LookupError:
+        pass
+
+
+def test_server_catalogue():
+
+    import os
+    import tempfile
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    catalogue = {"GIS2BIMserversRequests": {
+        "webserverRequests": [
+            {"title": "A", "service": "WMS", "serverrequestprefix": "http://a/"},
+            {"title": "B", "service": "WMTS_TMS", "serverrequestprefix": "http://b/"}],
+        "Querystrings": [{"title": "Q", "querystring": ".//q"}]}}
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_GET(self):
+            self.requests.append(self.path)
+            data = json.dumps(catalogue).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    cache_file = os.path.join(tempfile.mkdtemp(), "GIS2BIM_Data.json")
+    with local_server(Handler) as url:
+        servers = GIS2BIM.ServerCatalogue(cache_file, url=url + "/GIS2BIM_Data.json", snapshot=None)
+        assert servers.get("B", "webserverRequests", "serverrequestprefix") == "http://b/"
+        assert servers.get("Q", "Querystrings", "querystring") == ".//q"
+        assert [i["title"] for i in servers.service("webserverRequests", "WMS")] == ["A"]
+        assert len(Handler.requests) == 1
+
+        # the next session reads the local copy
+        servers = GIS2BIM.ServerCatalogue(cache_file, url=url + "/GIS2BIM_Data.json", snapshot=None)
+        assert servers.get("A", "webserverRequests", "serverrequestprefix") == "http://a/"
+        assert len(Handler.requests) == 1
+
+        # an old copy is used at once and refreshed in the background
+        servers = GIS2BIM.ServerCatalogue(cache_file, ttl=0, url=url + "/GIS2BIM_Data.json", snapshot=None)
+        assert servers.get("A", "webserverRequests", "serverrequestprefix") == "http://a/"
+        servers.refreshing.join()
+        assert len(Handler.requests) == 2
+
+    # offline without a local copy the bundled snapshot is used, it has every
+    # entry of GIS2BIM_NL
+    offline = "http://127.0.0.1:9/GIS2BIM_Data.json"
+    cache_file = os.path.join(tempfile.mkdtemp(), "GIS2BIM_Data.json")
+    servers = GIS2BIM.ServerCatalogue(cache_file, url=offline)
+    for title in ["NLPDOKServerURL_28992", "NLPDOKCadastreCadastralParcels_28992", "NL_PDOK_Luchtfoto_2020_28992"]:
+        assert servers.get(title, "webserverRequests", "serverrequestprefix").startswith("http")
+    assert servers.get("NLPDOKxPathOpenGISposList", "Querystrings", "querystring")
+    assert servers.service("webserverRequests", "WMS")
+    assert not os.path.exists(cache_file)
+
+    # a broken local copy is replaced, without network and snapshot there is no catalogue
+    with open(cache_file, "w") as f:
+        f.write("{")
+    servers = GIS2BIM.ServerCatalogue(cache_file, url=offline)
+    assert servers.get("HTMLwfs", "Other", "URL")
+    try:
+        GIS2BIM.ServerCatalogue(cache_file, url=offline, snapshot=None)
+        assert False
+    except OSError:
+        pass
+
+
+def test_gml_features():
+
+    import io
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    gml = b"""<?xml version="1.0"?>
+<FeatureCollection xmlns:gml="http://www.opengis.net/gml">
+  <featureMember>
+    <Wegdeel gml:id="w1">
+      <functie>rijbaan</functie>
+      <geometrie><gml:Polygon><gml:exterior><gml:LinearRing>
+        <gml:posList>0 0 10 0 10 10 0 0</gml:posList>
+      </gml:LinearRing></gml:exterior></gml:Polygon></geometrie>
+    </Wegdeel>
+  </featureMember>
+  <featureMember>
+    <Wegdeel gml:id="w2">
+      <functie>fietspad</functie>
+      <geometrie><gml:Polygon><gml:exterior><gml:LinearRing>
+        <gml:posList>100 100 110 100 110 110 100 100</gml:posList>
+      </gml:LinearRing></gml:exterior></gml:Polygon></geometrie>
+    </Wegdeel>
+  </featureMember>
+</FeatureCollection>"""
+
+    features = list(GIS2BIM.iterGMLFeatures(io.BytesIO(gml)))
+    assert [f.id for f in features] == ["w1", "w2"]
+    assert features[0].tag == "Wegdeel"
+    assert features[1].attributes == {"functie": "fietspad"}
+    assert features[0].coords.tolist() == [[0, 0], [10, 0], [10, 10], [0, 0]]
+    assert features[0].offsets.tolist() == [0, 4]
+
+    # only features with a point inside the bounding box
+    features = list(GIS2BIM.iterGMLFeatures(io.BytesIO(gml), bbox=(90, 90, 105, 105)))
+    assert [f.id for f in features] == ["w2"]
+
+
+def test_gml_buffers():
+
+    import io
+    import numpy as np
+    import xml.etree.ElementTree as ET
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    # 3D with a zero height, 2D, empty and unreadable posLists
+    posLists = ["10 20 0 11 21 0 12 22 0", "1 2 3 4", "", "5 6 x 8", "7 8 9 10"]
+    coords, offsets = GIS2BIM.GML_poslistBuffers(posLists, -10, -20, 2, 1)
+    assert offsets.tolist() == [0, 3, 5, 5, 5, 7]
+    assert coords.tolist() == [[0, 0], [2, 2], [4, 4], [-18, -36], [-14, -32], [-6, -24], [-2, -20]]
+    assert GIS2BIM.BuffersToPolygons(coords, offsets)[2:4] == [[], []]
+
+    gml = b"""<FeatureCollection xmlns:gml="http://www.opengis.net/gml">
+      <gml:posList>100 100 101 101</gml:posList>
+      <gml:posList>500 500 501 501</gml:posList>
+      <gml:posList>90 90 100.5 100.5 200 200</gml:posList>
+      <gml:posList>100 100 bad 101</gml:posList>
+      <gml:posList></gml:posList>
+    </FeatureCollection>"""
+    tree = ET.parse(io.BytesIO(gml))
+    coords, offsets = GIS2BIM.filterGMLbboxBuffers(tree, ".//{http://www.opengis.net/gml}posList", 100, 100, 10, 10, 2)
+    assert offsets.tolist() == [0, 2, 5]
+    assert coords.tolist() == [[0, 0], [2, 2], [-20, -20], [1, 1], [200, 200]]
+    assert GIS2BIM.filterGMLbbox(tree, ".//{http://www.opengis.net/gml}posList", 100, 100, 10, 10, 2)[1][1] == [1, 1]
+
+
+def test_layer_pipeline():
+
+    import time
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    built = []
+    threads = set()
+
+    def fetch(name, delay):
+        def run():
+            time.sleep(delay)
+            if name == "broken":
+                raise IOError("server down")
+            return name
+        return run
+
+    def build(data):
+        threads.add(threading.get_ident())
+        built.append(data)
+
+    pipeline = GIS2BIM.LayerPipeline()
+    pipeline.add("slow", fetch("slow", 0.6), build)
+    pipeline.add("broken", fetch("broken", 0.1), build)
+    pipeline.add("fast", fetch("fast", 0.1), build)
+
+    start = time.time()
+    errors = pipeline.run()
+    elapsed = time.time() - start
+
+    # the fetches overlap, the builds run in layer order in this thread
+    assert elapsed < 1.0, elapsed
+    assert built == ["slow", "fast"], built
+    assert threads == {threading.get_ident()}
+    assert list(errors) == ["broken"]
+    assert isinstance(errors["broken"], IOError)
+
+    # a cancelled import builds nothing
+    built.clear()
+    pipeline = GIS2BIM.LayerPipeline()
+    pipeline.add("slow", fetch("slow", 0.5), build)
+    start = time.time()
+    pipeline.run(lambda done, total, name: False, poll=0.05)
+    assert time.time() - start < 0.4
+    assert built == []
+
+    # fetches which did not start are dropped at once
+    started = []
+    pipeline = GIS2BIM.LayerPipeline(workers=1)
+    pipeline.add("slow", fetch("slow", 0.3), build)
+    pipeline.add("later", lambda: started.append("later"), build)
+    threading.Timer(0.1, pipeline.cancel).start()
+    pipeline.run(poll=0.05)
+    time.sleep(0.4)
+    assert started == [] and built == []
+
+    # a failed build is reported, the other layers are built
+    def broken_build(data):
+        raise ValueError("bad layer")
+
+    pipeline = GIS2BIM.LayerPipeline()
+    pipeline.add("first", fetch("first", 0), broken_build)
+    pipeline.add("fast", fetch("fast", 0), build)
+    errors = pipeline.run()
+    assert built == ["fast"], built
+    assert list(errors) == ["first"] and isinstance(errors["first"], ValueError)
+
+
+def test_bgt_download():
+
+    import io
+    import os
+    import tempfile
+    import zipfile
+    from .PyPackages import GIS2BIM
+    from .PyPackages import GIS2BIM_NL
+    reload(GIS2BIM)
+    reload(GIS2BIM_NL)
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        for name in ["bgt_wegdeel.gml", "bgt_pand.gml", "bgt_waterdeel.gml"]:
+            zf.writestr(name, os.urandom(1024 * 1024))
+    archive = out.getvalue()
+
+    class Handler(BaseHTTPRequestHandler):
+        jobs = []
+        polls = []
+        ranges = []
+
+        def send_json(self, data):
+            data = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.jobs.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_json({"downloadRequestId": "job1"})
+
+        def do_GET(self):
+            if self.path.endswith("/status"):
+                self.polls.append(self.path)
+                if len(self.polls) < 3:
+                    self.send_json({"status": "RUNNING", "progress": 40 * len(self.polls)})
+                else:
+                    self.send_json({"status": "COMPLETED", "progress": 100,
+                        "_links": {"download": {"href": "/download/job1.zip"}}})
+                return
+
+            # the first download breaks off halfway to check the resume
+            self.ranges.append(self.headers.get("Range"))
+            if len(self.ranges) == 1:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(archive)))
+                self.end_headers()
+                self.wfile.write(archive[:len(archive) // 2])
+                self.close_connection = True
+                return
+            start = int(self.headers["Range"][6:-1])
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(archive) - 1, len(archive)))
+            self.send_header("Content-Length", str(len(archive) - start))
+            self.end_headers()
+            self.wfile.write(archive[start:])
+
+        def log_message(self, *args):
+            pass
+
+    folder = tempfile.mkdtemp()
+    with local_server(Handler) as url:
+        job = GIS2BIM_NL.BGTDownload(url + "/custom", url, pollMin=0.01, pollMax=0.05)
+        job.download(100000, 400000, 100, 100, os.path.join(folder, "bgt.zip"), folder, 5,
+            ["wegdeel", "pand"], ["bgt_wegdeel.gml", "bgt_pand.gml"])
+
+    assert Handler.jobs[0]["featuretypes"] == ["wegdeel", "pand"]
+    assert len(Handler.polls) == 3
+    # the second request continues after the written part
+    assert Handler.ranges[0] is None and Handler.ranges[1] != "bytes=0-"
+    assert len(Handler.ranges) == 2
+    assert sorted(os.listdir(folder)) == ["bgt.zip", "bgt_pand.gml", "bgt_wegdeel.gml"]
+
+    # bgtDownloadURL returns the link, or a message as before
+    class Jobs(Handler):
+        answer = {}
+
+        def do_GET(self):
+            self.send_json(self.answer)
+
+    with local_server(Jobs) as url:
+        job = GIS2BIM_NL.BGTDownload(url + "/custom", url, pollMin=0.01, pollMax=0.05)
+        Jobs.answer = {"status": "COMPLETED", "_links": {"download": {"href": "/download/job2.zip"}}}
+        assert GIS2BIM_NL.bgtDownloadURL(100000, 400000, 100, 100, 1, job) == url + "/download/job2.zip"
+        Jobs.answer = {"status": "COMPLETED"}
+        assert GIS2BIM_NL.bgtDownloadURL(100000, 400000, 100, 100, 1, job) == "unable to get downloadlink"
+        Jobs.answer = {"status": "FAILED"}
+        assert GIS2BIM_NL.bgtDownloadURL(100000, 400000, 100, 100, 1, job) == "unable to get downloadlink"
+        Jobs.answer = {"status": "RUNNING", "progress": 10}
+        assert GIS2BIM_NL.bgtDownloadURL(100000, 400000, 100, 100, 0.1, job) == "empty"
+
+
+def test_download_cache():
+
+    import os
+    import tempfile
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    files = {"/tile{}.json".format(i): os.urandom(100000 + i) for i in range(6)}
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_GET(self):
+            self.requests.append((self.path, self.headers.get("Range"), self.headers.get("If-Range")))
+            data = files[self.path]
+            start = 0
+            # ranges are only served for the current version of the file
+            if self.headers.get("Range") and self.headers.get("If-Range") == '"v1"':
+                start = int(self.headers["Range"][6:-1])
+                self.send_response(206)
+                self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(data) - 1, len(data)))
+            else:
+                self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            self.wfile.write(data[start:])
+
+        def log_message(self, *args):
+            pass
+
+    folder = tempfile.mkdtemp()
+    with local_server(Handler) as url:
+        cache = GIS2BIM.DownloadCache(folder, workers=3)
+        urls = [url + path for path in sorted(files)]
+        paths = cache.fetchAll(urls)
+        assert [open(p, "rb").read() for p in paths] == [files[p] for p in sorted(files)]
+        assert len(Handler.requests) == 6
+
+        # valid files are not downloaded again
+        cache.fetchAll(urls)
+        assert len(Handler.requests) == 6
+
+        # a damaged file is downloaded again
+        with open(paths[0], "r+b") as f:
+            f.write(b"x")
+        cache.fetch(urls[0])
+        assert open(paths[0], "rb").read() == files["/tile0.json"]
+        assert len(Handler.requests) == 7
+
+        # an interrupted download continues where it stopped
+        os.remove(paths[1] + ".json")
+        with open(paths[1] + ".part", "wb") as f:
+            f.write(files["/tile1.json"][:40000])
+        with open(paths[1] + ".part.json", "w") as f:
+            json.dump({"url": urls[1], "validator": '"v1"'}, f)
+        cache.fetch(urls[1])
+        assert Handler.requests[-1] == ("/tile1.json", "bytes=40000-", '"v1"')
+        assert open(paths[1], "rb").read() == files["/tile1.json"]
+
+        # least recently used files are removed over the size limit, files
+        # which the cache did not write and unfinished downloads are kept
+        others = [os.path.join(folder, name) for name in ["notes", "notes.json", "tile9.json.part", "tile9.json.part.json"]]
+        for path in others:
+            with open(path, "w") as f:
+                json.dump({"url": "x"}, f)
+        with open(others[0], "wb") as f:
+            f.write(os.urandom(500000))
+        cache.maxBytes = 350000
+        cache.evict(keep=paths[:2])
+        assert os.path.exists(paths[0]) and os.path.exists(paths[1])
+        assert sum(os.path.exists(p) for p in paths) == 3
+        assert all(os.path.exists(path) for path in others)
+        assert "etag" not in json.load(open(paths[0] + ".json"))
+
+
+def test_cityjson_triangles():
+
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    # two buildings, a quad roof at LOD 1.2 and a triangle at LOD 2.2 each
+    data = {
+        "transform": {"scale": [0.001, 0.001, 0.001], "translate": [1000.0, 2000.0, 0.0]},
+        "vertices": [[0, 0, 0], [4000, 0, 0], [4000, 3000, 0], [0, 3000, 5000],
+                     [90000, 0, 0], [94000, 0, 0], [94000, 3000, 0], [90000, 3000, 0]],
+        "CityObjects": {
+            "a": {"type": "Building", "geometry": [
+                {"type": "MultiSurface", "lod": "1.2", "boundaries": [[[0, 1, 2, 3]]]},
+                {"type": "Solid", "lod": "2.2", "boundaries": [[[[0, 1, 2]]]]}]},
+            "b": {"type": "Building", "geometry": [
+                {"type": "MultiSurface", "lod": "1.2", "boundaries": [[[4, 5, 6, 7]]]},
+                {"type": "Solid", "lod": "2.2", "boundaries": [[[[4, 5, 6]]]]}]},
+        }
+    }
+
+    meshes = GIS2BIM.CityJSONTriangles(data, 1000.0, 2000.0)
+    assert sorted(meshes) == ["1.2", "2.2"]
+    triangles, ids, starts = meshes["1.2"]
+    assert triangles.shape == (4, 3, 3)
+    assert ids == ["a", "b"] and starts.tolist() == [0, 2]
+    # meters relative to dx,dy times 1000
+    assert triangles[1].tolist() == [[0, 0, 0], [4000, 3000, 0], [0, 3000, 5000]]
+
+    meshes = GIS2BIM.CityJSONTriangles(data, 1000.0, 2000.0, lods=[2], bbox=(-1000, -1000, 10000, 10000))
+    triangles, ids, starts = meshes["2.2"]
+    assert list(meshes) == ["2.2"] and ids == ["a"] and len(triangles) == 1
+
+
+def test_crs_transform():
+
+    import io
+    import numpy as np
+    import xml.etree.ElementTree as ET
+    from .PyPackages import GIS2BIM
+    reload(GIS2BIM)
+
+    # Amersfoort, origin of the Dutch RD grid
+    x, y = GIS2BIM.TransformCRS_epsg("4326", "28992", 5.387203658, 52.155172894)
+    assert abs(x - 155000) < 1 and abs(y - 463000) < 1
+
+    # arrays in one call, the transformer is reused
+    lon = np.linspace(5.0, 6.0, 1000)
+    lat = np.linspace(52.0, 53.0, 1000)
+    xs, ys = GIS2BIM.TransformCRS("EPSG:4326", 28992, lon, lat)
+    assert xs.shape == (1000,) and abs(xs[0] - x) > 1000
+    assert GIS2BIM.GetTransformer("4326", "28992") is GIS2BIM.GetTransformer("EPSG:4326", "EPSG:28992")
+
+    # gml in lat/lon axis order is read in the target CRS
+    gml = b"""<FeatureCollection xmlns:gml="http://www.opengis.net/gml">
+      <gml:LineString srsName="urn:ogc:def:crs:EPSG::4326">
+        <gml:posList>52.155172894 5.387203658 52.155172894 5.387203658</gml:posList>
+      </gml:LineString></FeatureCollection>"""
+    tree = ET.parse(io.BytesIO(gml))
+    curves = GIS2BIM.GML_poslistData(tree, ".//{http://www.opengis.net/gml}posList", -155000, -463000, 1000, 0, "28992")
+    assert all(abs(c) < 1000 for point in curves[0] for c in point), curves
+
+    # same CRS, nothing to transform
+    assert GIS2BIM.GMLTransform(tree, "4326") is None
+
+    # without pyproj the points are sent to the epsg.io server
+    calls = []
+
+    def remote(source, target, x, y, remote=False):
+        calls.append((source, target, remote))
+        return x + 1, y + 1
+
+    GIS2BIM.pyproj = None
+    GIS2BIM.TransformCRS_epsg = remote
+    try:
+        assert GIS2BIM.TransformCRS("EPSG:4326", 28992, 5.0, 52.0) == (6.0, 53.0)
+        xs, ys = GIS2BIM.TransformCRS("4326", "28992", np.array([5.0, 6.0]), np.array([52.0, 53.0]))
+        assert xs.tolist() == [6.0, 7.0] and ys.tolist() == [53.0, 54.0]
+        assert calls == [("4326", "28992", True)] * 3
+        # the lat/lon order of the gml is turned to lon/lat
+        xs, ys = GIS2BIM.GMLTransform(tree, "28992")(np.array([52.0]), np.array([5.0]))
+        assert xs.tolist() == [6.0] and ys.tolist() == [53.0]
+    finally:
+        reload(GIS2BIM)
+
+
+def test_osm_tile_cache():
+
+    import tempfile
+    from urllib.parse import urlparse, parse_qs
+    from . import osm_cache
+    reload(osm_cache)
+
+    # nodes on a 0.0025 degree grid, ways connect neighbours in a row
+    nodes = {1000 + k * 100 + m: (46.8 + k * 0.0025 + 0.001, 8.0 + m * 0.0025 + 0.001)
+        for k in range(16) for m in range(16)}
+    ways = {5000 + n - 1000: (n, n + 1) for n in nodes if n + 1 in nodes}
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_GET(self):
+            minlon, minlat, maxlon, maxlat = map(float, parse_qs(urlparse(self.path).query)["bbox"][0].split(","))
+            self.requests.append((minlat, minlon))
+            inside = {n for n, (lat, lon) in nodes.items() if minlat <= lat <= maxlat and minlon <= lon <= maxlon}
+            selected = {w: refs for w, refs in ways.items() if inside.intersection(refs)}
+            used = sorted(inside.union(*selected.values()))
+            lines = ['<osm version="0.6">',
+                '<bounds minlat="{}" minlon="{}" maxlat="{}" maxlon="{}"/>'.format(minlat, minlon, maxlat, maxlon)]
+            lines += ['<node id="{}" lat="{}" lon="{}"/>'.format(n, *nodes[n]) for n in used]
+            lines += ['<way id="{}"><nd ref="{}"/><nd ref="{}"/><tag k="highway" v="path"/></way>'.format(w, *refs)
+                for w, refs in sorted(selected.items())]
+            data = "\n".join(lines + ["</osm>"]).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    with local_server(Handler) as url:
+        cache = osm_cache.OsmTileCache(tempfile.mkdtemp(), size=0.01, url=url + "/api/0.6/map")
+        reader = cache.reader(46.805, 8.005, 46.825, 8.025)
+        assert len(Handler.requests) == 9
+        node_ids = [n.id for n in reader.nodes()]
+        way_ids = [w.id for w in reader.ways()]
+        assert node_ids == sorted(set(node_ids))
+        assert way_ids == sorted(set(way_ids))
+        assert reader.bounds.minlat == 46.805
+        assert reader.progress() == 1.0
+
+        # the same ways as one request of the area, nodes outside are kept for the ways
+        inside = {n for n, (lat, lon) in nodes.items() if 46.805 <= lat <= 46.825 and 8.005 <= lon <= 8.025}
+        assert way_ids == sorted(w for w, refs in ways.items() if inside.intersection(refs))
+        assert inside.issubset(node_ids)
+
+        # a moved area only downloads the new tiles
+        reader = cache.reader(46.806, 8.016, 46.826, 8.036)
+        assert len(Handler.requests) == 12
+        assert len(list(reader.ways())) > 0
+
+
+def test_osm_columns():
+
+    import os
+    import tempfile
+    from . import osm_columns
+    from . import osm_reader
+    reload(osm_columns)
+
+    xml = """<osm version="0.6">
+<bounds minlat="46.8" minlon="8.0" maxlat="46.81" maxlon="8.01"/>
+<node id="3" lat="46.8012345" lon="8.0054321"><tag k="name" v="Brünig"/></node>
+<node id="1" lat="46.8" lon="8.0"/>
+<node id="2" lat="46.9" lon="8.1"/>
+<way id="10"><nd ref="1"/><nd ref="3"/><tag k="highway" v="path"/><tag k="name" v="Weg"/></way>
+<way id="11"><nd ref="2"/><nd ref="2"/></way>
+</osm>"""
+    path = os.path.join(tempfile.mkdtemp(), "tile.osm")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(xml)
+
+    expected_nodes = sorted(osm_reader.OsmReader(path).nodes())
+    data = osm_columns.load(path)
+    assert os.path.isfile(path[:-4] + ".npz")
+    assert list(data.nodes()) == expected_nodes
+    assert data.bounds == osm_reader.Bounds(46.8, 8.0, 46.81, 8.01)
+
+    # the second load reads the binary file only
+    os.utime(path, (0, 0))
+    data = osm_columns.load(path)
+    assert list(data.nodes()) == expected_nodes
+    assert [(w.id, w.refs, w.tags) for w in data.ways()] == [
+        (10, [1, 3], {"highway": "path", "name": "Weg"}), (11, [2, 2], {})]
+    store = data.node_store()
+    assert store.ids.tolist() == [1, 2, 3] and store.lat[2] == 46.8012345
+
+    # merged twice the same data, way 11 has no node inside the bounds
+    merged = osm_columns.merge([data, data], data.bounds)
+    assert merged.node_ids.tolist() == [1, 2, 3]
+    assert [w.id for w in merged.ways()] == [10]
+    assert list(merged.nodes()) == expected_nodes
+
+
+def test_osm_pbf():
+
+    import os
+    import struct
+    import sys
+    import tempfile
+    import zlib
+    from . import osm_pbf
+    from . import osm_reader
+    reload(osm_pbf)
+
+    # minimal protobuf encoder for the test file
+    def varint(v):
+        out = bytearray()
+        while v > 0x7f:
+            out.append(v & 0x7f | 0x80)
+            v >>= 7
+        out.append(v)
+        return bytes(out)
+
+    def zigzag(v):
+        return v * 2 if v >= 0 else -v * 2 - 1
+
+    def field(number, value):
+        if isinstance(value, int):
+            return varint(number << 3) + varint(value)
+        return varint(number << 3 | 2) + varint(len(value)) + value
+
+    def packed(values, signed=False):
+        return b"".join(varint(zigzag(v) if signed else v) for v in values)
+
+    def delta(values):
+        return [b - a for a, b in zip([0] + values[:-1], values)]
+
+    def blob(kind, data, compress=True):
+        body = field(2, len(data)) + field(3, zlib.compress(data)) if compress else field(1, data)
+        header = field(1, kind.encode("ascii")) + field(3, len(body))
+        return struct.pack(">I", len(header)) + header + body
+
+    strings = [b"", b"name", "Brünig".encode("utf-8"), b"highway", b"path"]
+    table = field(1, b"".join(field(1, s) for s in strings))
+
+    def dense(ids, lat, lon, tags):
+        return field(2, field(1, packed(delta(ids), True)) + field(8, packed(delta(lat), True))
+            + field(9, packed(delta(lon), True)) + field(10, packed(tags)))
+
+    def way(way_id, refs, keys, vals):
+        return field(3, field(1, way_id) + field(2, packed(keys)) + field(3, packed(vals))
+            + field(8, packed(delta(refs), True)))
+
+    # lat/lon in units of the default granularity of 100 nanodegrees
+    box = field(1, zigzag(8000000000)) + field(2, zigzag(8100000000)) \
+        + field(3, zigzag(46900000000)) + field(4, zigzag(46800000000))
+    single = field(1, field(1, zigzag(5)) + field(8, zigzag(470000000)) + field(9, zigzag(90000000)))
+    data = blob("OSMHeader", field(1, box)) \
+        + blob("OSMData", table + field(2, dense([1, 2], [468000000, 468050000], [80000000, 80050000],
+            [0, 1, 2, 0]))) \
+        + blob("OSMData", table + field(2, dense([3, 4], [468012345, 469000000], [80154321, 81000000],
+            [0, 0]) + single), compress=False) \
+        + blob("OSMData", table + field(2, way(10, [1, 3], [3], [4]) + way(11, [4, 4], [], [])))
+    path = os.path.join(tempfile.mkdtemp(), "extract.osm.pbf")
+    with open(path, "wb") as f:
+        f.write(data)
+
+    bounds, blocks = osm_pbf.scan(path)
+    assert bounds == osm_reader.Bounds(46.8, 8.0, 46.9, 8.1) and len(blocks) == 3
+
+    whole = osm_pbf.read(path, workers=1)
+    assert whole.node_ids.tolist() == [1, 2, 3, 4, 5]
+    assert [(w.id, w.refs, w.tags) for w in whole.ways()] == [
+        (10, [1, 3], {"highway": "path"}), (11, [4, 4], {})]
+
+    # way 11 has no node inside the area, node 3 is outside but used by way 10
+    for workers in (1, 2):
+        area = osm_pbf.read(path, (46.8, 8.0, 46.81, 8.01), workers)
+        assert area.bounds == osm_reader.Bounds(46.8, 8.0, 46.81, 8.01)
+        assert list(area.nodes()) == [
+            osm_reader.Node(1, 46.8, 8.0, {}),
+            osm_reader.Node(2, 46.805, 8.005, {"name": "Brünig"}),
+            osm_reader.Node(3, 46.8012345, 8.0154321, {})]
+        assert [w.id for w in area.ways()] == [10]
+
+    # without a python next to the binary the blocks are read in this process
+    executable = sys.executable
+    sys.executable = os.path.join(tempfile.mkdtemp(), "FreeCAD")
+    try:
+        assert osm_pbf._context() is None
+        assert osm_pbf.read(path, workers=2).node_ids.tolist() == [1, 2, 3, 4, 5]
+    finally:
+        sys.executable = executable
+
+
+def test_osm_query():
+
+    import re
+    import tempfile
+    from urllib.parse import parse_qs
+    from . import osm_columns
+    from . import osm_query
+    reload(osm_query)
+
+    nodes = {1: (46.801, 8.001), 2: (46.802, 8.002), 3: (46.803, 8.003), 4: (46.9, 8.1)}
+    ways = {10: ((1, 2), {"building": "yes"}), 11: ((2, 3), {"highway": "path"}),
+        12: ((1, 3), {"waterway": "stream"}), 13: ((4, 4), {"building": "yes"})}
+
+    # stand-in for an Overpass server, the first request is answered as busy
+    class Handler(BaseHTTPRequestHandler):
+        queries = []
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+            query = parse_qs(body)["data"][0]
+            self.queries.append(query)
+            if len(self.queries) == 1:
+                self.send_response(429)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            minlat, minlon, maxlat, maxlon = map(float, re.search(r"\[bbox:([^\]]*)\]", query).group(1).split(","))
+            keys = re.findall(r'way\["([^"]*)"\]', query)
+            selected = {w: (refs, tags) for w, (refs, tags) in ways.items() if set(tags).intersection(keys)
+                and any(minlat <= nodes[n][0] <= maxlat and minlon <= nodes[n][1] <= maxlon for n in refs)}
+            lines = ['<osm version="0.6">']
+            for w, (refs, tags) in sorted(selected.items()):
+                lines.append('<way id="{}">'.format(w) + "".join('<nd ref="{}"/>'.format(n) for n in refs)
+                    + "".join('<tag k="{}" v="{}"/>'.format(k, v) for k, v in tags.items()) + "</way>")
+            used = sorted(set(n for refs, tags in selected.values() for n in refs))
+            lines += ['<node id="{}" lat="{}" lon="{}"/>'.format(n, *nodes[n]) for n in used]
+            data = "\n".join(lines + ["</osm>"]).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    query = osm_query.build_query(46.8, 8.0, 46.81, 8.01, ["building", "highway"])
+    assert '[bbox:46.8000000,8.0000000,46.8100000,8.0100000]' in query
+    assert 'way["building"];way["highway"];' in query and "out skel" in query
+
+    with local_server(Handler) as url:
+        backend = osm_query.OverpassQuery(tempfile.mkdtemp(), ["building", "highway"], url + "/api/interpreter")
+        reader = backend.reader(46.8, 8.0, 46.81, 8.01)
+        assert len(Handler.queries) == 2
+        assert [(w.id, w.refs) for w in reader.ways()] == [(10, [1, 2]), (11, [2, 3])]
+        assert reader.node_ids.tolist() == [1, 2, 3]
+        assert reader.bounds.maxlat == 46.81
+
+        # the same query is read from disk
+        reader = backend.reader(46.8, 8.0, 46.81, 8.01)
+        assert len(Handler.queries) == 2
+
+    # the same filter on local data
+    data = osm_columns.merge([backend.reader(46.8, 8.0, 46.81, 8.01)])
+    assert [w.id for w in osm_query.keep_keys(data, ["highway"]).ways()] == [11]
+    assert len(osm_query.keep_keys(data, []).way_ids) == 0
+
+
+def test_progress():
+
+    from . import progress
+    reload(progress)
+
+    class Bar:
+        def __init__(self):
+            self.values = []
+
+        def setValue(self, value):
+            self.values.append(value)
+
+    # 100000 steps in 1 s of a fake clock, shown at most 20 times per second
+    now = [0.0]
+    bar = Bar()
+    pumped = []
+    reporter = progress.Progress(100000, bar, pump=lambda: pumped.append(now[0]), clock=lambda: now[0])
+    for i in range(100000):
+        now[0] += 1e-5
+        reporter.advance()
+    reporter.finish()
+    assert 20 <= reporter.shown <= 22 and len(pumped) == reporter.shown
+    assert bar.values == sorted(bar.values) and bar.values[-1] == 100
+
+    # a cancelled token stops the loop at the next step
+    reporter = progress.Progress(10, bar, clock=lambda: now[0])
+    done = 0
+    try:
+        for i in range(10):
+            reporter.advance()
+            done += 1
+            if i == 3:
+                reporter.token.cancel()
+    except progress.Cancelled:
+        pass
+    assert done == 4 and reporter.cancelled
+
+    # empty work is finished at once
+    reporter = progress.Progress(0, bar)
+    reporter.start(0, "nothing to do")
+    assert reporter.fraction() == 1.0
+
+
+def test_srtm_service():
+
+    import tempfile
+    import numpy as np
+    from . import get_elevation_srtm4
+    reload(get_elevation_srtm4)
+
+    # stand-in for the srtm4 program, heights grow with the latitude
+    calls = []
+
+    def fake_srtm4(lon, lat):
+        if isinstance(lon, list):
+            calls.append(len(lon))
+            return [100.0 + 1000 * y for y in lat]
+        calls.append(1)
+        return 100.0 + 1000 * lat
+
+    def scalar_srtm4(lon, lat):
+        if isinstance(lon, list):
+            raise TypeError("single points only")
+        return fake_srtm4(lon, lat)
+
+    get_elevation_srtm4.srtm4 = fake_srtm4
+    get_elevation_srtm4.nosrtm4 = False
+    service = get_elevation_srtm4.ElevationService(tempfile.mkdtemp())
+
+    # a few points are asked directly, the tile is not sampled
+    assert get_elevation_srtm4.get_height_single(46.8, 8.0) == 46900000.0 and calls == [1]
+    service.heights([46.8, 46.81], [8.0, 8.01])
+    assert calls == [1, 2] and not service.has_tile(187, 32)
+
+    # a batch samples the tile once, later lookups in it interpolate
+    del calls[:]
+    lat = 46.8 + np.linspace(0, 0.1, 300)
+    lon = np.full(300, 8.05)
+    heights = service.heights(lat, lon)
+    assert calls == [301 * 301] and service.has_tile(187, 32)
+    assert np.allclose(heights, (100 + 1000 * lat) * 1000, atol=5)
+    service.heights([46.85], [8.05])
+    assert calls == [301 * 301]
+
+    # an srtm4 without list input is called per point, never for the whole grid
+    del calls[:]
+    get_elevation_srtm4.srtm4 = scalar_srtm4
+    service = get_elevation_srtm4.ElevationService(tempfile.mkdtemp())
+    service.heights(lat, lon)
+    assert len(calls) == 300 and not service.list_input
+
+    # an osm import looks up all nodes at once, the ways only read the memo
+    from . import import_osm
+    from . import osm_nodes
+    from . import osm_reader
+    del calls[:]
+    get_elevation_srtm4.srtm4 = fake_srtm4
+    get_elevation_srtm4._service = get_elevation_srtm4.ElevationService(tempfile.mkdtemp())
+    ids = np.arange(1, 201)
+    nodes = osm_nodes.NodeStore.from_arrays(ids, 46.8 + ids * 1e-5, 8.0 + ids * 1e-5)
+    import_osm.lookup_heights(nodes)
+    for k in range(50):
+        way = osm_reader.Way(k, ids[4 * k:4 * k + 4].tolist(), {})
+        points = import_osm.get_ppts_with_heights(way, "road", nodes, 0.0)
+        assert len(points) == 4 and abs(points[0].z - (100 + 1000 * nodes.lat[4 * k]) * 1000) < 1
+    assert calls == [200]
+    reload(get_elevation_srtm4)
+
+
+def test_point_grid():
+
+    import numpy as np
+    from . import pointgrid
+    reload(pointgrid)
+
+    # 17 columns x 13 rows, x changes inside a row
+    x, y = np.meshgrid(1000.0 + 2.0 * np.arange(17), 5000.0 - 2.0 * np.arange(13))
+    pts = np.stack([x, y, x * 0.01 + y * 0.02], axis=2).reshape(-1, 3)
+
+    grid = pointgrid.infer_grid(pts)
+    assert grid.shape == (13, 17) and grid.axis == "x" and grid.missing == 0 and grid.ordered
+    assert grid.spacing == (2.0, -2.0) and grid.origin == (1000.0, 5000.0)
+    assert np.shares_memory(grid.heights, pts) and np.array_equal(grid.points().reshape(-1, 3), pts)
+    assert pointgrid.row_length(pts) == 17
+
+    # y changes inside a row
+    grid = pointgrid.infer_grid(pts[:, [1, 0, 2]])
+    assert grid.shape == (13, 17) and grid.axis == "y"
+
+    # shuffled points give the same raster
+    order = np.random.default_rng(0).permutation(len(pts))
+    grid = pointgrid.infer_grid(pts[order])
+    assert sorted(grid.shape) == [13, 17] and grid.missing == 0 and not grid.ordered
+    assert sorted(map(tuple, grid.points().reshape(-1, 3).tolist())) == sorted(map(tuple, pts.tolist()))
+
+    # missing points are NaN heights, a missing first column moves nothing
+    holes = np.ones(len(pts), bool)
+    holes[[20, 21, 100]] = False
+    grid = pointgrid.infer_grid(pts[holes])
+    assert grid.shape == (13, 17) and grid.missing == 3
+    assert np.isnan(grid.heights).sum() == 3 and np.isnan(grid.heights[1, 3])
+    assert np.array_equal(grid.heights[~np.isnan(grid.heights)], pts[holes, 2])
+
+
+def test_load_xyz():
+
+    import os
+    import tempfile
+    import numpy as np
+    from . import import_xyz
+    from . import progress
+    reload(import_xyz)
+
+    x, y = np.meshgrid(1000.0 + np.arange(23), 5000.0 + np.arange(19))
+    pts = np.stack([x, y, np.round(x * 0.01 + y * 0.001, 3)], axis=2).reshape(-1, 3)
+    fn = os.path.join(tempfile.mkdtemp(), "grid.xyz")
+    with open(fn, "w") as f:
+        for i, p in enumerate(pts):
+            f.write("{:.2f} {:.2f} {:.3f}\n".format(*p))
+
+    full = import_xyz.load_xyz(fn, hfac=1, chunk=7, reporter=progress.Progress())
+    assert np.allclose(full, pts)
+
+    # reduced while reading equals reducing afterwards, for chunks shorter
+    # than a row, chunks ending inside a row and one chunk for all
+    expected = import_xyz.reduceGrid(pts, ku=4, kv=3)
+    for chunk in (5, 30, 10000):
+        reporter = progress.Progress()
+        reduced = import_xyz.load_xyz(fn, ku=4, kv=3, hfac=1, chunk=chunk, reporter=reporter)
+        assert np.allclose(reduced, expected), chunk
+        assert reporter.fraction() == 1.0
+
+    # lines which can not be read are skipped
+    with open(fn, "a") as f:
+        f.write("no data\n")
+    assert len(import_xyz.load_xyz(fn, hfac=1, chunk=100, reporter=progress.Progress())) == len(pts)
+
+
+def test_interpolator_modes():
+
+    import numpy as np
+    from . import elevationgrid
+    reload(elevationgrid)
+
+    def surface(x, y):
+        return 0.3 * x + 0.2 * y + 2 * np.sin(x / 30) * np.cos(y / 25)
+
+    rng = np.random.default_rng(1)
+    x, y = rng.uniform(0, 100, 300), rng.uniform(0, 80, 300)
+    z = surface(x, y)
+    xi, yi = np.meshgrid(np.linspace(20, 80, 7), np.linspace(20, 60, 5))
+
+    # largest error inside the points, the heights range over 0 .. 46
+    tolerance = {"linear": 0.1, "thin_plate": 0.01, "cubic": 0.01, "quintic": 0.01,
+        "multiquadric": 0.05, "inverse": 0.2, "gaussian": 1.0,
+        "delaunay_linear": 0.2, "delaunay_cubic": 0.02, "idw": 1.5}
+    assert sorted(tolerance) == sorted(elevationgrid.MODES)
+    for mode in elevationgrid.MODES:
+        f = elevationgrid.make_interpolator(x, y, z, mode)
+        zi = f(xi, yi)
+        assert zi.shape == xi.shape, mode
+        assert np.abs(zi - surface(xi, yi)).max() < tolerance[mode], mode
+        # the data points are kept
+        assert np.allclose(f(x[:20], y[:20]), z[:20], atol=0.05), mode
+
+    # the former interp2d modes are interpolated on the triangulation
+    rbf, gx, gy, gz = elevationgrid.interpolate(x, y, z, 10, "linear", rbfmode=False)
+    expected = elevationgrid.make_interpolator(x, y, z, "delaunay_linear")(gx, gy)
+    assert np.allclose(gz, expected)
+
+    # one, two or collinear points can not be solved by every mode
+    for n in (1, 2):
+        for mode in elevationgrid.MODES:
+            f = elevationgrid.make_interpolator(x[:n], y[:n], z[:n], mode)
+            assert np.allclose(f(x[:n], y[:n]), z[:n]), (n, mode)
+    line = np.arange(5.0)
+    for mode in elevationgrid.MODES:
+        f = elevationgrid.make_interpolator(line, 2 * line, line, mode)
+        assert np.isclose(f(np.array([2.0]), np.array([4.0]))[0], 2.0), mode
+
+
 def test_dummy():
     ''' dummy test'''
 
@@ -141,6 +1353,26 @@ def test_all():
     test_import_csv()
     test_import_srtm()
     test_import_xyz()
+    test_openelevation_client()
+    test_tile_fetcher()
+    test_tile_cache()
+    test_server_catalogue()
+    test_gml_features()
+    test_gml_buffers()
+    test_layer_pipeline()
+    test_bgt_download()
+    test_download_cache()
+    test_cityjson_triangles()
+    test_crs_transform()
+    test_osm_tile_cache()
+    test_osm_columns()
+    test_osm_pbf()
+    test_osm_query()
+    test_progress()
+    test_srtm_service()
+    test_point_grid()
+    test_load_xyz()
+    test_interpolator_modes()
     test_dummy()
 
 
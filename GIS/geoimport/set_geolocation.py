@@ -243,7 +243,9 @@ class GISLocation_Dialog(QtWidgets.QDialog):
 		SiteObject.WGS84_Latitude = self.lat
 		SiteObject.Longitude = float(self.lon)
 		SiteObject.Latitude = float(self.lat)
-		Transformation = GIS2BIM.TransformCRS_epsg("4326",CRS_EPSG_SRID,self.lon,self.lat)
+		#Coordinates are transformed locally, the epsg.io server is used when set in the GIS preferences or without pyproj
+		remote = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/GIS").GetBool("RemoteCRSTransform", False)
+		Transformation = GIS2BIM.TransformCRS_epsg("4326",CRS_EPSG_SRID,self.lon,self.lat,remote)
 		SiteObject.CRS_x = float(Transformation[0])
 		SiteObject.CRS_y = float(Transformation[1])
 		SiteObject.BoundingboxWidth = float(self.bboxWidth.text())
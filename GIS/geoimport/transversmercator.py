@@ -8,6 +8,9 @@
 '''
 
 import math
+import time
+
+import numpy as np
 
 # see conversion formulas at
 # http://en.wikipedia.org/wiki/Transverse_Mercator_projection
@@ -45,4 +48,59 @@ class TransverseMercator:
         lat = math.degrees(lat)
         return (lat, lon)
 
+    def fromGeographicArray(self, lat, lon):
+        """
+        project arrays of any shape of lat and lon in degrees,
+        returns the arrays x and y
+        """
+        lat = np.radians(lat)
+        lon = np.radians(np.subtract(lon, self.lon))
+        B = np.sin(lon) * np.cos(lat)
+        x = 0.5 * self.k * self.radius * np.log((1+B)/(1-B))
+        y = self.k * self.radius * ( np.arctan(np.tan(lat)/np.cos(lon)) - self.latInRadians )
+        return (x,y)
+
+    def toGeographicArray(self, x, y):
+        """
+        inverse of fromGeographicArray, returns the arrays lat and lon
+        """
+        x = np.divide(x, self.k * self.radius)
+        y = np.divide(y, self.k * self.radius)
+        D = y + self.latInRadians
+        lon = np.arctan(np.sinh(x)/np.cos(D))
+        lat = np.arcsin(np.sin(D)/np.cosh(x))
+
+        lon = self.lon + np.degrees(lon)
+        lat = np.degrees(lat)
+        return (lat, lon)
+
+
+def benchmark(n=1000000):
+    """
+    compare the projection of n points in a python loop over the
+    math based scalar method with one call of the array api
+    """
+    tm = TransverseMercator(lat=50.37, lon=11.19)
+    rng = np.random.default_rng(0)
+    lat = tm.lat + rng.uniform(-0.5, 0.5, n)
+    lon = tm.lon + rng.uniform(-0.5, 0.5, n)
+
+    t = time.perf_counter()
+    loop = [tm.fromGeographic(a, b) for a, b in zip(lat.tolist(), lon.tolist())]
+    t_loop = time.perf_counter() - t
+
+    t = time.perf_counter()
+    x, y = tm.fromGeographicArray(lat, lon)
+    t_array = time.perf_counter() - t
+
+    loop = np.array(loop)
+    assert np.allclose(loop[:, 0], x, rtol=0, atol=1e-6)
+    assert np.allclose(loop[:, 1], y, rtol=0, atol=1e-6)
+
+    print("{} points: loop {:.3f} s, array {:.3f} s, speedup {:.0f}x".format(
+        n, t_loop, t_array, t_loop / t_array))
+    return t_loop, t_array
+
 
+if __name__ == "__main__":
+    benchmark()
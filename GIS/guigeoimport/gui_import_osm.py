@@ -31,6 +31,7 @@ import WebGui
 
 from GIS_libs import ui_path
 from ..geoimport.import_osm import import_osm
+from ..geoimport.progress import Progress
 
 
 class ImportOSM:
@@ -53,6 +54,9 @@ class ImportOSM:
         self.form.horizontalSlider_length.valueChanged.connect(self.update_length)
         self.form.pushButton_downloadData.clicked.connect(self.download_data)
         self.form.pushButton_showWeb.clicked.connect(self.show_web)
+        self.form.pushButton_pbfFile.clicked.connect(self.select_pbf_file)
+        self.form.pushButton_cancel.clicked.connect(self.cancel)
+        self.reporter = None
 
     def show_help(self):
 
@@ -117,6 +121,19 @@ class ImportOSM:
         self.form.lineEdit_latitude.setText(longitude)
         self.form.lineEdit_longitude.setText(latitude)
 
+    def select_pbf_file(self):
+        """choose a local .osm.pbf extract instead of the osm api"""
+        name, _ = QtWidgets.QFileDialog.getOpenFileName(
+            None, "OSM PBF Extract", self.form.lineEdit_pbfFile.text(),
+            "OSM PBF (*.osm.pbf *.pbf);;All Files (*)")
+        if name:
+            self.form.lineEdit_pbfFile.setText(name)
+
+    def cancel(self):
+        """stop a running import after the current way"""
+        if self.reporter is not None:
+            self.reporter.token.cancel()
+
     def download_data(self):
         """download data from osm"""
 
@@ -124,9 +141,25 @@ class ImportOSM:
         longitude = self.form.lineEdit_longitude.text()
         length = self.form.horizontalSlider_length.value()
         elevation = self.form.checkBox_elevation.isChecked()
-
-        import_osm(float(latitude),float(longitude),float(length)/10,
-            self.form.progressBar,self.form.label_status,elevation)
+        compound = self.form.checkBox_compound.isChecked()
+        pbf_file = self.form.lineEdit_pbfFile.text().strip() or None
+
+        # all categories: the whole data of the area, else only the enabled ones
+        checked = {
+            "building": self.form.checkBox_buildings.isChecked(),
+            "road": self.form.checkBox_roads.isChecked(),
+            "landuse": self.form.checkBox_landuse.isChecked(),
+            "path": self.form.checkBox_other.isChecked()}
+        categories = None if all(checked.values()) else [c for c, on in checked.items() if on]
+
+        self.reporter = Progress(100, self.form.progressBar, self.form.label_status,
+            FreeCADGui.updateGui)
+        try:
+            import_osm(float(latitude),float(longitude),float(length)/10,
+                self.form.progressBar,self.form.label_status,elevation,compound,pbf_file,
+                categories,self.reporter)
+        finally:
+            self.reporter = None
 
     def show_web(self):
         """